@@ -0,0 +1,107 @@
+# benchmarks/bench_gateway.py
+
+import sys
+import os
+import io
+import time
+import threading
+import statistics
+import contextlib
+from concurrent.futures import wait
+
+# Python den Weg zu den Modulen zeigen
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from execution import broker
+from benchmarks.fake_broker import synthetische_fixtures
+from benchmarks.gateway_sim import GatewaySimulator
+from benchmarks.bench_rebalance import synthetisches_universum
+
+# === Lasttest-Matrix ==========================================================
+ANZAHL_ANFRAGEN: list = [100, 500]
+LATENZ_SEKUNDEN: float = 0.05
+JITTER_SEKUNDEN: float = 0.05
+FEHLERQUOTE: float = 0.02
+# Pacing-Fenster des Simulators und des Clients, verkürzt damit ein Lauf nicht 10 Minuten dauert
+PACING_MAX_JE_FENSTER: int = 60
+PACING_FENSTER_SEKUNDEN: float = 1.0
+
+
+def _messe(future, dauer: dict, schluessel: str):
+    """Hält die Antwortzeit (ms) ab jetzt per Callback beim Abschluss des Futures fest."""
+    start = time.perf_counter()
+    future.add_done_callback(lambda _: dauer.__setitem__(schluessel, (time.perf_counter() - start) * 1000))
+
+
+def _auswertung(dauer: dict, gesamt_s: float, anzahl: int, fehler: int) -> dict:
+    werte = sorted(dauer.values()) or [0.0]
+    return {
+        'requests': anzahl,
+        'errors': fehler,
+        'total_s': gesamt_s,
+        'throughput_per_s': anzahl / gesamt_s if gesamt_s > 0 else 0.0,
+        'p50_ms': statistics.median(werte),
+        'p95_ms': werte[int(0.95 * (len(werte) - 1))],
+    }
+
+
+def bench_last(anzahl: int, latenz: float = LATENZ_SEKUNDEN, jitter: float = JITTER_SEKUNDEN,
+               fehlerquote: float = FEHLERQUOTE) -> dict:
+    """
+    Startet den Gateway-Simulator lokal, verbindet einen echten IBKRClient über TCP
+    und feuert `anzahl` historische Anfragen sowie `anzahl` Snapshots gleichzeitig ab.
+    """
+    with synthetisches_universum(anzahl) as tickers:
+        simulator = GatewaySimulator(
+            synthetische_fixtures(tickers, 26), host="127.0.0.1", port=0, latenz=latenz, jitter=jitter,
+            fehlerquote=fehlerquote, pacing_max_je_fenster=PACING_MAX_JE_FENSTER,
+            pacing_fenster_sekunden=PACING_FENSTER_SEKUNDEN,
+        )
+        host, port = simulator.start()
+        app = broker.IBKRClient()
+        app.historical_pacer = broker.HistoricalDataPacer(
+            max_per_window=PACING_MAX_JE_FENSTER, window_seconds=PACING_FENSTER_SEKUNDEN
+        )
+        try:
+            app.connect(host, port, clientId=1)
+            app_thread = threading.Thread(target=app.run, daemon=True)
+            app_thread.start()
+
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                # Historische Daten (unterliegen dem Pacing)
+                start = time.perf_counter()
+                futures, dauer = {}, {}
+                for ticker in tickers:
+                    futures[ticker] = app.request_historical_data(ticker, "2 Y")
+                    _messe(futures[ticker], dauer, ticker)
+                wait(futures.values(), timeout=60)
+                historisch = _auswertung(dauer, time.perf_counter() - start, anzahl,
+                                         sum(1 for f in futures.values() if not f.done() or f.exception()))
+
+                # Snapshots (ohne Pacing, alle gleichzeitig)
+                start = time.perf_counter()
+                _, anfragen = app.start_snapshots(tickers)
+                anfragen, dauer = {s: r.future for s, r in anfragen.items()}, {}
+                for ticker, future in anfragen.items():
+                    _messe(future, dauer, ticker)
+                wait(anfragen.values(), timeout=30)
+                snapshots = _auswertung(dauer, time.perf_counter() - start, anzahl,
+                                        sum(1 for f in anfragen.values() if not f.done() or f.exception()))
+        finally:
+            app.disconnect()
+            simulator.stop()
+
+    return {'requests': anzahl, 'historical': historisch, 'snapshots': snapshots,
+            'simulator': dict(simulator.statistik)}
+
+
+if __name__ == "__main__":
+    print(f"{'Anfragen':>8} | {'Art':>10} | {'Dauer':>8} | {'Req/s':>8} | {'p50':>9} | {'p95':>9} | {'Fehler':>6}")
+    print("-" * 76)
+    for anzahl in ANZAHL_ANFRAGEN:
+        ergebnis = bench_last(anzahl)
+        for art in ('historical', 'snapshots'):
+            z = ergebnis[art]
+            print(f"{anzahl:>8} | {art:>10} | {z['total_s']:>6.2f} s | {z['throughput_per_s']:>8.1f} | "
+                  f"{z['p50_ms']:>6.1f} ms | {z['p95_ms']:>6.1f} ms | {z['errors']:>6}")
@@ -0,0 +1,163 @@
+# benchmarks/bench_rebalance.py
+
+import sys
+import os
+import io
+import json
+import time
+import shutil
+import asyncio
+import platform
+import statistics
+import tempfile
+import contextlib
+from datetime import datetime, timezone
+
+# Python den Weg zu den Modulen zeigen
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from config import settings
+from data import database, ingest
+from strategy import logic, backtest
+from execution import portfolio, async_broker
+from benchmarks.fake_broker import FakeIBKRClient, synthetische_fixtures
+
+# === Benchmark-Matrix =========================================================
+UNIVERSUM_GROESSEN: list = [16, 100, 1000]
+HISTORIEN_MONATE: list = [26, 120, 240]
+LATENZ_SEKUNDEN: float = 0.01   # Simulierte Broker-Latenz je Anfrage
+WIEDERHOLUNGEN: int = 3
+
+RESULTS_DIR = os.path.join(SCRIPT_DIR, 'results')
+
+
+@contextlib.contextmanager
+def synthetisches_universum(anzahl_ticker: int):
+    """Ersetzt Universen und Kontrakte in settings temporär durch synthetische Ticker."""
+    tickers = [f"T{i:04d}" for i in range(anzahl_ticker)]
+    original = {name: getattr(settings, name) for name in
+                ('ASSET_CONTRACTS', 'RISKY_UNIVERSE', 'CANARY_UNIVERSE', 'CASH_UNIVERSE')}
+    settings.ASSET_CONTRACTS = {
+        t: {"symbol": t, "exchange": "SMART", "currency": "EUR", "secType": "STK"} for t in tickers
+    }
+    settings.RISKY_UNIVERSE = tickers[:-4]
+    settings.CANARY_UNIVERSE = tickers[-4:-2]
+    settings.CASH_UNIVERSE = tickers[-2:]
+    try:
+        yield tickers
+    finally:
+        for name, wert in original.items():
+            setattr(settings, name, wert)
+
+
+class StageTimer:
+    """Sammelt die Laufzeiten je Stufe über mehrere Wiederholungen."""
+    def __init__(self):
+        self.laufzeiten = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.laufzeiten.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+
+    def zusammenfassung(self) -> dict:
+        return {
+            name: {'median_ms': statistics.median(werte), 'min_ms': min(werte), 'runs_ms': werte}
+            for name, werte in self.laufzeiten.items()
+        }
+
+
+def bench_szenario(anzahl_ticker: int, monate: int, latenz: float, wiederholungen: int) -> dict:
+    """Misst alle Stufen eines Rebalancings für eine Universum-Größe und Historien-Länge."""
+    timer = StageTimer()
+    with synthetisches_universum(anzahl_ticker) as tickers:
+        app = FakeIBKRClient(synthetische_fixtures(tickers, monate), latency=latenz)
+
+        for lauf in range(wiederholungen):
+            tmp_dir = tempfile.mkdtemp(prefix="daa_bench_")
+            database.DB_PATH = os.path.join(tmp_dir, "bench.db")
+            app.quote_cache.clear()
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    database.initialize_database()
+
+                    # Die volle Historie des Szenarios abfragen (nicht nur ingest.VOLLE_HISTORIE)
+                    with timer.stage('ingest'):
+                        ingest.update_data_for_tickers(app, tickers, dauer=f"{monate} M")
+
+                    with timer.stage('data_load'):
+                        preis_matrix = database.get_prices_for_universe(tickers, limit=None)
+                        daten_aller_assets = {t: preis_matrix[t].dropna().tolist()[-13:] for t in tickers}
+                        letzte_bars = database.get_ingest_watermarks(tickers)
+
+                    with timer.stage('strategy'):
+                        ergebnis = logic.bestimme_ziel_portfolio(daten_aller_assets, letzte_bars)
+
+                    with timer.stage('backtest'):
+                        backtest.run_backtest(preis_matrix.index.to_numpy(), tickers,
+                                              preis_matrix[tickers].to_numpy(dtype=float))
+
+                    with timer.stage('valuation'):
+                        cash, positionen, kurse = asyncio.run(
+                            async_broker.get_account_details_and_prices(app, list(ergebnis['portfolio']))
+                        )
+                        gesamtwert = cash + sum(kurse[s] * q for s, q in positionen.items())
+
+                    with timer.stage('trade_calculation'):
+                        trades = portfolio.calculate_trades(app, positionen, ergebnis['portfolio'], gesamtwert)
+
+                    with timer.stage('persistence'):
+                        ergebnis['timestamp_utc'] = datetime.now(timezone.utc).isoformat()
+                        ergebnis['total_portfolio_value'] = gesamtwert
+                        ergebnis['calculated_trades'] = trades
+                        database.save_rebalancing_event(ergebnis)
+            finally:
+                database.close_connections()
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return {'universe_size': anzahl_ticker, 'history_months': monate, 'stored_months': len(preis_matrix),
+            'stages': timer.zusammenfassung()}
+
+
+def run_benchmarks(groessen: list = None, historien: list = None, latenz: float = LATENZ_SEKUNDEN,
+                   wiederholungen: int = WIEDERHOLUNGEN) -> dict:
+    original_db_path = database.DB_PATH
+    try:
+        ergebnisse = []
+        for anzahl_ticker in groessen or UNIVERSUM_GROESSEN:
+            for monate in historien or HISTORIEN_MONATE:
+                print(f"Benchmark: {anzahl_ticker} Ticker x {monate} Monate...")
+                ergebnisse.append(bench_szenario(anzahl_ticker, monate, latenz, wiederholungen))
+    finally:
+        database.DB_PATH = original_db_path
+
+    return {
+        'timestamp_utc': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'latency_seconds': latenz,
+        'repetitions': wiederholungen,
+        'results': ergebnisse,
+    }
+
+
+def drucke_zusammenfassung(bericht: dict):
+    stufen = ['ingest', 'data_load', 'strategy', 'backtest', 'valuation', 'trade_calculation', 'persistence']
+    print(f"\n{'Ticker':>6} {'Monate':>6} | " + " | ".join(f"{s:>17}" for s in stufen))
+    print("-" * (16 + 20 * len(stufen)))
+    for zeile in bericht['results']:
+        werte = " | ".join(f"{zeile['stages'][s]['median_ms']:>14.2f} ms" for s in stufen)
+        print(f"{zeile['universe_size']:>6} {zeile['history_months']:>6} | {werte}")
+
+
+if __name__ == "__main__":
+    bericht = run_benchmarks()
+    drucke_zusammenfassung(bericht)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    dateiname = os.path.join(RESULTS_DIR, f"rebalance_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    with open(dateiname, 'w', encoding='utf-8') as f:
+        json.dump(bericht, f, indent=2)
+    print(f"\nErgebnisse in {dateiname} gespeichert.")
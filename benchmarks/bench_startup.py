@@ -0,0 +1,91 @@
+# benchmarks/bench_startup.py
+
+import sys
+import os
+import time
+import statistics
+import subprocess
+
+# Python den Weg zu den Modulen zeigen
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.append(REPO_DIR)
+
+from config import settings
+from benchmarks.fake_broker import synthetische_fixtures
+from benchmarks.gateway_sim import GatewaySimulator
+
+# === Startzeit-Benchmark ======================================================
+# Gemessen wird die Zeit vom Prozessstart bis zur ersten Anfrage, die beim Gateway-Simulator ankommt:
+# Imports des Einstiegspunkts + Verbindungsaufbau + Warten auf die API-Bereitschaft.
+EINSTIEGSPUNKTE: dict = {
+    'main.py': ("import main", 123),
+    'data/ingest.py': ("from data import ingest", 456),
+    'check_tickers.py': ("import check_tickers", 1000),
+}
+WIEDERHOLUNGEN: int = 5
+HANDSHAKE_LATENZ_SEKUNDEN: float = 0.02
+
+_VERBINDUNG = {
+    # Bisheriges Muster aller Einstiegspunkte: verbinden und pauschal 3 s schlafen
+    'sleep(3)': (
+        "app = broker.IBKRClient()\n"
+        "app.connect(settings.IBKR_HOST, settings.IBKR_PORT, clientId={client_id})\n"
+        "threading.Thread(target=app.run, daemon=True).start()\n"
+        "time.sleep(3)\n"
+    ),
+    'connect_ibkr': "app = broker.connect_ibkr(client_id={client_id})\n",
+}
+
+_SKRIPT = (
+    "import sys, time, threading\n"
+    "sys.path.insert(0, {repo!r})\n"
+    "{import_zeile}\n"
+    "from config import settings\n"
+    "from execution import broker\n"
+    "{verbindung}"
+    "app.reqPositions()\n"
+    "time.sleep(0.1)\n"
+    "app.disconnect()\n"
+)
+
+
+def miss_kaltstart(import_zeile: str, client_id: int, modus: str, simulator: GatewaySimulator) -> float:
+    """Startet einen frischen Interpreter und liefert die ms bis zur ersten Anfrage am Simulator."""
+    skript = _SKRIPT.format(repo=REPO_DIR, import_zeile=import_zeile,
+                            verbindung=_VERBINDUNG[modus].format(client_id=client_id))
+    host, port = simulator.server_address
+    umgebung = dict(os.environ, IBKR_HOST=host, IBKR_PORT=str(port))
+
+    simulator.erste_anfrage = None
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", skript], env=umgebung, cwd=REPO_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if simulator.erste_anfrage is None:
+        raise RuntimeError(f"{import_zeile}: keine Anfrage beim Simulator angekommen.")
+    return (simulator.erste_anfrage - start) * 1000
+
+
+def run_benchmarks(wiederholungen: int = WIEDERHOLUNGEN) -> list:
+    simulator = GatewaySimulator(synthetische_fixtures(list(settings.ASSET_CONTRACTS), 26),
+                                 host="127.0.0.1", port=0, latenz=HANDSHAKE_LATENZ_SEKUNDEN)
+    simulator.start()
+    try:
+        ergebnisse = []
+        for name, (import_zeile, client_id) in EINSTIEGSPUNKTE.items():
+            for modus in _VERBINDUNG:
+                werte = [miss_kaltstart(import_zeile, client_id, modus, simulator) for _ in range(wiederholungen)]
+                ergebnisse.append({'entry_point': name, 'mode': modus,
+                                   'median_ms': statistics.median(werte), 'min_ms': min(werte)})
+    finally:
+        simulator.stop()
+    return ergebnisse
+
+
+if __name__ == "__main__":
+    print(f"Kaltstart bis zur ersten Anfrage (Median aus {WIEDERHOLUNGEN} Läufen, "
+          f"Handshake-Latenz {HANDSHAKE_LATENZ_SEKUNDEN * 1000:.0f} ms):\n")
+    print(f"{'Einstiegspunkt':<18} | {'Verbindung':<12} | {'Median':>10} | {'Min':>10}")
+    print("-" * 60)
+    for zeile in run_benchmarks():
+        print(f"{zeile['entry_point']:<18} | {zeile['mode']:<12} | {zeile['median_ms']:>7.0f} ms | {zeile['min_ms']:>7.0f} ms")
@@ -0,0 +1,134 @@
+# benchmarks/fake_broker.py
+
+import sys
+import os
+import threading
+import types
+import numpy as np
+import pandas as pd
+
+# Python den Weg zu den Modulen zeigen
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from execution import broker
+
+
+def synthetische_fixtures(tickers: list, monate: int, seed: int = 0) -> dict:
+    """
+    Erzeugt reproduzierbare Fixtures im Format des FakeIBKRClient:
+    Monats-Bars je Ticker, ein paar Positionen, aktuelle Kurse und Cash.
+    """
+    rng = np.random.default_rng(seed)
+    daten = pd.date_range(end=pd.Timestamp.today().normalize(), periods=monate, freq='ME')
+    renditen = rng.normal(0.005, 0.05, size=(monate, len(tickers)))
+    kurse = 100 * np.cumprod(1 + renditen, axis=0)
+
+    bars = {
+        ticker: list(zip(daten.strftime('%Y%m%d'), kurse[:, i].round(4).tolist()))
+        for i, ticker in enumerate(tickers)
+    }
+    gehalten = rng.choice(len(tickers), size=min(3, len(tickers)), replace=False)
+    return {
+        'bars': bars,
+        'positions': {tickers[i]: int(rng.integers(10, 200)) for i in gehalten},
+        'quotes': {ticker: float(kurse[-1, i]) for i, ticker in enumerate(tickers)},
+        'cash': 10000.0,
+    }
+
+
+def _anzahl_bars(duration_str: str) -> int:
+    """Übersetzt einen IBKR-durationStr ('13 M', '2 Y') in eine Anzahl Monats-Bars."""
+    menge, einheit = duration_str.split()
+    return int(menge) * {'M': 1, 'Y': 12}.get(einheit, 1)
+
+
+class FakeIBKRClient(broker.IBKRClient):
+    """
+    Drop-in-Ersatz für IBKRClient ohne TWS-Verbindung.
+
+    Alle req*-Aufrufe spielen die Fixtures nach `latency` Sekunden über die
+    echten EWrapper-Callbacks zurück (aus einem Timer-Thread, wie der EReader),
+    sodass Request-Registry, Futures und Kurs-Cache unverändert mitgemessen werden.
+    """
+
+    def __init__(self, fixtures: dict, latency: float = 0.0):
+        super().__init__()
+        self.fixtures = fixtures
+        self.latency = latency
+        self.placed_orders = []
+        # Die Fixtures unterliegen keinem IBKR-Pacing
+        self.historical_pacer = broker.HistoricalDataPacer(max_open=10**6, max_per_window=10**9)
+
+    def _later(self, callback, *args):
+        timer = threading.Timer(self.latency, callback, args)
+        timer.daemon = True
+        timer.start()
+
+    # --- Verbindung ---
+    def connect(self, host, port, clientId):
+        self.nextValidId(1)
+
+    def run(self):
+        pass
+
+    def isConnected(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+    # --- Anfragen ---
+    def reqHistoricalData(self, reqId, contract, endDateTime, durationStr, barSizeSetting, whatToShow,
+                          useRTH, formatDate, keepUpToDate, chartOptions):
+        def antworten():
+            for datum, close in self.fixtures['bars'].get(contract.symbol, [])[-_anzahl_bars(durationStr):]:
+                self.historicalData(reqId, types.SimpleNamespace(date=datum, close=close))
+            self.historicalDataEnd(reqId, "", "")
+        self._later(antworten)
+
+    def cancelHistoricalData(self, reqId):
+        pass
+
+    def reqMktData(self, reqId, contract, genericTickList, snapshot, regulatorySnapshot, mktDataOptions):
+        def antworten():
+            kurs = self.fixtures['quotes'].get(contract.symbol)
+            if kurs:
+                self.tickPrice(reqId, 4, kurs, None)
+            self.tickSnapshotEnd(reqId)
+        self._later(antworten)
+
+    def cancelMktData(self, reqId):
+        pass
+
+    def reqPositions(self):
+        def antworten():
+            for symbol, menge in self.fixtures['positions'].items():
+                self.position("DU000000", types.SimpleNamespace(symbol=symbol), menge, 0.0)
+            self.positionEnd()
+        self._later(antworten)
+
+    def cancelPositions(self):
+        pass
+
+    def reqAccountSummary(self, reqId, groupName, tags):
+        def antworten():
+            self.accountSummary(reqId, "DU000000", "TotalCashValue", str(self.fixtures['cash']), "EUR")
+            self.accountSummaryEnd(reqId)
+        self._later(antworten)
+
+    def cancelAccountSummary(self, reqId):
+        pass
+
+    def placeOrder(self, orderId, contract, order):
+        self.placed_orders.append((orderId, contract.symbol, order.action, order.totalQuantity))
+
+        def antworten():
+            kurs = self.fixtures['quotes'].get(contract.symbol, 0.0)
+            menge = float(order.totalQuantity)
+            exec_id = f"{orderId:08x}.01.01"
+            self.execDetails(-1, contract, types.SimpleNamespace(
+                orderId=orderId, execId=exec_id, time="", shares=menge, price=kurs))
+            self.orderStatus(orderId, "Filled", menge, 0.0, kurs, 0, 0, kurs, 0, "", 0.0)
+            self.commissionReport(types.SimpleNamespace(execId=exec_id, commission=1.25, currency="EUR"))
+        self._later(antworten)
@@ -0,0 +1,414 @@
+# benchmarks/gateway_sim.py
+
+import sys
+import os
+import time
+import heapq
+import random
+import struct
+import argparse
+import threading
+import collections
+import socketserver
+from datetime import datetime
+
+# Python den Weg zu den Modulen zeigen
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from ibapi.message import IN, OUT
+from config import settings
+from benchmarks.fake_broker import synthetische_fixtures, _anzahl_bars
+
+# Protokoll-Version, deren Nachrichten-Layout der Simulator spricht
+# (entspricht MAX_CLIENT_VER der installierten ibapi, Stand 9.76).
+SERVER_VERSION = 157
+ACCOUNT = "DU000000"
+STANDARD_KONTRAKT = {"exchange": "SMART", "primaryExchange": "", "currency": "EUR", "secType": "STK"}
+
+# IBKR-Fehlercodes, die der Simulator selbst erzeugt
+FEHLER_PACING = 162
+FEHLER_UNBEKANNT = 200
+FEHLER_LESEN = 320
+
+
+def _feld(wert) -> bytes:
+    if isinstance(wert, bool):
+        wert = int(wert)
+    return str(wert).encode() + b"\0"
+
+
+def _nachricht(*felder) -> bytes:
+    """Baut eine TWS-Nachricht: 4-Byte-Längenpräfix + NUL-terminierte Felder."""
+    inhalt = b"".join(_feld(f) for f in felder)
+    return struct.pack("!I", len(inhalt)) + inhalt
+
+
+class _Sitzung(socketserver.BaseRequestHandler):
+    """
+    Eine Client-Verbindung. Eingehende Anfragen werden im Handler-Thread gelesen,
+    alle Antworten laufen zeitversetzt über einen eigenen Sende-Thread, damit die
+    simulierte Latenz nicht die Annahme weiterer (paralleler) Anfragen blockiert.
+    """
+
+    def setup(self):
+        self.client_id = 0
+        self._warteschlange = []
+        self._laufnummer = 0
+        self._bedingung = threading.Condition()
+        self._aktiv = True
+        self._abgebrochen = set()
+
+    # --- Senden ---
+    def _spaeter(self, verzoegerung: float, aktion):
+        """Plant `aktion()` nach `verzoegerung` Sekunden; sie liefert die zu sendenden Nachrichten."""
+        with self._bedingung:
+            self._laufnummer += 1
+            heapq.heappush(self._warteschlange, (time.monotonic() + verzoegerung, self._laufnummer, aktion))
+            self._bedingung.notify()
+
+    def _senden(self, *nachrichten):
+        self._spaeter(0, lambda: list(nachrichten))
+
+    def _sende_schleife(self):
+        while True:
+            with self._bedingung:
+                while self._aktiv and (not self._warteschlange
+                                       or self._warteschlange[0][0] > time.monotonic()):
+                    timeout = self._warteschlange[0][0] - time.monotonic() if self._warteschlange else None
+                    self._bedingung.wait(timeout)
+                if not self._aktiv:
+                    return
+                _, _, aktion = heapq.heappop(self._warteschlange)
+            try:
+                self.request.sendall(b"".join(aktion()))
+            except OSError:
+                return
+
+    def _fehler(self, req_id: int, code: int, text: str) -> bytes:
+        self.server.zaehle(f"fehler_{code}")
+        return _nachricht(IN.ERR_MSG, 2, req_id, code, text)
+
+    # --- Empfangen ---
+    def _lies(self, anzahl: int) -> bytes:
+        daten = b""
+        while len(daten) < anzahl:
+            teil = self.request.recv(anzahl - len(daten))
+            if not teil:
+                raise ConnectionError("Client hat die Verbindung beendet")
+            daten += teil
+        return daten
+
+    def _lies_nachricht(self) -> list:
+        groesse = struct.unpack("!I", self._lies(4))[0]
+        return self._lies(groesse).decode(errors='backslashreplace').split("\0")[:-1]
+
+    def handle(self):
+        try:
+            # Handshake: "API\0" + Versionsbereich, Antwort: Server-Version und Verbindungszeit
+            if self._lies(4) != b"API\0":
+                return
+            self._lies_nachricht()
+            zeit = datetime.now().strftime('%Y%m%d %H:%M:%S')
+            self.request.sendall(_nachricht(SERVER_VERSION, zeit))
+
+            threading.Thread(target=self._sende_schleife, daemon=True).start()
+            while True:
+                felder = self._lies_nachricht()
+                if not felder:
+                    continue
+                handler = self.HANDLER.get(int(felder[0]))
+                self.server.anfrage_erhalten(int(felder[0]))
+                if handler is None:
+                    continue
+                try:
+                    handler(self, felder)
+                except (IndexError, ValueError):
+                    self._senden(self._fehler(-1, FEHLER_LESEN, f"Error reading request: {felder[:3]}"))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self._bedingung:
+                self._aktiv = False
+                self._bedingung.notify()
+            self.server.sitzung_beendet(self)
+
+    # --- Anfragen ---
+    def _start_api(self, felder):
+        self.client_id = int(felder[2])
+        self._senden(_nachricht(IN.NEXT_VALID_ID, 1, self.server.naechste_order_id()),
+                     _nachricht(IN.MANAGED_ACCTS, 1, ACCOUNT))
+
+    def _req_ids(self, felder):
+        self._senden(_nachricht(IN.NEXT_VALID_ID, 1, self.server.naechste_order_id()))
+
+    def _req_historical_data(self, felder):
+        # [20, reqId, conId, symbol, ..., durationStr (17), ...]
+        req_id, symbol, dauer = int(felder[1]), felder[3], felder[17]
+        server = self.server
+        bars = server.fixtures['bars'].get(symbol)
+        if bars is None:
+            self._senden(self._fehler(req_id, FEHLER_UNBEKANNT, "No security definition has been found for the request"))
+            return
+        if not server.historisch_starten(self, req_id):
+            self._spaeter(server.verzoegerung(), lambda: [self._fehler(
+                req_id, FEHLER_PACING,
+                "Historical Market Data Service error message:Historical data request pacing violation")])
+            return
+
+        def antworten():
+            server.historisch_beendet(self, req_id)
+            if req_id in self._abgebrochen:
+                self._abgebrochen.discard(req_id)
+                return []
+            auswahl = bars[-_anzahl_bars(dauer):]
+            felder = [IN.HISTORICAL_DATA, req_id, auswahl[0][0] if auswahl else "", auswahl[-1][0] if auswahl else "",
+                      len(auswahl)]
+            for datum, close in auswahl:
+                felder += [datum, close, close, close, close, 0, close, 0]
+            return [_nachricht(*felder)]
+        self._spaeter(server.verzoegerung(), antworten)
+
+    def _cancel_historical_data(self, felder):
+        self._abgebrochen.add(int(felder[2]))
+
+    def _req_mkt_data(self, felder):
+        # [1, version, reqId, conId, symbol, ..., snapshot (17), ...]
+        req_id, symbol, snapshot = int(felder[2]), felder[4], felder[17] == "1"
+        kurs = self.server.fixtures['quotes'].get(symbol)
+        if kurs is None:
+            self._senden(self._fehler(req_id, FEHLER_UNBEKANNT, "No security definition has been found for the request"))
+            return
+
+        def antworten():
+            nachrichten = [_nachricht(IN.TICK_PRICE, 6, req_id, 4, kurs, 0, 0)]
+            if snapshot:
+                nachrichten.append(_nachricht(IN.TICK_SNAPSHOT_END, 1, req_id))
+            return nachrichten
+        self._spaeter(self.server.verzoegerung(), antworten)
+
+    def _req_positions(self, felder):
+        def antworten():
+            nachrichten = []
+            for symbol, menge in self.server.positionen_kopie().items():
+                kontrakt = self.server.kontrakte.get(symbol, STANDARD_KONTRAKT)
+                nachrichten.append(_nachricht(
+                    IN.POSITION_DATA, 3, ACCOUNT, self.server.con_ids.get(symbol, 0), symbol, kontrakt["secType"],
+                    "", 0.0, "", "", kontrakt["exchange"], kontrakt["currency"], symbol, symbol, menge, 0.0))
+            nachrichten.append(_nachricht(IN.POSITION_END, 1))
+            return nachrichten
+        self._spaeter(self.server.verzoegerung(), antworten)
+
+    def _req_account_summary(self, felder):
+        req_id, tags = int(felder[2]), felder[4].split(",")
+
+        def antworten():
+            werte = self.server.kontowerte()
+            nachrichten = [_nachricht(IN.ACCOUNT_SUMMARY, 1, req_id, ACCOUNT, tag, werte[tag], "EUR")
+                           for tag in tags if tag in werte]
+            nachrichten.append(_nachricht(IN.ACCOUNT_SUMMARY_END, 1, req_id))
+            return nachrichten
+        self._spaeter(self.server.verzoegerung(), antworten)
+
+    def _req_contract_details(self, felder):
+        # [9, version, reqId, conId, symbol, secType, ..., exchange (10), primaryExchange, currency (12), ...]
+        req_id, symbol, sec_type, exchange, waehrung = int(felder[2]), felder[4], felder[5], felder[10], felder[12]
+        kontrakt = self.server.kontrakte.get(symbol)
+        passt = kontrakt is not None and waehrung in ("", kontrakt["currency"]) \
+            and sec_type in ("", kontrakt["secType"]) \
+            and exchange in ("", "SMART", kontrakt.get("primaryExchange"))
+        if not passt:
+            self._spaeter(self.server.verzoegerung(), lambda: [self._fehler(
+                req_id, FEHLER_UNBEKANNT, "No security definition has been found for the request")])
+            return
+
+        def antworten():
+            return [
+                _nachricht(IN.CONTRACT_DATA, 8, req_id, symbol, kontrakt["secType"], "", 0.0, "", "SMART",
+                           kontrakt["currency"], symbol, symbol, symbol, self.server.con_ids[symbol], 0.01, 1, "",
+                           "MKT,LMT", "SMART," + kontrakt.get("primaryExchange", ""), 1, 0, symbol,
+                           kontrakt.get("primaryExchange", ""), "", "", "", "", "Europe/Berlin", "", "", "", 0, 0,
+                           0, "", "", "", "", "ETF"),
+                _nachricht(IN.CONTRACT_DATA_END, 1, req_id),
+            ]
+        self._spaeter(self.server.verzoegerung(), antworten)
+
+    def _place_order(self, felder):
+        # [3, orderId, conId, symbol (3), ..., secId (15), action (16), totalQuantity (17), orderType, ...]
+        order_id, symbol, aktion, menge = int(felder[1]), felder[3], felder[16], float(felder[17])
+        kurs = self.server.fixtures['quotes'].get(symbol)
+        if kurs is None:
+            self._senden(self._fehler(order_id, FEHLER_UNBEKANNT, "No security definition has been found for the request"))
+            return
+        self.server.order_angenommen(order_id)
+        perm_id = order_id + 1000000
+
+        def status(text, gefuellt, preis):
+            return _nachricht(IN.ORDER_STATUS, order_id, text, gefuellt, menge - gefuellt, preis, perm_id, 0,
+                              preis, self.client_id, "", 0.0)
+
+        def ausfuehren():
+            self.server.ausfuehrung_buchen(symbol, menge if aktion == "BUY" else -menge, kurs)
+            exec_id = f"{perm_id:08x}.01.01"
+            kontrakt = self.server.kontrakte.get(symbol, STANDARD_KONTRAKT)
+            return [
+                status("Filled", menge, kurs),
+                _nachricht(IN.EXECUTION_DATA, -1, order_id, self.server.con_ids.get(symbol, 0), symbol,
+                           kontrakt["secType"], "", 0.0, "", "", kontrakt["exchange"], kontrakt["currency"], symbol,
+                           symbol, exec_id, datetime.now().strftime('%Y%m%d  %H:%M:%S'), ACCOUNT,
+                           kontrakt["exchange"], "BOT" if aktion == "BUY" else "SLD", menge, kurs, perm_id,
+                           self.client_id, 0, menge, kurs, "", "", 0, "", 0),
+                _nachricht(IN.COMMISSION_REPORT, 1, exec_id, 1.25, "EUR", 0.0, 0.0, 0),
+            ]
+        self._spaeter(self.server.verzoegerung(), lambda: [status("Submitted", 0, 0.0)])
+        self._spaeter(2 * self.server.verzoegerung(), ausfuehren)
+
+    HANDLER = {
+        OUT.START_API: _start_api,
+        OUT.REQ_IDS: _req_ids,
+        OUT.REQ_HISTORICAL_DATA: _req_historical_data,
+        OUT.CANCEL_HISTORICAL_DATA: _cancel_historical_data,
+        OUT.REQ_MKT_DATA: _req_mkt_data,
+        OUT.REQ_POSITIONS: _req_positions,
+        OUT.REQ_ACCOUNT_SUMMARY: _req_account_summary,
+        OUT.REQ_CONTRACT_DATA: _req_contract_details,
+        OUT.PLACE_ORDER: _place_order,
+    }
+
+
+class GatewaySimulator(socketserver.ThreadingTCPServer):
+    """
+    Lokaler Ersatz für TWS/IB Gateway, der das TWS-Socket-Protokoll spricht.
+
+    Bedient reqHistoricalData, reqMktData (Snapshots), reqPositions, reqAccountSummary,
+    reqContractDetails und placeOrder aus einem Fixture-Datensatz (siehe
+    fake_broker.synthetische_fixtures). Jede Antwort wird um `latenz` (+ zufälligen
+    `jitter`) verzögert. Historische Anfragen unterliegen denselben Pacing-Limits wie
+    bei IBKR und werden bei Verstoß mit Fehler 162 abgelehnt; `fehlerquote` lehnt
+    zusätzlich einen zufälligen Anteil aller historischen Anfragen mit 162 ab.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, fixtures: dict, host: str = None, port: int = None, latenz: float = 0.0,
+                 jitter: float = 0.0, fehlerquote: float = 0.0, pacing_max_offen: int = 50,
+                 pacing_max_je_fenster: int = 60, pacing_fenster_sekunden: float = 600, seed: int = 0):
+        super().__init__((host or settings.IBKR_HOST, settings.IBKR_PORT if port is None else port), _Sitzung)
+        self.fixtures = fixtures
+        self.latenz = latenz
+        self.jitter = jitter
+        self.fehlerquote = fehlerquote
+        self.pacing_max_offen = pacing_max_offen
+        self.pacing_max_je_fenster = pacing_max_je_fenster
+        self.pacing_fenster_sekunden = pacing_fenster_sekunden
+
+        symbole = sorted(fixtures['quotes'])
+        self.kontrakte = {s: settings.ASSET_CONTRACTS.get(s, STANDARD_KONTRAKT) for s in symbole}
+        self.con_ids = {s: 100000 + i for i, s in enumerate(symbole)}
+        self.positionen = dict(fixtures['positions'])
+        self.cash = fixtures['cash']
+        self.statistik = collections.Counter()
+        self.erste_anfrage = None   # time.perf_counter() der ersten Anfrage nach startApi
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._order_id = 1
+        self._historisch_offen = set()
+        self._historisch_gestartet = collections.deque()
+        self._thread = None
+
+    # --- Zustand (von allen Sitzungs-Threads geteilt) ---
+    def zaehle(self, schluessel: str):
+        with self._lock:
+            self.statistik[schluessel] += 1
+
+    def anfrage_erhalten(self, nachrichten_id: int):
+        with self._lock:
+            self.statistik[f"anfrage_{nachrichten_id}"] += 1
+            if self.erste_anfrage is None and nachrichten_id != OUT.START_API:
+                self.erste_anfrage = time.perf_counter()
+
+    def verzoegerung(self) -> float:
+        with self._lock:
+            return self.latenz + self._rng.uniform(0, self.jitter)
+
+    def naechste_order_id(self) -> int:
+        with self._lock:
+            return self._order_id
+
+    def historisch_starten(self, sitzung, req_id: int) -> bool:
+        """Prüft die Pacing-Limits (und die Fehlerquote) und vermerkt die Anfrage als offen."""
+        with self._lock:
+            jetzt = time.monotonic()
+            while self._historisch_gestartet and jetzt - self._historisch_gestartet[0] >= self.pacing_fenster_sekunden:
+                self._historisch_gestartet.popleft()
+            if len(self._historisch_offen) >= self.pacing_max_offen \
+                    or len(self._historisch_gestartet) >= self.pacing_max_je_fenster \
+                    or self._rng.random() < self.fehlerquote:
+                return False
+            self._historisch_offen.add((id(sitzung), req_id))
+            self._historisch_gestartet.append(jetzt)
+            return True
+
+    def historisch_beendet(self, sitzung, req_id: int):
+        with self._lock:
+            self._historisch_offen.discard((id(sitzung), req_id))
+
+    def sitzung_beendet(self, sitzung):
+        with self._lock:
+            self._historisch_offen = {k for k in self._historisch_offen if k[0] != id(sitzung)}
+
+    def positionen_kopie(self) -> dict:
+        with self._lock:
+            return dict(self.positionen)
+
+    def kontowerte(self) -> dict:
+        with self._lock:
+            bestand = sum(self.fixtures['quotes'][s] * m for s, m in self.positionen.items())
+            return {'TotalCashValue': self.cash, 'NetLiquidation': self.cash + bestand}
+
+    def ausfuehrung_buchen(self, symbol: str, menge: float, kurs: float):
+        with self._lock:
+            self.positionen[symbol] = self.positionen.get(symbol, 0) + menge
+            self.cash -= menge * kurs
+
+    def order_angenommen(self, order_id: int):
+        with self._lock:
+            self._order_id = max(self._order_id, order_id + 1)
+
+    # --- Steuerung ---
+    def start(self):
+        """Startet den Simulator in einem Hintergrund-Thread und liefert (host, port)."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.server_address
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokaler IBKR-Gateway-Simulator für Offline-Lasttests.")
+    parser.add_argument("--port", type=int, default=settings.IBKR_PORT)
+    parser.add_argument("--monate", type=int, default=120, help="Länge der synthetischen Historie")
+    parser.add_argument("--synthetisch", type=int, default=0,
+                        help="Anzahl zusätzlicher synthetischer Ticker (T0000, T0001, ...)")
+    parser.add_argument("--latenz", type=float, default=0.05, help="Antwortlatenz in Sekunden")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--fehlerquote", type=float, default=0.0, help="Anteil zufälliger Pacing-Fehler (162)")
+    argumente = parser.parse_args()
+
+    tickers = list(settings.ASSET_CONTRACTS) + [f"T{i:04d}" for i in range(argumente.synthetisch)]
+    simulator = GatewaySimulator(
+        synthetische_fixtures(tickers, argumente.monate), port=argumente.port, latenz=argumente.latenz,
+        jitter=argumente.jitter, fehlerquote=argumente.fehlerquote,
+    )
+    host, port = simulator.start()
+    print(f"Gateway-Simulator läuft auf {host}:{port} ({len(tickers)} Ticker). Beenden mit Strg+C.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
+        print("\nStatistik:", dict(simulator.statistik))
@@ -1,6 +1,5 @@
 import sys
 import os
-import threading
 import time
 import itertools
 
@@ -10,6 +9,7 @@ sys.path.append(SCRIPT_DIR)
 
 from execution import broker
 from config import settings
+from data import database
 from ibapi.contract import Contract
 
 # === Konfiguration für den Diagnose-Lauf ===
@@ -18,68 +18,48 @@ COMMON_EXCHANGES = ["SMART", "IBIS2", "LSEETF", "BVME", "IBIS", "AEB"]
 COMMON_CURRENCIES = ["EUR", "USD", "GBP"]
 COMMON_SECTYPES = ["STK", "CMDTY"]
 
-class DiagnosticClient(broker.IBKRClient):
-    """Eine erweiterte Client-Klasse nur für die Diagnose."""
-    def __init__(self):
-        super().__init__()
-        self.contract_details_received = threading.Event()
-        self.found_contracts = []
-
-    def contractDetails(self, reqId, contractDetails):
-        """Wird aufgerufen, wenn ein passender Kontrakt gefunden wird."""
-        super().contractDetails(reqId, contractDetails)
-        self.found_contracts.append(contractDetails.contract)
-
-    def contractDetailsEnd(self, reqId):
-        """Wird aufgerufen, wenn die Suche beendet ist."""
-        super().contractDetailsEnd(reqId)
-        self.contract_details_received.set()
-
-    def test_single_config(self, contract_to_test: Contract):
-        """Testet eine einzelne, spezifische Kontrakt-Konfiguration."""
-        self.found_contracts = []
-        self.contract_details_received.clear()
-        
-        print(f"  -> Teste: Symbol={contract_to_test.symbol}, Exchange={contract_to_test.exchange}, Currency={contract_to_test.currency}, SecType={contract_to_test.secType}...")
-        
-        self.reqContractDetails(int(time.time()), contract_to_test)
-        self.contract_details_received.wait(timeout=3)
-        
-        return self.found_contracts[0] if self.found_contracts else None
-
-    def find_working_contract(self, symbol_to_test):
-        """
-        Testet systematisch verschiedene Konfigurationen für ein Symbol.
-        """
-        # --- Schritt 1: Teste die Konfiguration aus settings.py ZUERST ---
-        print("  -> Teste Konfiguration aus settings.py...")
-        try:
-            initial_contract = self.get_etf_contract(symbol_to_test)
-            result = self.test_single_config(initial_contract)
-            if result:
-                print("    --> ERFOLG! Konfiguration aus settings.py ist korrekt.")
-                return result
-            else:
-                print("    --> FEHLSCHLAG. Starte Brute-Force-Suche...")
-        except Exception as e:
-            print(f"    --> FEHLER beim Erstellen des Kontrakts: {e}. Starte Brute-Force-Suche...")
+def kandidaten(symbol: str) -> list:
+    """Alle Börsen/Währungs/secType-Kombinationen für die Brute-Force-Suche."""
+    kontrakte = []
+    for exchange, currency, secType in itertools.product(COMMON_EXCHANGES, COMMON_CURRENCIES, COMMON_SECTYPES):
+        contract = Contract()
+        contract.symbol = symbol
+        contract.exchange = exchange
+        contract.currency = currency
+        contract.secType = secType
+        kontrakte.append(contract)
+    return kontrakte
+
+def finde_kontrakte(app, tickers: list, timeout: float = 10) -> dict:
+    """
+    Sucht für alle Ticker gleichzeitig einen gültigen Kontrakt.
 
-        # --- Schritt 2: Wenn Schritt 1 fehlschlägt, starte die Brute-Force-Suche ---
-        test_combinations = list(itertools.product(COMMON_EXCHANGES, COMMON_CURRENCIES, COMMON_SECTYPES))
+    Schritt 1 löst die Konfigurationen aus settings.py parallel auf und legt die conIds im
+    Kontrakt-Cache ab. Nur für fehlgeschlagene Ticker (auch mehrdeutige ohne passende primaryExchange)
+    werden in Schritt 2 alle Kombinationen gleichzeitig angefragt; je Ticker gewinnt die erste
+    Kombination mit Treffer und wird als abweichende Konfiguration vorgeschlagen.
 
-        for exchange, currency, secType in test_combinations:
-            contract = Contract()
-            contract.symbol = symbol_to_test
-            contract.exchange = exchange
-            contract.currency = currency
-            contract.secType = secType
-            
-            result = self.test_single_config(contract)
-            if result:
-                print(f"    --> ERFOLG! Gültige Konfiguration gefunden.")
-                return result
-        
-        return None # Nichts gefunden
+    Returns:
+        {ticker: (Contract oder None, True wenn die Konfiguration aus settings.py stimmt)}.
+    """
+    # --- Schritt 1: Konfigurationen aus settings.py (alle Ticker gleichzeitig) ---
+    print(f"  -> Teste Konfiguration aus settings.py für {len(tickers)} Ticker...")
+    aufgeloest = app.resolve_contracts(tickers, timeout=timeout)
+    ergebnis = {t: (d.contract, True) for t, d in aufgeloest.items() if d is not None}
+    fehlgeschlagen = [t for t in tickers if t not in ergebnis]
+    if not fehlgeschlagen:
+        return ergebnis
+
+    # --- Schritt 2: Brute-Force-Suche nur für fehlgeschlagene Ticker (alle Kombinationen gleichzeitig) ---
+    print(f"  -> FEHLSCHLAG für {', '.join(fehlgeschlagen)}. Starte Brute-Force-Suche "
+          f"({len(COMMON_EXCHANGES) * len(COMMON_CURRENCIES) * len(COMMON_SECTYPES)} Kombinationen je Ticker)...")
+    anfragen = {(t, i): contract for t in fehlgeschlagen for i, contract in enumerate(kandidaten(t))}
+    treffer = app.fetch_contract_details_many(anfragen, timeout=timeout)
+    for ticker in fehlgeschlagen:
+        gefunden = next((treffer[(ticker, i)][0].contract for i in range(len(kandidaten(ticker)))
+                         if treffer[(ticker, i)]), None)
+        ergebnis[ticker] = (gefunden, False)
+    return ergebnis
 
 def run_diagnostics():
     """
@@ -89,21 +69,17 @@ def run_diagnostics():
     print("=== Starte ERWEITERTE Ticker-Diagnose...          ===")
     print("=====================================================")
 
-    app = DiagnosticClient()
-    app.connect("127.0.0.1", 7497, clientId=1000)
-    api_thread = threading.Thread(target=app.run, daemon=True)
-    api_thread.start()
-    time.sleep(3)
+    app = broker.connect_ibkr(client_id=1000)
 
     all_tickers = sorted(list(settings.ASSET_CONTRACTS.keys()))
     working_configs = {}
     failed_tickers = []
 
-    for ticker in all_tickers:
-        print(f"\n--- Prüfe Ticker: {ticker} ---")
-        found_contract = app.find_working_contract(ticker)
-        
+    start = time.perf_counter()
+    for ticker, (found_contract, aus_settings) in finde_kontrakte(app, all_tickers).items():
         if found_contract:
+            status = "Konfiguration aus settings.py ist korrekt" if aus_settings else "Abweichende Konfiguration gefunden"
+            print(f"  {ticker}: ERFOLG ({status}, conId {found_contract.conId}).")
             working_configs[ticker] = {
                 "symbol": found_contract.symbol,
                 "exchange": found_contract.exchange,
@@ -113,6 +89,7 @@ def run_diagnostics():
             }
         else:
             failed_tickers.append(ticker)
+    print(f"\nDiagnose für {len(all_tickers)} Ticker in {time.perf_counter() - start:.1f} s abgeschlossen.")
     
     app.disconnect()
 
@@ -134,4 +111,5 @@ def run_diagnostics():
     print("=====================================================")
 
 if __name__ == "__main__":
+    database.initialize_database()
     run_diagnostics()
@@ -1,3 +1,5 @@
+import os
+
 # === Asset-Universen & Kontrakt-Details (Finale, verifizierte IBKR-Version) ===
 # Diese Konfiguration wurde durch das Skript check_tickers.py verifiziert und
 # enthält die finalen, funktionierenden Einstellungen für den Bot.
@@ -96,6 +98,45 @@ CASH_UNIVERSE: list[str] = ["IB01", "IBTA"]
 T: int = 2  # Top-n
 B: int = 1  # Breadth → DAA1-G12 (aggressiv)
 
+# === Portfolios ==============================================================
+# main.py bewertet alle Definitionen in EINEM Lauf: eine Broker-Verbindung, ein Daten-Abruf,
+# ein Kurs-Batch. Nicht angegebene Schlüssel fallen auf die Parameter oben zurück:
+#   'risky' / 'canary' / 'cash': Universen, 'T': Top-n, 'B': Breite,
+#   'account': IBKR-Konto (Unterkonto) für Cash und Positionen; None = alle Konten des Logins.
+#              Jedes Portfolio braucht ein eigenes Konto (None zählt als eines).
+DEFAULT_PORTFOLIO: str = "default"
+PORTFOLIOS: list[dict] = [
+    {"name": DEFAULT_PORTFOLIO},
+    # Beispiel für eine zusätzliche Variante auf einem Unterkonto:
+    # {"name": "DAA-G12-T4B2", "T": 4, "B": 2, "account": "U1234567"},
+]
+
+# === Broker-Parameter ========================================================
+# Adresse von TWS / IB Gateway (7497 = TWS Paper-Trading; für Offline-Tests auf benchmarks/gateway_sim.py zeigen)
+# Über die Umgebungsvariablen IBKR_HOST / IBKR_PORT überschreibbar
+IBKR_HOST: str = os.environ.get("IBKR_HOST", "127.0.0.1")
+IBKR_PORT: int = int(os.environ.get("IBKR_PORT", 7497))
+
+# Verbindungsaufbau: max. Wartezeit auf die API-Bereitschaft (nextValidId) je Versuch und Anzahl Versuche
+IBKR_CONNECT_TIMEOUT_SECONDS: float = 10
+IBKR_CONNECT_RETRIES: int = 3
+
+# Bar-Größe der Ingestion: "1 month" (Monats-Bars) oder "1 day" (Tageskurse in `prices_daily`;
+# die Monatsend-Sicht `prices` wird daraus gepflegt, database.get_prices_as_of() liefert beliebige Stichtage)
+INGEST_BAR_SIZE: str = "1 month"
+
+# Wie lange (in Sekunden) ein abgefragter Kurs für Bewertung und Trade-Berechnung wiederverwendet wird
+QUOTE_CACHE_TTL_SECONDS: float = 60
+
+# === Rebalancing-Parameter ===================================================
+# Kleine Anpassungen bestehender Zielpositionen werden unterdrückt (execution/planner.py):
+#   "shares": nur Trades mit mehr als TRADE_THRESHOLD_SHARES Stück
+#   "value":  nur Trades mit einem Wert über TRADE_THRESHOLD_VALUE (in Basiswährung)
+# Positionen, die nicht mehr im Zielportfolio stehen, werden immer vollständig verkauft.
+TRADE_THRESHOLD_MODE: str = "shares"
+TRADE_THRESHOLD_SHARES: int = 5
+TRADE_THRESHOLD_VALUE: float = 500.0
+
 # === Risiko- & Performance-Parameter ========================================
 # Annualisierter risikofreier Zinssatz für Sharpe/Sortino/Treynor Ratio
 RISK_FREE_RATE: float = 0.02 # Annahme von 2%
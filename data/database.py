@@ -1,47 +1,197 @@
 # DAA Momentum Bot/data/database.py
 
 import sqlite3
-import pandas as pd
+import numpy as np
 from config import settings
 import os
 import json
+import io
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+from reporting import tracing
+
+# pandas wird erst in den Funktionen geladen, die DataFrames liefern oder lesen,
+# damit die Einstiegspunkte ohne diesen Import-Aufwand bis zur Broker-Verbindung kommen.
+if TYPE_CHECKING:
+    import pandas as pd
 
 DB_FILE = "etf_data.db"
 DB_PATH = os.path.join(os.path.dirname(__file__), DB_FILE)
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+# --- Verbindungs-Management ---
+# Jeder Thread erhält EINE dauerhafte Verbindung (sqlite3-Verbindungen sind nicht
+# threadsicher). WAL erlaubt, dass das Reporting liest, während die Ingestion schreibt.
+STATEMENT_CACHE_SIZE = 256
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",     # In WAL sicher, spart ein fsync pro Commit
+    "PRAGMA busy_timeout = 5000",      # Warten statt 'database is locked'
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",      # ~16 MB Page-Cache
+    "PRAGMA mmap_size = 268435456",    # 256 MB Memory-Mapped I/O
+)
+
+# Je Thread eine Verbindung; alle offenen Verbindungen (auch die von Worker-Threads) stehen in
+# _open_connections, damit close_connections sie schließen kann. Die Generation macht die
+# Thread-Verbindungen nach close_connections ungültig, auch in Threads, die nicht schließen.
+_thread_local = threading.local()
+_open_connections = []
+_open_connections_lock = threading.Lock()
+_connection_generation = 0
+
+# Kind-Tabellen eines Rebalancing-Events (jeweils mit Spalte event_id)
+EVENT_CHILD_TABLES = (
+    "event_canary_details", "event_momentum_ranking", "event_target_portfolio",
+    "event_calculated_trades", "event_correlation_matrix", "event_correlation", "event_inputs",
+)
+
+# Spalten von rebalancing_events (auch für die Migration älterer Datenbanken ohne portfolio_name)
+EVENTS_COLUMNS = f"""
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            portfolio_name TEXT NOT NULL DEFAULT '{settings.DEFAULT_PORTFOLIO}',
+            timestamp TEXT NOT NULL,
+            final_signal TEXT NOT NULL,
+            total_portfolio_value REAL NOT NULL,
+            signal_duration INTEGER,
+            market_breadth_percent REAL,
+            cash_share REAL,
+            UNIQUE (portfolio_name, timestamp)
+"""
+
+# Callbacks (ticker) -> None, die nach jedem Schreiben von Kursen aufgerufen werden
+_price_listeners = []
+
+def get_db_connection() -> sqlite3.Connection:
+    """
+    Liefert die wiederverwendbare Verbindung des aktuellen Threads.
+    Die Verbindung läuft im Autocommit-Modus; Schreibvorgänge gehören in `transaction()`.
+    Sie darf vom Aufrufer NICHT geschlossen werden (siehe `close_connections`).
+    """
+    conn = getattr(_thread_local, 'conn', None)
+    if conn is not None and _thread_local.path == DB_PATH and _thread_local.generation == _connection_generation:
+        return conn
+
+    # check_same_thread=False nur, damit close_connections auch fremde Thread-Verbindungen schließen
+    # kann; benutzt wird jede Verbindung weiterhin nur von ihrem eigenen Thread
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+
+    with _open_connections_lock:
+        _open_connections.append(conn)
+        _thread_local.generation = _connection_generation
+    _thread_local.conn = conn
+    _thread_local.path = DB_PATH
     return conn
 
+@contextmanager
+def transaction():
+    """
+    Kontextmanager für eine Transaktion auf der Thread-Verbindung:
+    COMMIT bei Erfolg, ROLLBACK bei Exception. Verschachtelte Aufrufe
+    laufen in der bereits offenen äußeren Transaktion mit.
+    """
+    conn = get_db_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def close_connections():
+    """
+    Schließt die offenen Verbindungen ALLER Threads (wird beim Prozessende automatisch aufgerufen);
+    mit der letzten Verbindung schreibt SQLite das WAL zurück. Threads, die danach wieder auf die
+    Datenbank zugreifen, erhalten eine neue Verbindung.
+    """
+    global _connection_generation
+    with _open_connections_lock:
+        _connection_generation += 1
+        for conn in _open_connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _open_connections.clear()
+    _thread_local.__dict__.clear()
+
+atexit.register(close_connections)
+
+@tracing.traced("db")
 def initialize_database():
     """Erstellt/verifiziert das gesamte Datenbankschema, inkl. der neuen Kontext-Tabellen."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with transaction() as conn:
+        _create_schema(conn.cursor())
+    print("Datenbank initialisiert und alle Tabellen (inkl. Kontext) erstellt/verifiziert.")
 
-    # --- Preistabellen (unverändert) ---
-    all_tickers = list(set(
-        settings.RISKY_UNIVERSE + settings.CANARY_UNIVERSE + settings.CASH_UNIVERSE
-    ))
-    for ticker in all_tickers:
-        table_name = f"price_{ticker.replace('.', '_')}"
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                date TEXT PRIMARY KEY, close REAL NOT NULL
-            )
-        """)
+def _create_schema(cursor):
 
-    # --- Event-Tabellen ---
+    # --- Preistabelle (ein Long-Format für alle Ticker) ---
+    # Der Primärschlüssel (ticker, date) ist bei WITHOUT ROWID der geclusterte Index
+    # und deckt damit alle Lesezugriffe (ticker, date, close) ohne Tabellen-Lookup ab.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS prices (
+            ticker TEXT NOT NULL, date TEXT NOT NULL, close REAL NOT NULL,
+            PRIMARY KEY (ticker, date)
+        ) WITHOUT ROWID
+    """)
+    # Generation der Tabelle `prices`: steigt mit jedem Schreibvorgang, der Kurse ändert
+    # (Änderungsindikator für den Schnappschuss, unabhängig von der Uhrzeit)
     cursor.execute("""
+        CREATE TABLE IF NOT EXISTS prices_generation (
+            id INTEGER PRIMARY KEY CHECK (id = 1), generation INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO prices_generation (id, generation) VALUES (1, 0)")
+    migrate_legacy_price_tables(cursor)
+
+    # Tages-Schlusskurse (Ingest-Modus "1 day"); `prices` ist dann die daraus gepflegte Monatsend-Sicht
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS prices_daily (
+            ticker TEXT NOT NULL, date TEXT NOT NULL, close REAL NOT NULL,
+            PRIMARY KEY (ticker, date)
+        ) WITHOUT ROWID
+    """)
+
+    # Watermark je Ticker: Datum des zuletzt eingespielten Bars (Basis für inkrementelle Ingestion)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_watermarks (
+            ticker TEXT PRIMARY KEY, last_bar_date TEXT NOT NULL, updated_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO ingest_watermarks (ticker, last_bar_date, updated_at)
+        SELECT ticker, MAX(date), datetime('now') FROM prices GROUP BY ticker
+    """)
+
+    # Persistierter Score-Cache: gültig, solange sich die Bars bis last_bar_date nicht ändern
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS momentum_scores (
+            ticker TEXT NOT NULL, last_bar_date TEXT NOT NULL, weights TEXT NOT NULL, score REAL NOT NULL,
+            PRIMARY KEY (ticker, last_bar_date, weights)
+        ) WITHOUT ROWID
+    """)
+
+    # --- Event-Tabellen ---
+    # Ein Event je Portfolio-Definition und Lauf (settings.PORTFOLIOS), daher (portfolio_name, timestamp) eindeutig
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS rebalancing_events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL UNIQUE,
-            final_signal TEXT NOT NULL,
-            total_portfolio_value REAL NOT NULL,
-            signal_duration INTEGER,
-            market_breadth_percent REAL
+            {EVENTS_COLUMNS}
         )
     """)
+    migrate_events_portfolio_column(cursor)
+    migrate_events_cash_share_column(cursor)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_rebalancing_events_timestamp ON rebalancing_events (timestamp)")
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS event_canary_details (
             id INTEGER PRIMARY KEY AUTOINCREMENT, event_id INTEGER NOT NULL,
@@ -79,81 +229,664 @@ def initialize_database():
         )
     """)
 
-    conn.commit()
-    conn.close()
-    print("Datenbank initialisiert und alle Tabellen (inkl. Kontext) erstellt/verifiziert.")
+    # Korrelationsmatrix binär: Ticker als JSON, oberes Dreieck (inkl. Diagonale) als float64-Blob.
+    # event_correlation_matrix (JSON-Text) wird nur noch für ältere Events gelesen.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS event_correlation (
+            event_id INTEGER PRIMARY KEY, tickers_json TEXT NOT NULL, matrix BLOB NOT NULL,
+            FOREIGN KEY (event_id) REFERENCES rebalancing_events (id)
+        )
+    """)
+
+    # Eingaben der Entscheidung für den Replay: Kursmatrix (Zeilen = Monate, älteste zuerst) als
+    # float64-Blob, Parameter, Positionen und Kurse der Trade-Berechnung als JSON
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS event_inputs (
+            event_id INTEGER PRIMARY KEY, tickers_json TEXT NOT NULL, prices BLOB NOT NULL,
+            parameters_json TEXT NOT NULL, positions_json TEXT NOT NULL, quotes_json TEXT NOT NULL,
+            FOREIGN KEY (event_id) REFERENCES rebalancing_events (id)
+        )
+    """)
+
+    # Indizes für das Zurücklesen der Kind-Daten eines Events
+    for table_name in EVENT_CHILD_TABLES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_event_id ON {table_name} (event_id)")
 
+    # Fortschreibbarer Zustand der rollierenden Kennzahlen (siehe reporting/rolling.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS rolling_state (
+            key TEXT PRIMARY KEY, last_period TEXT, state_json TEXT NOT NULL, updated_at TEXT NOT NULL
+        )
+    """)
+
+    # Kovarianz-Zustand des Universums (siehe strategy/covariance.py), Arrays als float64-Blobs
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS covariance_state (
+            key TEXT PRIMARY KEY, tickers_json TEXT NOT NULL, window_size INTEGER NOT NULL, n INTEGER NOT NULL,
+            last_month TEXT, mean BLOB NOT NULL, comoment BLOB NOT NULL, returns BLOB NOT NULL,
+            last_prices BLOB, prev_prices BLOB, updated_at TEXT NOT NULL
+        )
+    """)
+
+    # Aufgelöste IBKR-Kontrakte (conId) je Symbol und Konfiguration aus settings.py (siehe broker.get_etf_contract)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS contract_cache (
+            symbol TEXT PRIMARY KEY, config_json TEXT NOT NULL, con_id INTEGER NOT NULL,
+            sec_type TEXT, exchange TEXT, primary_exchange TEXT, currency TEXT,
+            local_symbol TEXT, trading_class TEXT, long_name TEXT, updated_at TEXT NOT NULL
+        )
+    """)
+
+    # --- Tracing: ein Span je Schritt, DB-Aufruf und Broker-Anfrage eines Laufs (siehe reporting/tracing.py) ---
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS run_traces (
+            run_id TEXT NOT NULL, span_id INTEGER NOT NULL, parent_id INTEGER,
+            name TEXT NOT NULL, kind TEXT NOT NULL, start_ms REAL NOT NULL, duration_ms REAL NOT NULL,
+            req_id INTEGER, symbol TEXT, timed_out INTEGER NOT NULL DEFAULT 0, error TEXT,
+            thread TEXT, attributes_json TEXT,
+            PRIMARY KEY (run_id, span_id)
+        ) WITHOUT ROWID
+    """)
+
+@tracing.traced("db")
 def save_rebalancing_event(strategie_ergebnis: dict):
     """Speichert ein komplettes Rebalancing-Event inkl. der neuen Kontext-Daten."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        context = strategie_ergebnis.get('entscheidungskontext', {})
-        cursor.execute("""
-            INSERT INTO rebalancing_events (timestamp, final_signal, total_portfolio_value, signal_duration, market_breadth_percent)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            strategie_ergebnis['timestamp_utc'],
-            strategie_ergebnis['canary_report']['final_signal'],
-            strategie_ergebnis['total_portfolio_value'],
-            context.get('signal_duration'),
-            context.get('marktbreite_prozent')
-        ))
-        event_id = cursor.lastrowid
-
-        # Speichern von Canary, Ranking, Portfolio, Trades (unverändert)
-        for ticker, details in strategie_ergebnis['canary_report']['canary_details'].items():
-            cursor.execute("INSERT INTO event_canary_details (event_id, ticker, status, momentum_score) VALUES (?, ?, ?, ?)", (event_id, ticker, details['status'], details['berechnung']['momentum_score']))
-        for i, (ticker, score) in enumerate(strategie_ergebnis['momentum_ranking']):
-            cursor.execute("INSERT INTO event_momentum_ranking (event_id, ticker, momentum_score, rank) VALUES (?, ?, ?, ?)", (event_id, ticker, score, i + 1))
-        for ticker, weight in strategie_ergebnis['portfolio'].items():
-            cursor.execute("INSERT INTO event_target_portfolio (event_id, ticker, weight) VALUES (?, ?, ?)", (event_id, ticker, weight))
-        for trade in strategie_ergebnis['calculated_trades']:
-            cursor.execute("INSERT INTO event_calculated_trades (event_id, symbol, quantity, action) VALUES (?, ?, ?, ?)", (event_id, trade['symbol'], trade['quantity'], trade['action']))
-
-        # Speichern der Korrelationsmatrix
-        if 'korrelations_matrix' in context and context['korrelations_matrix'] is not None:
-            matrix_json = context['korrelations_matrix'].to_json(orient='split')
-            cursor.execute("INSERT INTO event_correlation_matrix (event_id, matrix_json) VALUES (?, ?)", (event_id, matrix_json))
-
-        conn.commit()
+        with transaction() as conn:
+            cursor = conn.cursor()
+            context = strategie_ergebnis.get('entscheidungskontext', {})
+            cursor.execute("""
+                INSERT INTO rebalancing_events (portfolio_name, timestamp, final_signal, total_portfolio_value, signal_duration, market_breadth_percent, cash_share)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                strategie_ergebnis.get('portfolio_name', settings.DEFAULT_PORTFOLIO),
+                strategie_ergebnis['timestamp_utc'],
+                strategie_ergebnis['canary_report']['final_signal'],
+                strategie_ergebnis['total_portfolio_value'],
+                context.get('signal_duration'),
+                context.get('marktbreite_prozent'),
+                strategie_ergebnis.get('cash_anteil')
+            ))
+            event_id = cursor.lastrowid
+
+            # Speichern von Canary, Ranking, Portfolio, Trades (je Tabelle ein executemany)
+            cursor.executemany(
+                "INSERT INTO event_canary_details (event_id, ticker, status, momentum_score) VALUES (?, ?, ?, ?)",
+                [(event_id, ticker, details['status'], details['berechnung']['momentum_score'])
+                 for ticker, details in strategie_ergebnis['canary_report']['canary_details'].items()]
+            )
+            cursor.executemany(
+                "INSERT INTO event_momentum_ranking (event_id, ticker, momentum_score, rank) VALUES (?, ?, ?, ?)",
+                [(event_id, ticker, score, i + 1) for i, (ticker, score) in enumerate(strategie_ergebnis['momentum_ranking'])]
+            )
+            cursor.executemany(
+                "INSERT INTO event_target_portfolio (event_id, ticker, weight) VALUES (?, ?, ?)",
+                [(event_id, ticker, weight) for ticker, weight in strategie_ergebnis['portfolio'].items()]
+            )
+            cursor.executemany(
+                "INSERT INTO event_calculated_trades (event_id, symbol, quantity, action) VALUES (?, ?, ?, ?)",
+                [(event_id, trade['symbol'], trade['quantity'], trade['action']) for trade in strategie_ergebnis['calculated_trades']]
+            )
+
+            # Speichern der Korrelationsmatrix (binär, oberes Dreieck)
+            if 'korrelations_matrix' in context and context['korrelations_matrix'] is not None:
+                cursor.execute(
+                    "INSERT INTO event_correlation (event_id, tickers_json, matrix) VALUES (?, ?, ?)",
+                    (event_id, *_matrix_to_blob(context['korrelations_matrix']))
+                )
+
+            # Speichern der Eingaben (für den Replay)
+            if strategie_ergebnis.get('eingaben') is not None:
+                cursor.execute(
+                    "INSERT INTO event_inputs (event_id, tickers_json, prices, parameters_json, positions_json, quotes_json) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (event_id, *_inputs_to_row(strategie_ergebnis['eingaben']))
+                )
+
         print(f"Rebalancing-Event (ID: {event_id}) vollständig in der Datenbank gespeichert.")
     except Exception as e:
-        conn.rollback()
-        print(f"FEHLER: Das Rebalancing-Event konnte nicht gespeichert werden. Rollback wird ausgeführt. Fehler: {e}")
-    finally:
-        conn.close()
+        print(f"FEHLER: Das Rebalancing-Event konnte nicht gespeichert werden. Rollback wurde ausgeführt. Fehler: {e}")
+
+def _matrix_to_blob(matrix: "pd.DataFrame") -> tuple:
+    """Symmetrische Matrix -> (Ticker als JSON, oberes Dreieck inkl. Diagonale als float64-Bytes)."""
+    werte = matrix.to_numpy(dtype=np.float64)
+    return json.dumps(list(matrix.columns)), werte[np.triu_indices(len(werte))].tobytes()
 
-def get_signal_history() -> list:
-    """Holt die letzten 12 Signale aus der DB, um die Signaldauer zu berechnen."""
+def _matrix_from_blob(tickers_json: str, blob: bytes) -> "pd.DataFrame":
+    import pandas as pd
+    tickers = json.loads(tickers_json)
+    werte = np.empty((len(tickers), len(tickers)))
+    oben = np.triu_indices(len(tickers))
+    werte[oben] = np.frombuffer(blob, dtype=np.float64)
+    werte.T[oben] = werte[oben]
+    return pd.DataFrame(werte, index=tickers, columns=tickers)
+
+def _inputs_to_row(eingaben: dict) -> tuple:
+    """Eingaben eines Events -> (Ticker-JSON, Kursmatrix-Blob, Parameter-, Positions- und Kurs-JSON)."""
+    preise = eingaben['preise']
+    zeilen = max((len(kurse) for kurse in preise.values()), default=0)
+    matrix = np.full((zeilen, len(preise)), np.nan)
+    for spalte, kurse in enumerate(preise.values()):
+        if len(kurse):
+            matrix[zeilen - len(kurse):, spalte] = kurse
+    return (json.dumps(list(preise)), matrix.tobytes(), json.dumps(eingaben['parameter']),
+            json.dumps(eingaben['positionen']), json.dumps(eingaben['kurse']))
+
+def _inputs_from_row(row) -> dict:
+    tickers = json.loads(row['tickers_json'])
+    matrix = np.frombuffer(row['prices'], dtype=np.float64).reshape(-1, len(tickers)) if tickers else np.empty((0, 0))
+    return {
+        'preise': {t: matrix[~np.isnan(matrix[:, i]), i].tolist() for i, t in enumerate(tickers)},
+        'parameter': json.loads(row['parameters_json']),
+        'positionen': json.loads(row['positions_json']),
+        'kurse': json.loads(row['quotes_json']),
+    }
+
+@tracing.traced("db")
+def load_events(since: str = None, until: str = None, portfolio_name: str = None) -> list:
+    """
+    Lädt alle Rebalancing-Events mit since <= timestamp <= until (ISO-Strings, jeweils optional)
+    inkl. aller Kind-Daten, mit `portfolio_name` nur die Events dieses Portfolios. Unabhängig von der Anzahl der Events werden genau
+    1 + len(EVENT_CHILD_TABLES) Abfragen ausgeführt.
+
+    Returns:
+        Liste von Event-Dicts (älteste zuerst) mit den Schlüsseln der Tabelle rebalancing_events
+        sowie 'canary_details', 'momentum_ranking', 'portfolio', 'calculated_trades', 'korrelations_matrix'
+        und 'eingaben' (Kurse, Parameter, Positionen und Kurse der Trade-Berechnung; None bei älteren Events).
+    """
     conn = get_db_connection()
-    cursor = conn.cursor()
+    where = "WHERE timestamp >= ? AND timestamp <= ?"
+    params = (since or "", until or "\uffff")
+    if portfolio_name is not None:
+        where += " AND portfolio_name = ?"
+        params += (portfolio_name,)
+
+    events = {}
+    for row in conn.execute(f"SELECT * FROM rebalancing_events {where} ORDER BY timestamp", params):
+        event = dict(row)
+        event.update(canary_details={}, momentum_ranking=[], portfolio={}, calculated_trades=[], korrelations_matrix=None,
+                     eingaben=None)
+        events[row['id']] = event
+    if not events:
+        return []
+
+    event_filter = f"event_id IN (SELECT id FROM rebalancing_events {where})"
+    for row in conn.execute(f"SELECT event_id, ticker, status, momentum_score FROM event_canary_details WHERE {event_filter} ORDER BY id", params):
+        events[row['event_id']]['canary_details'][row['ticker']] = {'status': row['status'], 'momentum_score': row['momentum_score']}
+    for row in conn.execute(f"SELECT event_id, ticker, momentum_score FROM event_momentum_ranking WHERE {event_filter} ORDER BY event_id, rank", params):
+        events[row['event_id']]['momentum_ranking'].append((row['ticker'], row['momentum_score']))
+    for row in conn.execute(f"SELECT event_id, ticker, weight FROM event_target_portfolio WHERE {event_filter} ORDER BY id", params):
+        events[row['event_id']]['portfolio'][row['ticker']] = row['weight']
+    for row in conn.execute(f"SELECT event_id, symbol, quantity, action FROM event_calculated_trades WHERE {event_filter} ORDER BY id", params):
+        events[row['event_id']]['calculated_trades'].append({'symbol': row['symbol'], 'quantity': row['quantity'], 'action': row['action']})
+    import pandas as pd
+    for row in conn.execute(f"SELECT event_id, matrix_json FROM event_correlation_matrix WHERE {event_filter} ORDER BY id", params):
+        events[row['event_id']]['korrelations_matrix'] = pd.read_json(io.StringIO(row['matrix_json']), orient='split')
+    for row in conn.execute(f"SELECT event_id, tickers_json, matrix FROM event_correlation WHERE {event_filter}", params):
+        events[row['event_id']]['korrelations_matrix'] = _matrix_from_blob(row['tickers_json'], row['matrix'])
+    for row in conn.execute(f"SELECT * FROM event_inputs WHERE {event_filter}", params):
+        events[row['event_id']]['eingaben'] = _inputs_from_row(row)
+
+    return list(events.values())
+
+@tracing.traced("db")
+def get_signal_history(portfolio_name: str = None) -> list:
+    """Holt die letzten 12 Signale eines Portfolios aus der DB, um die Signaldauer zu berechnen."""
     try:
-        cursor.execute("SELECT final_signal FROM rebalancing_events ORDER BY timestamp DESC LIMIT 12")
-        rows = cursor.fetchall()
+        rows = get_db_connection().execute(
+            "SELECT final_signal FROM rebalancing_events WHERE portfolio_name = ? ORDER BY timestamp DESC LIMIT 12",
+            (portfolio_name or settings.DEFAULT_PORTFOLIO,)
+        ).fetchall()
         return [row['final_signal'] for row in reversed(rows)] # Ältestes zuerst
-    except:
+    except sqlite3.Error:
         return [] # Bei Fehler oder leerer Tabelle
-    finally:
-        conn.close()
 
-# --- Bestehende Preis-Funktionen (unverändert) ---
-def save_prices_for_ticker(ticker: str, prices_df: pd.DataFrame):
-    table_name = f"price_{ticker.replace('.', '_')}"
-    conn = get_db_connection()
-    prices_df.to_sql(table_name, conn, if_exists='replace', index=False)
-    conn.close()
+# --- Preis-Funktionen ---
+def _legacy_table_ticker_map() -> dict:
+    """Ordnet alte Tabellennamen (price_<TICKER>) ihrem Ticker zu ('.' wurde zu '_')."""
+    return {f"price_{ticker.replace('.', '_')}": ticker for ticker in settings.ASSET_CONTRACTS}
+
+def migrate_events_portfolio_column(cursor):
+    """
+    Baut rebalancing_events älterer Datenbanken (timestamp UNIQUE, ohne portfolio_name) um.
+    Die ids bleiben erhalten, die Kind-Tabellen zeigen damit weiter auf ihre Events.
+    """
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(rebalancing_events)")]
+    if 'portfolio_name' in columns:
+        return
+    cursor.execute(f"CREATE TABLE rebalancing_events_neu ({EVENTS_COLUMNS})")
+    cursor.execute(f"""
+        INSERT INTO rebalancing_events_neu (id, timestamp, final_signal, total_portfolio_value, signal_duration, market_breadth_percent)
+        SELECT id, timestamp, final_signal, total_portfolio_value, signal_duration, market_breadth_percent FROM rebalancing_events
+    """)
+    cursor.execute("DROP TABLE rebalancing_events")
+    cursor.execute("ALTER TABLE rebalancing_events_neu RENAME TO rebalancing_events")
+    print(f"Tabelle 'rebalancing_events' um die Spalte 'portfolio_name' erweitert (bestehende Events: '{settings.DEFAULT_PORTFOLIO}').")
+
+def migrate_events_cash_share_column(cursor):
+    """Ergänzt rebalancing_events um den Cash-Anteil (ältere Events: NULL)."""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(rebalancing_events)")]
+    if 'cash_share' not in columns:
+        cursor.execute("ALTER TABLE rebalancing_events ADD COLUMN cash_share REAL")
+
+def migrate_legacy_price_tables(cursor):
+    """Überführt die alten Einzeltabellen price_<TICKER> in die Tabelle 'prices' und löscht sie."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'price\\_%' ESCAPE '\\'")
+    legacy_tables = [row[0] for row in cursor.fetchall()]
+    if not legacy_tables:
+        return
+
+    ticker_map = _legacy_table_ticker_map()
+    for table_name in legacy_tables:
+        ticker = ticker_map.get(table_name, table_name[len("price_"):])
+        cursor.execute(
+            f"INSERT OR REPLACE INTO prices (ticker, date, close) SELECT ?, date, close FROM {table_name}",
+            (ticker,)
+        )
+        cursor.execute(f"DROP TABLE {table_name}")
+    _bump_price_generation(cursor)
+    print(f"{len(legacy_tables)} alte Preistabellen in die Tabelle 'prices' migriert.")
+
+@tracing.traced("db")
+def save_prices_for_ticker(ticker: str, prices_df: "pd.DataFrame"):
+    rows = list(zip(
+        [ticker] * len(prices_df),
+        prices_df['date'].astype(str),
+        prices_df['close'].astype(float)
+    ))
+    with transaction() as conn:
+        conn.execute("DELETE FROM prices WHERE ticker = ?", (ticker,))
+        conn.executemany("INSERT INTO prices (ticker, date, close) VALUES (?, ?, ?)", rows)
+        _set_watermark(conn, ticker)
+        _bump_price_generation(conn)
+        conn.execute("DELETE FROM momentum_scores WHERE ticker = ?", (ticker,))
+    _notify_price_listeners(ticker)
     print(f"{len(prices_df)} Kurse für {ticker} gespeichert.")
 
+@tracing.traced("db")
+def upsert_prices_for_ticker(ticker: str, prices_df: "pd.DataFrame") -> int:
+    """
+    Fügt neue Bars ein bzw. aktualisiert revidierte Bars (z.B. den laufenden Monat)
+    und schreibt den Watermark des Tickers - alles in einer Transaktion.
+
+    Returns:
+        Anzahl der tatsächlich neuen oder geänderten Kurse.
+    """
+    rows = list(zip(
+        [ticker] * len(prices_df),
+        prices_df['date'].astype(str),
+        prices_df['close'].astype(float)
+    ))
+    with transaction() as conn:
+        changed = _upsert_price_rows(conn, ticker, rows)
+    if changed:
+        _notify_price_listeners(ticker)
+    return changed
+
+def _upsert_price_rows(conn, ticker: str, rows: list) -> int:
+    changes_before = conn.total_changes
+    conn.executemany("""
+        INSERT INTO prices (ticker, date, close) VALUES (?, ?, ?)
+        ON CONFLICT (ticker, date) DO UPDATE SET close = excluded.close
+        WHERE close != excluded.close
+    """, rows)
+    changed = conn.total_changes - changes_before
+    _set_watermark(conn, ticker)
+    if changed:
+        _bump_price_generation(conn)
+    if changed and rows:
+        # Nur Scores, deren 13-Monats-Fenster einen geschriebenen Bar enthält, werden ungültig
+        conn.execute(
+            "DELETE FROM momentum_scores WHERE ticker = ? AND last_bar_date >= ?",
+            (ticker, min(row[1] for row in rows))
+        )
+    return changed
+
+@tracing.traced("db")
+def upsert_daily_prices_for_ticker(ticker: str, prices_df: "pd.DataFrame") -> int:
+    """
+    Upsert von Tages-Schlusskursen und inkrementelle Pflege der Monatsend-Sicht in `prices`:
+    nur die Monate ab dem frühesten geänderten Tag werden neu aggregiert (letzter Kurs je Monat,
+    im laufenden Monat also der jüngste Tag als Vorschau). Alles in einer Transaktion.
+
+    Returns:
+        Anzahl der tatsächlich neuen oder geänderten Tageskurse.
+    """
+    rows = list(zip(
+        [ticker] * len(prices_df),
+        prices_df['date'].astype(str),
+        prices_df['close'].astype(float)
+    ))
+    if not rows:
+        return 0
+    with transaction() as conn:
+        changes_before = conn.total_changes
+        conn.executemany("""
+            INSERT INTO prices_daily (ticker, date, close) VALUES (?, ?, ?)
+            ON CONFLICT (ticker, date) DO UPDATE SET close = excluded.close
+            WHERE close != excluded.close
+        """, rows)
+        changed = conn.total_changes - changes_before
+        if not changed:
+            return 0
+
+        erster_monat = min(row[1] for row in rows)[:7] + "-01"
+        monatsenden = conn.execute("""
+            SELECT d.date, d.close FROM prices_daily d
+            JOIN (SELECT MAX(date) AS date FROM prices_daily WHERE ticker = ? AND date >= ?
+                  GROUP BY substr(date, 1, 7)) m ON d.date = m.date
+            WHERE d.ticker = ?
+        """, (ticker, erster_monat, ticker)).fetchall()
+        # Ältere Monatsend-Bars desselben Monats (z.B. Monats-Bars von IBKR) durch den neuen Monatsend-Tag ersetzen
+        changes_before = conn.total_changes
+        conn.executemany(
+            "DELETE FROM prices WHERE ticker = ? AND date >= ? AND date < ? AND date != ?",
+            [(ticker, row['date'][:7], row['date'][:7] + "-\uffff", row['date']) for row in monatsenden]
+        )
+        if conn.total_changes != changes_before:
+            _bump_price_generation(conn)
+        _upsert_price_rows(conn, ticker, [(ticker, row['date'], row['close']) for row in monatsenden])
+    _notify_price_listeners(ticker)
+    return changed
+
+def register_price_listener(callback):
+    """Registriert einen Callback(ticker), der nach jedem Schreiben neuer Kurse aufgerufen wird."""
+    _price_listeners.append(callback)
+
+def _notify_price_listeners(ticker: str):
+    for callback in _price_listeners:
+        callback(ticker)
+
+def _bump_price_generation(conn):
+    conn.execute("UPDATE prices_generation SET generation = generation + 1 WHERE id = 1")
+
+def _set_watermark(conn, ticker: str):
+    conn.execute("""
+        INSERT INTO ingest_watermarks (ticker, last_bar_date, updated_at)
+        SELECT ticker, MAX(date), datetime('now') FROM prices WHERE ticker = ? GROUP BY ticker
+        ON CONFLICT (ticker) DO UPDATE SET last_bar_date = excluded.last_bar_date, updated_at = excluded.updated_at
+    """, (ticker,))
+
+@tracing.traced("db")
+def get_ingest_watermark(ticker: str):
+    """Datum ('YYYY-MM-DD') des zuletzt eingespielten Bars oder None, falls noch nie geladen."""
+    row = get_db_connection().execute(
+        "SELECT last_bar_date FROM ingest_watermarks WHERE ticker = ?", (ticker,)
+    ).fetchone()
+    return row['last_bar_date'] if row else None
+
+@tracing.traced("db")
+def get_ingest_watermarks(tickers: list) -> dict:
+    """Watermarks mehrerer Ticker mit einer Abfrage ({ticker: last_bar_date})."""
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+    rows = get_db_connection().execute(
+        f"SELECT ticker, last_bar_date FROM ingest_watermarks WHERE ticker IN ({', '.join('?' * len(tickers))})",
+        tickers
+    ).fetchall()
+    return {row['ticker']: row['last_bar_date'] for row in rows}
+
+@tracing.traced("db")
+def get_daily_watermarks(tickers: list) -> dict:
+    """Datum des jüngsten gespeicherten Tageskurses je Ticker ({ticker: 'YYYY-MM-DD'})."""
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+    rows = get_db_connection().execute(
+        f"SELECT ticker, MAX(date) AS date FROM prices_daily WHERE ticker IN ({', '.join('?' * len(tickers))}) GROUP BY ticker",
+        tickers
+    ).fetchall()
+    return {row['ticker']: row['date'] for row in rows}
+
+# --- Score-Cache ---
+@tracing.traced("db")
+def get_momentum_scores(keys: list, weights: str) -> dict:
+    """Persistierte Scores für [(ticker, last_bar_date), ...] -> {(ticker, last_bar_date): score}."""
+    if not keys:
+        return {}
+    values = ", ".join(["(?, ?)"] * len(keys))
+    params = [weights] + [item for key in keys for item in key]
+    try:
+        rows = get_db_connection().execute(f"""
+            SELECT ticker, last_bar_date, score FROM momentum_scores
+            WHERE weights = ? AND (ticker, last_bar_date) IN (VALUES {values})
+        """, params).fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {(row['ticker'], row['last_bar_date']): row['score'] for row in rows}
+
+@tracing.traced("db")
+def save_momentum_scores(scores: dict, weights: str):
+    """Speichert {(ticker, last_bar_date): score} im persistierten Score-Cache."""
+    if not scores:
+        return
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO momentum_scores (ticker, last_bar_date, weights, score) VALUES (?, ?, ?, ?)",
+            [(ticker, last_bar_date, weights, score) for (ticker, last_bar_date), score in scores.items()]
+        )
+
+@tracing.traced("db")
 def get_prices_for_ticker(ticker: str, limit: int = 13) -> list:
-    table_name = f"price_{ticker.replace('.', '_')}"
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute(f"SELECT close FROM {table_name} ORDER BY date DESC LIMIT ?", (limit,))
-        rows = cursor.fetchall()
+        rows = get_db_connection().execute(
+            "SELECT close FROM prices WHERE ticker = ? ORDER BY date DESC LIMIT ?", (ticker, limit)
+        ).fetchall()
         return [row['close'] for row in reversed(rows)]
     except sqlite3.OperationalError:
         return []
-    finally:
-        conn.close()
\ No newline at end of file
+
+@tracing.traced("db")
+def get_prices_for_universe(tickers: list, limit: int = 13) -> "pd.DataFrame":
+    """
+    Lädt die letzten `limit` Kurse JEDES Tickers mit einer einzigen Abfrage.
+
+    Die Kurse werden über den Kalendermonat ('YYYY-MM') ausgerichtet, da die Monats-Bars
+    je nach Börse unterschiedliche Datumsstempel tragen. Ergebnis ist eine Matrix
+    Monat x Ticker (float64, fehlende Kurse = NaN); `limit=None` lädt die gesamte Historie.
+    """
+    import pandas as pd
+    tickers = list(tickers)
+    if not tickers:
+        return pd.DataFrame(dtype=np.float64)
+
+    placeholders = ", ".join("?" * len(tickers))
+    params = list(tickers)
+    if limit is None:
+        query = f"SELECT ticker, date, close FROM prices WHERE ticker IN ({placeholders}) ORDER BY date"
+    else:
+        query = f"""
+            SELECT ticker, date, close FROM (
+                SELECT ticker, date, close,
+                       ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY date DESC) AS rn
+                FROM prices WHERE ticker IN ({placeholders})
+            ) WHERE rn <= ? ORDER BY date
+        """
+        params.append(limit)
+
+    try:
+        rows = get_db_connection().execute(query, params).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+
+    if not rows:
+        return pd.DataFrame(np.empty((0, len(tickers))), index=pd.Index([], name='monat'), columns=tickers)
+
+    spalte = {ticker: i for i, ticker in enumerate(tickers)}
+    ticker_col, date_col, close_col = zip(*rows)
+    monate, zeilen = np.unique([d[:7] for d in date_col], return_inverse=True)
+    spalten = np.fromiter((spalte[t] for t in ticker_col), dtype=np.intp, count=len(rows))
+    matrix = np.full((len(monate), len(tickers)), np.nan)
+    # Sortiert nach Datum: bei mehreren Bars im selben Monat gewinnt der letzte
+    matrix[zeilen, spalten] = close_col
+
+    return pd.DataFrame(matrix, index=pd.Index(monate, name='monat'), columns=tickers)
+
+@tracing.traced("db")
+def get_daily_prices(tickers: list, since: str = None) -> "pd.DataFrame":
+    """Tages-Schlusskurse als Matrix Tag x Ticker (z.B. für tägliche Risikokennzahlen), fehlende = NaN."""
+    import pandas as pd
+    tickers = list(tickers)
+    rows = get_db_connection().execute(
+        f"SELECT ticker, date, close FROM prices_daily WHERE ticker IN ({', '.join('?' * len(tickers))}) AND date >= ?",
+        tickers + [since or ""]
+    ).fetchall() if tickers else []
+    if not rows:
+        return pd.DataFrame(np.empty((0, len(tickers))), index=pd.Index([], name='datum'), columns=tickers)
+    spalte = {ticker: i for i, ticker in enumerate(tickers)}
+    ticker_col, date_col, close_col = zip(*rows)
+    tage, zeilen = np.unique(date_col, return_inverse=True)
+    matrix = np.full((len(tage), len(tickers)), np.nan)
+    matrix[zeilen, [spalte[t] for t in ticker_col]] = close_col
+    return pd.DataFrame(matrix, index=pd.Index(tage, name='datum'), columns=tickers)
+
+@tracing.traced("db")
+def get_prices_as_of(tickers: list, stichtag: str, limit: int = 13) -> "pd.DataFrame":
+    """
+    Monatskurse zu einem beliebigen Stichtag ('YYYY-MM-DD') aus den Tageskursen: je Monat der
+    letzte Kurs an oder vor demselben Tag des Monats (z.B. der 15. statt des Monatsendes).
+    Ergebnis wie get_prices_for_universe: `limit` Zeilen Monat x Ticker, älteste zuerst.
+    """
+    import pandas as pd
+    import calendar
+    jahr, monat, tag = (int(teil) for teil in stichtag.split("-"))
+    stichtage = []
+    for k in range(limit - 1, -1, -1):
+        j, m = divmod((jahr * 12 + monat - 1) - k, 12)
+        stichtage.append(f"{j:04d}-{m + 1:02d}-{min(tag, calendar.monthrange(j, m + 1)[1]):02d}")
+
+    # Ein Monat Vorlauf, damit auch der älteste Stichtag seinen letzten Kurs davor findet
+    j, m = divmod((jahr * 12 + monat - 1) - limit, 12)
+    tageskurse = get_daily_prices(tickers, since=f"{j:04d}-{m + 1:02d}-01")
+    tickers = list(tickers)
+    matrix = np.full((limit, len(tickers)), np.nan)
+    if len(tageskurse):
+        tage = tageskurse.index.to_numpy(dtype=str)
+        werte = tageskurse.to_numpy()
+        for spalte in range(len(tickers)):
+            vorhanden = ~np.isnan(werte[:, spalte])
+            tage_t, werte_t = tage[vorhanden], werte[vorhanden, spalte]
+            if not len(tage_t):
+                continue
+            pos = np.searchsorted(tage_t, stichtage, side='right') - 1
+            # Nur Kurse aus der Periode seit dem vorherigen Stichtag zählen (keine veralteten Kurse bei Lücken)
+            gueltig = pos >= 0
+            gueltig[1:] &= tage_t[np.maximum(pos[1:], 0)] > np.array(stichtage[:-1])
+            matrix[gueltig, spalte] = werte_t[pos[gueltig]]
+    return pd.DataFrame(matrix, index=pd.Index([s[:7] for s in stichtage], name='monat'), columns=tickers)
+
+# --- Rollierende Kennzahlen ---
+@tracing.traced("db")
+def get_portfolio_values(since: str = None, portfolio_name: str = None) -> list:
+    """[(timestamp, total_portfolio_value), ...] der Events eines Portfolios mit timestamp >= since, älteste zuerst."""
+    rows = get_db_connection().execute(
+        "SELECT timestamp, total_portfolio_value FROM rebalancing_events "
+        "WHERE portfolio_name = ? AND timestamp >= ? ORDER BY timestamp",
+        (portfolio_name or settings.DEFAULT_PORTFOLIO, since or "")
+    ).fetchall()
+    return [(row['timestamp'], row['total_portfolio_value']) for row in rows]
+
+@tracing.traced("db")
+def load_rolling_state(key: str):
+    """Gespeicherter Zustand (Dict) der rollierenden Kennzahlen oder None."""
+    try:
+        row = get_db_connection().execute("SELECT state_json FROM rolling_state WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return json.loads(row['state_json']) if row else None
+
+@tracing.traced("db")
+def save_rolling_state(key: str, state: dict):
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO rolling_state (key, last_period, state_json, updated_at) VALUES (?, ?, ?, datetime('now'))",
+            (key, state.get('last_period'), json.dumps(state))
+        )
+
+@tracing.traced("db")
+def load_covariance_state(key: str):
+    """Gespeicherter Kovarianz-Zustand (Dict mit Blobs, siehe covariance.KovarianzZustand.from_record) oder None."""
+    try:
+        row = get_db_connection().execute("SELECT * FROM covariance_state WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if row is None:
+        return None
+    return {
+        'tickers': json.loads(row['tickers_json']), 'fenster': row['window_size'], 'n': row['n'],
+        'letzter_monat': row['last_month'], 'mittel': row['mean'], 'komoment': row['comoment'],
+        'renditen': row['returns'], 'letzte_kurse': row['last_prices'], 'vorherige_kurse': row['prev_prices'],
+    }
+
+@tracing.traced("db")
+def save_covariance_state(key: str, state: dict):
+    with transaction() as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO covariance_state
+                (key, tickers_json, window_size, n, last_month, mean, comoment, returns, last_prices, prev_prices, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+        """, (
+            key, json.dumps(state['tickers']), state['fenster'], state['n'], state['letzter_monat'],
+            state['mittel'], state['komoment'], state['renditen'], state['letzte_kurse'], state['vorherige_kurse']
+        ))
+
+@tracing.traced("db")
+def load_contract_cache() -> dict:
+    """{symbol: Zeile des Kontrakt-Caches als Dict}; leer, wenn die Tabelle (noch) fehlt."""
+    try:
+        rows = get_db_connection().execute("SELECT * FROM contract_cache").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {row['symbol']: dict(row) for row in rows}
+
+@tracing.traced("db")
+def save_contract_cache(contracts: dict):
+    """Speichert aufgelöste Kontrakte ({symbol: dict mit den Spalten von contract_cache})."""
+    if not contracts:
+        return
+    with transaction() as conn:
+        conn.executemany("""
+            INSERT OR REPLACE INTO contract_cache
+                (symbol, config_json, con_id, sec_type, exchange, primary_exchange, currency,
+                 local_symbol, trading_class, long_name, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+        """, [
+            (symbol, c['config_json'], c['con_id'], c['sec_type'], c['exchange'], c['primary_exchange'],
+             c['currency'], c['local_symbol'], c['trading_class'], c['long_name'])
+            for symbol, c in contracts.items()
+        ])
+
+# --- Tracing ---
+def save_run_traces(spans: list):
+    """Speichert die Spans eines Laufs (siehe tracing.end_run) in der Tabelle run_traces."""
+    if not spans:
+        return
+    with transaction() as conn:
+        conn.executemany("""
+            INSERT OR REPLACE INTO run_traces (run_id, span_id, parent_id, name, kind, start_ms, duration_ms,
+                                               req_id, symbol, timed_out, error, thread, attributes_json)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (s['run_id'], s['span_id'], s['parent_id'], s['name'], s['kind'], s['start_ms'], s['duration_ms'],
+             s['req_id'], s['symbol'], int(s['timed_out']), s['error'], s['thread'],
+             json.dumps(s['attributes']) if s['attributes'] else None)
+            for s in spans
+        ])
+
+def load_run_traces(run_id: str = None) -> list:
+    """Spans eines Laufs (ohne run_id: des letzten Laufs) als Liste von Dicts, sortiert nach span_id."""
+    conn = get_db_connection()
+    if run_id is None:
+        row = conn.execute("SELECT MAX(run_id) AS run_id FROM run_traces").fetchone()
+        run_id = row['run_id'] if row else None
+        if run_id is None:
+            return []
+    spans = []
+    for row in conn.execute("SELECT * FROM run_traces WHERE run_id = ? ORDER BY span_id", (run_id,)):
+        span = dict(row)
+        span['timed_out'] = bool(span['timed_out'])
+        attributes = span.pop('attributes_json')
+        span['attributes'] = json.loads(attributes) if attributes else None
+        spans.append(span)
+    return spans
@@ -1,38 +1,112 @@
 # DAA Momentum Bot/data/ingest.py
 
-import pandas as pd
-import threading
-import time
+import asyncio
 import sys
 import os
+from datetime import date, datetime
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
-from data import database
+from data import database, snapshot
 from config import settings
 from execution import broker
+from execution.async_broker import AsyncIBKRClient
+from reporting import tracing
+from strategy import covariance
 
-def update_data_for_ticker(app, ticker: str):
+# Umfang eines vollständigen Downloads (erster Abruf oder Nachladen bei Lücken)
+VOLLE_HISTORIE = "2 Y"
+VOLLE_HISTORIE_MONATE = 24
+# Längster Zeitraum, den IBKR in Tagen ("N D") annimmt; darüber wird die volle Historie geladen
+MAX_TAGE_ABFRAGE = 365
+
+def berechne_abfragedauer(watermark, heute: date = None) -> str:
+    """
+    Bestimmt den IBKR-durationStr für den fehlenden Zeitraum seit dem Watermark.
+    Der Monat des Watermarks wird mitgeladen, da sein Bar (laufender Monat) revidiert sein kann.
+    """
+    if watermark is None:
+        return VOLLE_HISTORIE
+    heute = heute or date.today()
+    letzter_bar = datetime.strptime(watermark, '%Y-%m-%d').date()
+    monate = (heute.year - letzter_bar.year) * 12 + (heute.month - letzter_bar.month) + 1
+    if monate >= VOLLE_HISTORIE_MONATE:
+        return VOLLE_HISTORIE
+    return f"{max(monate, 1)} M"
+
+def berechne_abfragedauer_taeglich(watermark, heute: date = None) -> str:
+    """Wie berechne_abfragedauer, aber in Tagen für Tages-Bars (der Tag des Watermarks wird mitgeladen)."""
+    if watermark is None:
+        return VOLLE_HISTORIE
+    heute = heute or date.today()
+    tage = (heute - datetime.strptime(watermark, '%Y-%m-%d').date()).days + 1
+    if tage > MAX_TAGE_ABFRAGE:
+        return VOLLE_HISTORIE
+    return f"{max(tage, 1)} D"
+
+def update_data_for_ticker(app, ticker: str, voll: bool = False):
     """
-    Holt die historischen Daten für einen einzelnen Ticker von IBKR und speichert sie.
+    Holt die fehlenden historischen Daten für einen einzelnen Ticker von IBKR und speichert sie.
+    Standardmäßig wird nur der Zeitraum seit dem letzten gespeicherten Bar abgefragt;
+    mit `voll=True` wird die komplette Historie neu geladen (z.B. bei Lücken).
     Diese Funktion kann von anderen Modulen aufgerufen werden.
     """
-    print(f"--- Starte Daten-Download für Ticker: {ticker} ---")
-    
-    # 1. Rufe die Funktion aus broker.py auf, um die echten Daten zu holen
-    raw_data = broker.get_data_for_ticker_ibkr(app, ticker)
-    
-    # 2. Verarbeite und speichere die Daten
-    if raw_data:
-        # Wandle die Rohdaten in einen sauberen DataFrame um
-        price_df = pd.DataFrame(raw_data, columns=['date', 'close'])
-        price_df['date'] = pd.to_datetime(price_df['date'], format='%Y%m%d').dt.strftime('%Y-%m-%d')
-        
-        # Speichere den DataFrame in unserer lokalen Datenbank
-        database.save_prices_for_ticker(ticker, price_df)
-    else:
-        print(f"WARNUNG: Keine historischen Daten für {ticker} von IBKR erhalten. Überspringe.")
+    update_data_for_tickers(app, [ticker], voll=voll)
+
+def update_data_for_tickers(app, tickers: list, voll: bool = False, dauer: str = None):
+    """
+    Wie update_data_for_ticker, aber alle Anfragen gehen gleichzeitig an IBKR.
+    Die Laufzeit entspricht damit ungefähr der langsamsten Einzelanfrage.
+    Ein fester durationStr `dauer` (z.B. "240 M" in den Benchmarks) ersetzt den aus den
+    Watermarks bestimmten Zeitraum für alle Ticker.
+
+    Mit settings.INGEST_BAR_SIZE = "1 day" werden Tageskurse gespeichert und die Monatsend-Sicht
+    `prices` (die Strategie, Backtest und Reports lesen) daraus inkrementell nachgeführt.
+    """
+    taeglich = settings.INGEST_BAR_SIZE == "1 day"
+
+    # 1. Bestimme je Ticker den fehlenden Zeitraum und frage alle parallel an
+    if taeglich:
+        watermarks = {} if voll or dauer else database.get_daily_watermarks(tickers)
+    dauer_je_ticker = {}
+    for ticker in tickers:
+        if dauer:
+            dauer_je_ticker[ticker] = dauer
+        elif taeglich:
+            dauer_je_ticker[ticker] = berechne_abfragedauer_taeglich(watermarks.get(ticker))
+        else:
+            watermark = None if voll else database.get_ingest_watermark(ticker)
+            dauer_je_ticker[ticker] = berechne_abfragedauer(watermark)
+        print(f"--- Starte Daten-Download für Ticker: {ticker} (Zeitraum: {dauer_je_ticker[ticker]}) ---")
+
+    raw_data_je_ticker = asyncio.run(
+        AsyncIBKRClient(app).historical_data_many(dauer_je_ticker, bar_size=settings.INGEST_BAR_SIZE)
+    )
+
+    # 2. Verarbeite und speichere die Daten (pandas erst hier laden: hält den Kaltstart bis zur ersten Anfrage kurz)
+    import pandas as pd
+    for ticker in tickers:
+        raw_data = raw_data_je_ticker.get(ticker)
+        if raw_data:
+            # Wandle die Rohdaten in einen sauberen DataFrame um
+            price_df = pd.DataFrame(raw_data, columns=['date', 'close'])
+            price_df['date'] = pd.to_datetime(price_df['date'], format='%Y%m%d').dt.strftime('%Y-%m-%d')
+
+            # Neue bzw. revidierte Bars per Upsert in die lokale Datenbank übernehmen
+            if taeglich:
+                geaendert = database.upsert_daily_prices_for_ticker(ticker, price_df)
+            else:
+                geaendert = database.upsert_prices_for_ticker(ticker, price_df)
+            print(f"{len(price_df)} Kurse für {ticker} empfangen, {geaendert} neu oder revidiert.")
+        else:
+            print(f"WARNUNG: Keine historischen Daten für {ticker} von IBKR erhalten. Überspringe.")
+
+    # 3. Spalten-Schnappschuss für Backtests und Reports nachziehen (nur geänderte Ticker)
+    stand = snapshot.refresh_snapshot()
+    if stand['updated'] or stand['removed']:
+        print(f"Kurs-Schnappschuss aktualisiert: {len(stand['updated'])} Ticker neu geladen "
+              f"({stand['months']} Monate x {stand['tickers']} Ticker).")
 
 def update_all_data():
     """
@@ -43,11 +117,9 @@ def update_all_data():
     print("=== Starte manuelle Daten-Ingestion von IBKR         ===")
     print("======================================================")
 
-    app = broker.IBKRClient()
-    app.connect("127.0.0.1", 7497, clientId=456)
-    api_thread = threading.Thread(target=app.run, daemon=True)
-    api_thread.start()
-    time.sleep(3)
+    tracing.start_run("ingest")
+    tracing.step("Verbindung zu IBKR")
+    app = broker.connect_ibkr(client_id=456)
 
     all_tickers = list(set(
         settings.RISKY_UNIVERSE + 
@@ -55,10 +127,16 @@ def update_all_data():
         settings.CASH_UNIVERSE
     ))
     
-    for ticker in all_tickers:
-        update_data_for_ticker(app, ticker)
+    tracing.step("Historische Daten abrufen und speichern")
+    update_data_for_tickers(app, all_tickers)
+
+    # Kovarianz-Zustand des Universums mit den neuen Monats-Bars fortschreiben
+    tracing.step("Kovarianz-Zustand fortschreiben")
+    zustand = covariance.aktualisiere_kovarianz(all_tickers)
+    print(f"Kovarianz-Zustand: {len(zustand.tickers)} Ticker, {zustand.n} Renditen bis {zustand.letzter_monat}.")
             
     app.disconnect()
+    tracing.end_run()
     print("\n======================================================")
     print("=== Manuelle Daten-Ingestion abgeschlossen         ===")
     print("======================================================")
@@ -0,0 +1,189 @@
+# data/snapshot.py
+
+import os
+import json
+import sqlite3
+import numpy as np
+
+from data import database
+from reporting import tracing
+
+# Spaltenorientierter Schnappschuss des gesamten Kurs-Panels neben etf_data.db:
+#   <db>_snapshot/snapshot.json   Monate ('YYYY-MM'), Ticker-Index, Generation, Fingerabdrücke je Ticker
+#   <db>_snapshot/preise_<n>.npy  float64-Matrix Monat x Ticker (NaN = kein Kurs), per np.load(mmap_mode='r')
+# Ein Refresh schreibt zuerst die neue Matrix und ersetzt dann snapshot.json atomar; Leser sehen
+# immer einen konsistenten Stand, bereits geöffnete Memory-Maps bleiben auch nach dem Löschen gültig.
+SNAPSHOT_FORMAT = 1
+META_FILE = "snapshot.json"
+
+
+def snapshot_dir() -> str:
+    """Verzeichnis des Schnappschusses (folgt database.DB_PATH, z.B. in den Benchmarks)."""
+    return os.path.splitext(database.DB_PATH)[0] + "_snapshot"
+
+
+def _lade_meta():
+    try:
+        with open(os.path.join(snapshot_dir(), META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('format') == SNAPSHOT_FORMAT else None
+
+
+def _stand(conn) -> list:
+    """Billiger Änderungsindikator: jeder Schreibvorgang, der Kurse ändert, erhöht die Generation von `prices`."""
+    try:
+        row = conn.execute("SELECT generation FROM prices_generation WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        # Noch nicht mit initialize_database aktualisiert: ohne Generation schreibt auch niemand Kurse
+        return [0]
+    return [row[0] if row else 0]
+
+
+def _fingerabdruecke(conn) -> dict:
+    """{ticker: [Anzahl, letztes Datum, Summe der Kurse]} - ändert sich bei neuen UND revidierten Bars."""
+    rows = conn.execute(
+        "SELECT ticker, COUNT(*), MAX(date), TOTAL(close) FROM prices GROUP BY ticker"
+    ).fetchall()
+    return {row[0]: [row[1], row[2], row[3]] for row in rows}
+
+
+@tracing.traced("db")
+def refresh_snapshot() -> dict:
+    """
+    Bringt den Schnappschuss auf den Stand der Tabelle `prices`.
+
+    Nur Ticker, deren Fingerabdruck sich seit dem letzten Refresh geändert hat, werden
+    aus SQLite nachgeladen; die übrigen Spalten werden aus der alten Matrix übernommen.
+
+    Returns:
+        Dict mit 'tickers', 'months', 'updated' (neu geladene Ticker) und 'removed'.
+    """
+    conn = database.get_db_connection()
+    stand = _stand(conn)
+    try:
+        fingerabdruecke = _fingerabdruecke(conn)
+    except sqlite3.OperationalError:
+        fingerabdruecke = {}
+
+    meta = _lade_meta()
+    alt_tickers = meta['tickers'] if meta else []
+    alt_fingerabdruecke = meta['fingerprints'] if meta else {}
+    geaendert = [t for t, fp in fingerabdruecke.items() if alt_fingerabdruecke.get(t) != fp]
+    entfernt = [t for t in alt_tickers if t not in fingerabdruecke]
+
+    if meta is not None and not geaendert and not entfernt:
+        if meta['stand'] != stand:
+            meta['stand'] = stand
+            _schreibe_meta(meta)
+        return {'tickers': len(alt_tickers), 'months': len(meta['months']), 'updated': [], 'removed': []}
+
+    # Nur die geänderten Ticker aus der Datenbank lesen (ein Abruf)
+    neue_kurse = database.get_prices_for_universe(geaendert, limit=None) if geaendert else None
+
+    tickers = [t for t in alt_tickers if t in fingerabdruecke]
+    tickers += sorted(t for t in geaendert if t not in alt_tickers)
+    monate = set(meta['months']) if meta else set()
+    if neue_kurse is not None:
+        monate.update(neue_kurse.index)
+    monate = sorted(monate)
+
+    matrix = np.full((len(monate), len(tickers)), np.nan)
+    zeile = {m: i for i, m in enumerate(monate)}
+    spalte = {t: i for i, t in enumerate(tickers)}
+    if meta is not None:
+        alt = np.load(os.path.join(snapshot_dir(), meta['matrix']), mmap_mode='r')
+        behalten = [t for t in tickers if t in alt_tickers and t not in geaendert]
+        if behalten:
+            alt_spalte = {t: i for i, t in enumerate(alt_tickers)}
+            zeilen = np.array([zeile[m] for m in meta['months']], dtype=np.intp)
+            matrix[np.ix_(zeilen, [spalte[t] for t in behalten])] = alt[:, [alt_spalte[t] for t in behalten]]
+        del alt
+    if neue_kurse is not None and len(neue_kurse):
+        zeilen = np.array([zeile[m] for m in neue_kurse.index], dtype=np.intp)
+        matrix[np.ix_(zeilen, [spalte[t] for t in geaendert])] = neue_kurse.to_numpy(dtype=np.float64)
+
+    # Monate, in denen nach dem Entfernen von Tickern kein Kurs mehr steht, fallen weg
+    belegt = ~np.isnan(matrix).all(axis=1) if len(tickers) else np.zeros(len(monate), dtype=bool)
+    if not belegt.all():
+        matrix = matrix[belegt]
+        monate = [m for m, b in zip(monate, belegt) if b]
+
+    generation = (meta['generation'] + 1) if meta else 1
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    matrix_datei = f"preise_{generation}.npy"
+    np.save(os.path.join(snapshot_dir(), matrix_datei), matrix)
+    _schreibe_meta({
+        'format': SNAPSHOT_FORMAT,
+        'generation': generation,
+        'matrix': matrix_datei,
+        'months': monate,
+        'tickers': tickers,
+        'fingerprints': fingerabdruecke,
+        'stand': stand,
+    })
+    # Alte Generationen aufräumen (offene Memory-Maps anderer Prozesse bleiben gültig)
+    for datei in os.listdir(snapshot_dir()):
+        if datei.startswith("preise_") and datei != matrix_datei:
+            try:
+                os.remove(os.path.join(snapshot_dir(), datei))
+            except OSError:
+                pass
+
+    return {'tickers': len(tickers), 'months': len(monate), 'updated': geaendert, 'removed': entfernt}
+
+
+def _schreibe_meta(meta: dict):
+    pfad = os.path.join(snapshot_dir(), META_FILE)
+    with open(pfad + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(pfad + ".tmp", pfad)
+
+
+def load_snapshot(tickers: list = None, aktualisieren: bool = True) -> tuple:
+    """
+    Öffnet den Schnappschuss per Memory-Mapping (ohne Kopie, ohne SQL-Parsing).
+
+    Mit `aktualisieren=True` wird vorher in einer einzigen Abfrage geprüft, ob seit dem
+    letzten Refresh Kurse geschrieben wurden, und der Schnappschuss ggf. inkrementell erneuert.
+    Ohne `tickers` ist `preise` die schreibgeschützte Memory-Map des ganzen Panels; mit
+    `tickers` werden nur deren Spalten (fehlende = NaN) und die Monate mit mindestens einem
+    Kurs geliefert - dieselbe Matrix wie database.get_prices_for_universe(tickers, limit=None).
+    Liegen die `tickers` in dieser Reihenfolge direkt nebeneinander im Panel (z.B. ein einzelner
+    Ticker) und ihre Monate ohne Lücke, ist das ein schreibgeschützter Ausschnitt der Memory-Map,
+    sonst eine Kopie.
+
+    Returns:
+        (monate, tickers, preise) mit monate als np.ndarray von 'YYYY-MM'-Strings.
+    """
+    meta = _lade_meta()
+    if aktualisieren:
+        stand = _stand(database.get_db_connection())
+        if meta is None or meta['stand'] != stand:
+            refresh_snapshot()
+            meta = _lade_meta()
+    if meta is None:
+        return np.array([], dtype=str), list(tickers or []), np.empty((0, len(tickers or [])))
+
+    monate = np.array(meta['months'], dtype=str)
+    preise = np.load(os.path.join(snapshot_dir(), meta['matrix']), mmap_mode='r')
+    if tickers is None:
+        return monate, list(meta['tickers']), preise
+
+    tickers = list(tickers)
+    spalte = {t: i for i, t in enumerate(meta['tickers'])}
+    if tickers and all(t in spalte for t in tickers):
+        erste = spalte[tickers[0]]
+        if [spalte[t] for t in tickers] == list(range(erste, erste + len(tickers))):
+            ausschnitt = preise[:, erste:erste + len(tickers)]
+            zeilen = np.flatnonzero(~np.isnan(ausschnitt).all(axis=1))
+            if zeilen.size == 0 or zeilen[-1] - zeilen[0] + 1 == zeilen.size:
+                von, bis = (zeilen[0], zeilen[-1] + 1) if zeilen.size else (0, 0)
+                return monate[von:bis], tickers, ausschnitt[von:bis]
+    auswahl = np.full((len(monate), len(tickers)), np.nan)
+    vorhanden = [i for i, t in enumerate(tickers) if t in spalte]
+    if vorhanden:
+        auswahl[:, vorhanden] = preise[:, [spalte[tickers[i]] for i in vorhanden]]
+    belegt = ~np.isnan(auswahl).all(axis=1)
+    return monate[belegt], tickers, auswahl[belegt]
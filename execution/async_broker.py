@@ -0,0 +1,97 @@
+# execution/async_broker.py
+
+import asyncio
+from execution.broker import IBKRClient, positions_by_symbol
+
+
+class AsyncIBKRClient:
+    """
+    asyncio-Fassade über IBKRClient.
+
+    Die Callbacks laufen weiterhin im EReader-Thread und erfüllen dort die
+    concurrent.futures der Request-Registry; `asyncio.wrap_future` reicht sie
+    threadsicher in die Event-Loop weiter. Unabhängige Abrufe lassen sich so
+    mit `asyncio.gather` parallel abwarten, statt nacheinander zu blockieren.
+    """
+
+    def __init__(self, client: IBKRClient):
+        self.client = client
+
+    async def _await(self, future, timeout: float):
+        """Wartet höchstens `timeout` Sekunden auf ein Registry-Future, ohne es abzubrechen."""
+        wrapped = asyncio.wrap_future(future)
+        # Fehler (auch ein späterer Timeout) werden über das Registry-Future ausgewertet
+        wrapped.add_done_callback(lambda f: f.cancelled() or f.exception())
+        await asyncio.wait([wrapped], timeout=timeout)
+
+    async def historical_data(self, symbol: str, duration_str: str = "2 Y", timeout: float = 15,
+                              bar_size: str = "1 month") -> list:
+        loop = asyncio.get_running_loop()
+        # Der Pacer kann bei erreichtem Limit blockieren -> außerhalb der Event-Loop anfragen
+        future = await loop.run_in_executor(None, self.client.request_historical_data, symbol, duration_str,
+                                            bar_size, timeout)
+        await self._await(future, timeout)
+        return self.client.collect_historical_result(symbol, future, timeout)
+
+    async def historical_data_many(self, durations: dict, timeout: float = 15, bar_size: str = "1 month") -> dict:
+        results = await asyncio.gather(*(
+            self.historical_data(symbol, dauer, timeout, bar_size) for symbol, dauer in durations.items()
+        ))
+        return dict(zip(durations, results))
+
+    async def position_list(self, timeout: float = 10) -> list:
+        """Alle Positionen als Liste von {'account', 'symbol', 'position'}."""
+        future = self.client.request_positions()
+        await self._await(future, timeout)
+        self.client.finish_partial(future)
+        return self.client.result_or_default(future, [], "Abruf der Positionen")
+
+    async def positions(self, timeout: float = 10, account: str = None) -> dict:
+        return positions_by_symbol(await self.position_list(timeout), account)
+
+    async def account_summary(self, timeout: float = 10) -> dict:
+        future = self.client.request_account_summary()
+        await self._await(future, timeout)
+        self.client.finish_partial(future)
+        return self.client.result_or_default(future, {}, "Abruf der Kontoübersicht")
+
+    async def snapshot(self, symbols, timeout: float = 5) -> dict:
+        prices, requests = self.client.start_snapshots(symbols)
+        if requests:
+            await asyncio.wait([asyncio.wrap_future(r.future) for r in requests.values()], timeout=timeout)
+        return self.client.collect_snapshots(prices, requests)
+
+    async def place_order(self, symbol: str, quantity: int, action: str, timeout: float = 60) -> dict:
+        future = self.client.place_market_order(symbol, quantity, action)
+        await self._await(future, timeout)
+        return self.client.collect_order_result(future)
+
+
+async def get_account_details_and_prices(app: IBKRClient, symbols) -> tuple:
+    """
+    Fragt Kontoübersicht, Positionen und Kurse der `symbols` gleichzeitig ab.
+    Kurse für gehaltene Positionen außerhalb von `symbols` werden im Anschluss nachgeladen.
+
+    Returns:
+        (cash, {symbol: stückzahl}, {symbol: kurs})
+    """
+    summary, positions, prices = await get_accounts_and_prices(app, symbols)
+    return summary.get("TotalCashValue", 0), positions_by_symbol(positions), prices
+
+
+async def get_accounts_and_prices(app: IBKRClient, symbols) -> tuple:
+    """
+    Wie get_account_details_and_prices, aber mit den Rohdaten aller Konten des Logins,
+    z.B. für mehrere Portfolios auf Unterkonten in einem einzigen Abruf.
+
+    Returns:
+        (kontoübersicht inkl. 'accounts', [{'account', 'symbol', 'position'}, ...], {symbol: kurs})
+    """
+    client = AsyncIBKRClient(app)
+    summary, positions, prices = await asyncio.gather(
+        client.account_summary(), client.position_list(), client.snapshot(symbols)
+    )
+    missing = list(dict.fromkeys(p['symbol'] for p in positions if p['symbol'] not in prices))
+    if missing:
+        prices.update(await client.snapshot(missing))
+    return summary, positions, prices
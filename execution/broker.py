@@ -7,141 +7,799 @@ from ibapi.order import Order
 from ibapi.ticktype import TickTypeEnum
 import threading
 import time
+import itertools
+import collections
+from datetime import datetime, timezone
+from concurrent.futures import Future, wait, TimeoutError as FutureTimeoutError
+import json
 from config import settings
+from reporting import tracing
+
+# Fehlercodes, die nur informieren und eine laufende Anfrage NICHT beenden
+INFO_ERROR_CODES = {399, 2100, 2104, 2106, 2109, 2158, 2174, 2176, 10167}
+
+# Pacing-Verstoß bei historischen Daten: die Anfrage wird nach einer Pause neu eingereicht
+PACING_VIOLATION_ERROR_CODE = 162
+
+# Erste reqId der Request-Registry. orderIds (ab nextValidId, oft 1) und reqIds teilen sich in
+# error() einen Zahlenraum; reqIds liegen daher weit darüber (int32, IBKR vergibt orderIds aufsteigend).
+REQ_ID_START = 1_000_000_000
+
+# Endzustände einer Order laut orderStatus (außer "Filled", das zusätzlich auf Executions wartet)
+ORDER_END_STATES = {"Cancelled", "ApiCancelled", "Inactive"}
+
+
+class IBKRRequestError(Exception):
+    """Eine einzelne IBKR-Anfrage wurde von TWS mit einem Fehler beendet."""
+    def __init__(self, req_id: int, error_code: int, error_string: str):
+        super().__init__(f"Anfrage {req_id}: Fehler {error_code}, {error_string}")
+        self.req_id = req_id
+        self.error_code = error_code
+
+
+class HistoricalDataPacer:
+    """
+    Begrenzt historische Anfragen auf die IBKR-Pacing-Limits:
+    höchstens `max_open` gleichzeitig offene Anfragen und höchstens
+    `max_per_window` neue Anfragen je `window_seconds` (Standard: 50 / 60 je 10 Minuten).
+    Mit `safety_margin` (Anteil) bleibt der Pacer unter dem Fensterlimit und rechnet mit einem
+    entsprechend längeren Fenster, weil TWS das Fenster ab dem Eingang der Anfrage zählt und
+    Laufzeitschwankungen sonst zu Pacing-Verstößen (Fehler 162) führen.
+    Das Warten auf einen offenen Slot ist über `timeout` begrenzt, das Warten auf das Zeitfenster
+    nicht (es ist durch `window_seconds` beschränkt).
+
+    Abgelehnte Anfragen werden bis zu `retries` Mal neu eingereicht, nach einer Pause von
+    `backoff_seconds` (Standard: ein Fenster-Intervall je Anfrage), die sich je Versuch verdoppelt.
+    """
+    def __init__(self, max_open: int = 50, max_per_window: int = 60, window_seconds: float = 600,
+                 label: str = "historische Daten", safety_margin: float = 0.1, retries: int = 3,
+                 backoff_seconds: float = None):
+        self.label = label
+        self.max_per_window = max(1, int(max_per_window * (1 - safety_margin)))
+        self.window_seconds = window_seconds * (1 + safety_margin)
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds if backoff_seconds is not None else window_seconds / max_per_window
+        self._open_slots = threading.BoundedSemaphore(max_open)
+        self._started = collections.deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float = None):
+        if not self._open_slots.acquire(timeout=timeout):
+            raise FutureTimeoutError(f"Kein freier Slot für {self.label} innerhalb von {timeout} s.")
+        self.wait_for_window()
+
+    def wait_for_window(self):
+        """Wartet, bis das Zeitfenster eine weitere Anfrage erlaubt, und vermerkt sie (ohne offenen Slot)."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._started and now - self._started[0] >= self.window_seconds:
+                    self._started.popleft()
+                if len(self._started) < self.max_per_window:
+                    self._started.append(now)
+                    return
+                wait_seconds = self.window_seconds - (now - self._started[0])
+            print(f"Pacing-Limit für {self.label} erreicht. Warte {wait_seconds:.0f} s...")
+            time.sleep(wait_seconds)
+
+    def release(self):
+        self._open_slots.release()
+
+
+class _PendingRequest:
+    """Eintrag in der Request-Registry: sammelt die Callback-Daten einer reqId."""
+    __slots__ = ('req_id', 'kind', 'symbol', 'data', 'future', 'on_finish', 'started', 'attrs', 'timer',
+                 'resubmit', 'attempts')
+
+    def __init__(self, req_id: int, kind: str, symbol: str = None, on_finish=None):
+        self.req_id = req_id
+        self.kind = kind
+        self.symbol = symbol
+        self.data = []
+        self.future = Future()
+        self.on_finish = on_finish
+        self.started = time.perf_counter()
+        self.attrs = {}   # Zusatzangaben für das Tracing (z.B. Wartezeit im Pacer)
+        self.timer = None  # Timeout ab Registrierung (siehe IBKRClient._register_request)
+        self.resubmit = None  # sendet die Anfrage unter derselben reqId erneut (nach Pacing-Verstoß)
+        self.attempts = 0
+
+
+class _PendingOrder:
+    """Eintrag im Order-Tracking: Status, Executions und Kommissionen einer orderId."""
+    __slots__ = ('order_id', 'symbol', 'action', 'quantity', 'status', 'filled', 'avg_price',
+                 'fills', 'submitted_utc', 'future', 'started')
+
+    def __init__(self, order_id: int, symbol: str, action: str, quantity: int):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.action = action
+        self.quantity = quantity
+        self.status = "PendingSubmit"
+        self.filled = 0.0
+        self.avg_price = 0.0
+        self.fills = {}   # execId -> Fill-Dict
+        self.submitted_utc = datetime.now(timezone.utc).isoformat()
+        self.future = Future()
+        self.started = time.perf_counter()
+
+    def is_complete(self) -> bool:
+        if self.status in ORDER_END_STATES:
+            return True
+        return (self.status == "Filled" and self.filled >= self.quantity and bool(self.fills)
+                and all(f['commission'] is not None for f in self.fills.values()))
+
+    def result(self) -> dict:
+        fills = list(self.fills.values())
+        return {
+            'order_id': self.order_id,
+            'symbol': self.symbol,
+            'action': self.action,
+            'quantity': self.quantity,
+            'status': self.status,
+            'filled': self.filled,
+            'avg_price': self.avg_price,
+            'commission': sum((f['commission'] or 0.0 for f in fills), 0.0),
+            'fills': fills,
+            'submitted_utc': self.submitted_utc,
+            'completed_utc': datetime.now(timezone.utc).isoformat(),
+        }
+
 
 class IBKRClient(EWrapper, EClient):
     def __init__(self):
         EClient.__init__(self, self)
-        self.historical_data = []
-        self.portfolio_data = []
-        self.account_summary = {}
-        self.current_price = 0
-        
-        self.data_received_event = threading.Event()
-        self.portfolio_received_event = threading.Event()
-        self.account_summary_received_event = threading.Event()
-        self.price_received_event = threading.Event()
+
+        # Kurs-Cache: symbol -> (preis, zeitpunkt); wird von Bewertung und Trade-Berechnung geteilt
+        self.quote_cache = {}
+        self.quote_cache_ttl = settings.QUOTE_CACHE_TTL_SECONDS
+
+        # Request-Registry: eindeutige reqIds, Callbacks werden je reqId an ein Future geleitet
+        self._req_id_counter = itertools.count(REQ_ID_START)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._positions_req_id = None
+        self.historical_pacer = HistoricalDataPacer()
+        # Kontrakt-Abfragen: viele gleichzeitig, aber unter dem Nachrichten-Limit von TWS (50/s)
+        self.contract_details_pacer = HistoricalDataPacer(max_open=50, max_per_window=40, window_seconds=1,
+                                                          label="Kontrakt-Abfragen")
+
+        # Kontrakte je Symbol (bei bekannter conId aus dem Kontrakt-Cache der Datenbank), einmal gebaut
+        self._contracts = None
+
+        # API-Bereitschaft: wird gesetzt, sobald TWS nach dem Handshake nextValidId schickt
+        self.ready = threading.Event()
+        self.next_order_id = None
+
+        # Order-Tracking: orderIds stammen aus nextValidId, Callbacks laufen je orderId in ein Future
+        self._orders = {}
+        self._exec_orders = {}   # execId -> orderId (für commissionReport)
+
+    # --- Verbindung ---
+    def nextValidId(self, orderId: int):
+        super().nextValidId(orderId)
+        with self._pending_lock:
+            self.next_order_id = max(orderId, self.next_order_id or 0)
+        self.ready.set()
+
+    def connectionClosed(self):
+        super().connectionClosed()
+        self.ready.clear()
+
+    # --- Request-Registry ---
+    def _register_request(self, kind: str, symbol: str = None, on_finish=None, timeout: float = None,
+                          on_timeout=None) -> _PendingRequest:
+        """
+        Vergibt eine reqId und legt die Anfrage in der Registry ab. Mit `timeout` wird die Anfrage
+        so viele Sekunden nach der Registrierung abgebrochen (`on_timeout(req_id)`, z.B. ein
+        cancel*-Aufruf) und mit FutureTimeoutError beendet - auch wenn der Aufrufer noch weitere
+        Anfragen einreicht. Damit geben hängende Anfragen ihren Pacer-Slot frei.
+        """
+        with self._pending_lock:
+            req_id = next(self._req_id_counter)
+            request = _PendingRequest(req_id, kind, symbol, on_finish)
+            self._pending[req_id] = request
+        if timeout is not None:
+            request.timer = threading.Timer(timeout, self._expire_request, (req_id, on_timeout))
+            request.timer.daemon = True
+            request.timer.start()
+        return request
+
+    def _expire_request(self, req_id: int, on_timeout=None):
+        if self._get_request(req_id) is None:
+            return
+        if on_timeout:
+            on_timeout(req_id)
+        self._finish_request(req_id, FutureTimeoutError())
+
+    def _get_request(self, req_id: int):
+        with self._pending_lock:
+            return self._pending.get(req_id)
+
+    def _finish_request(self, req_id: int, error: Exception = None, timed_out: bool = False):
+        """
+        Entfernt die Anfrage aus der Registry und erfüllt ihr Future (Ergebnis oder Fehler).
+        `timed_out` markiert Anfragen, die nach einem Timeout mit Teildaten beendet werden.
+        """
+        with self._pending_lock:
+            request = self._pending.pop(req_id, None)
+        if request is None:
+            return
+        if request.timer is not None:
+            request.timer.cancel()
+        tracing.record_span(
+            f"ibkr.{request.kind}", "broker", request.started, req_id=req_id, symbol=request.symbol,
+            timed_out=timed_out or isinstance(error, FutureTimeoutError),
+            error=str(error) if error is not None and not isinstance(error, FutureTimeoutError) else None,
+            items=len(request.data), **request.attrs,
+        )
+        if request.on_finish:
+            request.on_finish()
+        if request.future.done():
+            return
+        if error is not None:
+            request.future.set_exception(error)
+        else:
+            request.future.set_result(request.data)
+
+    def _retry_request(self, req_id: int) -> bool:
+        """
+        Plant eine wegen Pacing abgelehnte Anfrage zum erneuten Einreichen ein (mit Backoff).
+        False, wenn die Anfrage nicht wiederholbar ist oder keine Versuche mehr übrig sind.
+        """
+        request = self._get_request(req_id)
+        pacer = self.historical_pacer
+        if request is None or request.resubmit is None or request.attempts >= pacer.retries:
+            return False
+        request.attempts += 1
+        request.attrs['retries'] = request.attempts
+        request.data = []
+        backoff = pacer.backoff_seconds * 2 ** (request.attempts - 1)
+        print(f"WARNUNG: Pacing-Verstoß für {request.symbol}. Versuch {request.attempts} von {pacer.retries} in {backoff:.1f} s...")
+        timer = threading.Timer(backoff, self._resubmit_request, (request,))
+        timer.daemon = True
+        timer.start()
+        return True
+
+    def _resubmit_request(self, request: _PendingRequest):
+        # Der offene Slot bleibt belegt, nur das Zeitfenster zählt den neuen Versuch
+        self.historical_pacer.wait_for_window()
+        if self._get_request(request.req_id) is request:   # nicht inzwischen per Timeout beendet
+            request.resubmit()
 
     def historicalData(self, reqId, bar):
-        self.historical_data.append([bar.date, bar.close])
+        request = self._get_request(reqId)
+        if request is not None:
+            request.data.append([bar.date, bar.close])
 
     def historicalDataEnd(self, reqId, start: str, end: str):
         super().historicalDataEnd(reqId, start, end)
-        self.data_received_event.set()
+        self._finish_request(reqId)
+
+    def contractDetails(self, reqId, contractDetails):
+        request = self._get_request(reqId)
+        if request is not None:
+            request.data.append(contractDetails)
+
+    def contractDetailsEnd(self, reqId):
+        super().contractDetailsEnd(reqId)
+        self._finish_request(reqId)
 
     def accountSummary(self, reqId, account, tag, value, currency):
-        if tag == "TotalCashValue":
-            self.account_summary[tag] = float(value)
+        request = self._get_request(reqId)
+        if request is not None and tag == "TotalCashValue":
+            # Je Konto festhalten (Unterkonten eines Logins); der Wert ohne Konto ist die Summe aller Konten
+            request.data.setdefault('accounts', {}).setdefault(account, {})[tag] = float(value)
+            request.data[tag] = sum(werte[tag] for werte in request.data['accounts'].values())
 
     def accountSummaryEnd(self, reqId: int):
         super().accountSummaryEnd(reqId)
-        self.account_summary_received_event.set()
+        self._finish_request(reqId)
 
     def position(self, account: str, contract: Contract, position: float, avgCost: float):
-        if position != 0:
-            self.portfolio_data.append({'symbol': contract.symbol, 'position': int(position)})
+        request = self._get_request(self._positions_req_id)
+        if request is not None and position != 0:
+            request.data.append({'account': account, 'symbol': contract.symbol, 'position': int(position)})
 
     def positionEnd(self):
         super().positionEnd()
-        self.portfolio_received_event.set()
+        self._finish_request(self._positions_req_id)
 
     def tickPrice(self, reqId, tickType, price, attrib):
         # 4 = LAST_PRICE, 9 = CLOSE_PRICE
         if tickType in [4, 9] and price > 0:
-            self.current_price = price
-            self.price_received_event.set()
+            request = self._get_request(reqId)
+            if request is not None:
+                request.data.append((tickType, price))
+
+    def tickSnapshotEnd(self, reqId: int):
+        super().tickSnapshotEnd(reqId)
+        self._finish_request(reqId)
 
     def error(self, reqId, errorCode, errorString, advancedOrderReject=""):
         super().error(reqId, errorCode, errorString)
         if errorCode not in [2104, 2106, 2158, 2109, 2100]:
              print(f"Error: {errorCode}, {errorString}")
+        if errorCode in INFO_ERROR_CODES:
+            return
+        if errorCode == PACING_VIOLATION_ERROR_CODE and self._retry_request(reqId):
+            return
+        if self._get_order(reqId) is not None:
+            self._finish_order(reqId, IBKRRequestError(reqId, errorCode, errorString))
+        elif self._get_request(reqId) is not None:
+            self._finish_request(reqId, IBKRRequestError(reqId, errorCode, errorString))
 
-    def get_etf_contract(self, symbol: str) -> Contract:
-        contract_details = settings.ASSET_CONTRACTS.get(symbol)
-        if not contract_details:
-            raise ValueError(f"Keine Kontrakt-Details für Symbol {symbol} in settings.py gefunden.")
+    # --- Order-Tracking ---
+    def _get_order(self, order_id: int):
+        with self._pending_lock:
+            return self._orders.get(order_id)
 
-        contract = Contract()
-        contract.symbol = contract_details["symbol"]
-        
-        # Liest den secType jetzt dynamisch aus den Settings
-        contract.secType = contract_details.get("secType", "STK") # Standardwert ist "STK"
-            
-        contract.exchange = contract_details["exchange"]
-        contract.currency = contract_details["currency"]
-        
-        if "primaryExchange" in contract_details:
-            contract.primaryExchange = contract_details["primaryExchange"]
+    def _finish_order(self, order_id: int, error: Exception = None, timed_out: bool = False):
+        """
+        Entfernt die Order aus dem Tracking und erfüllt ihr Future mit dem aktuellen Stand.
+        Von TWS abgelehnte Orders erhalten den Status "Error" und die Fehlermeldung.
+        """
+        with self._pending_lock:
+            order = self._orders.pop(order_id, None)
+            if order is not None:
+                for exec_id in order.fills:
+                    self._exec_orders.pop(exec_id, None)
+        if order is None or order.future.done():
+            return
+        if error is not None:
+            order.status = "Error"
+        tracing.record_span(
+            f"ibkr.order.{order.action.lower()}", "broker", order.started, req_id=order_id, symbol=order.symbol,
+            timed_out=timed_out, error=str(error) if error is not None else None,
+            status=order.status, filled=order.filled, quantity=order.quantity,
+        )
+        result = order.result()
+        if error is not None:
+            result['error'] = str(error)
+        order.future.set_result(result)
+
+    def orderStatus(self, orderId, status, filled, remaining, avgFillPrice, permId, parentId,
+                    lastFillPrice, clientId, whyHeld, mktCapPrice):
+        super().orderStatus(orderId, status, filled, remaining, avgFillPrice, permId, parentId,
+                            lastFillPrice, clientId, whyHeld, mktCapPrice)
+        order = self._get_order(orderId)
+        if order is not None:
+            order.status, order.filled, order.avg_price = status, float(filled), float(avgFillPrice)
+            if order.is_complete():
+                self._finish_order(orderId)
 
+    def execDetails(self, reqId, contract, execution):
+        super().execDetails(reqId, contract, execution)
+        order = self._get_order(execution.orderId)
+        if order is None:
+            return
+        with self._pending_lock:
+            self._exec_orders[execution.execId] = execution.orderId
+        order.fills[execution.execId] = {
+            'exec_id': execution.execId,
+            'time': execution.time,
+            'shares': float(execution.shares),
+            'price': float(execution.price),
+            'commission': None,
+            'currency': None,
+        }
+        if order.is_complete():
+            self._finish_order(order.order_id)
+
+    def commissionReport(self, commissionReport):
+        super().commissionReport(commissionReport)
+        with self._pending_lock:
+            order = self._orders.get(self._exec_orders.get(commissionReport.execId))
+        if order is None or commissionReport.execId not in order.fills:
+            return
+        fill = order.fills[commissionReport.execId]
+        fill['commission'] = float(commissionReport.commission)
+        fill['currency'] = commissionReport.currency
+        if order.is_complete():
+            self._finish_order(order.order_id)
+
+    def get_etf_contract(self, symbol: str) -> Contract:
+        """
+        Kontrakt eines Symbols. Ist für die Konfiguration aus settings.py eine conId im
+        Kontrakt-Cache hinterlegt, wird sie mitgegeben und TWS muss den Kontrakt nicht mehr
+        auflösen. Der Kontrakt wird je Symbol nur einmal gebaut.
+        """
+        if self._contracts is None:
+            self._contracts = self._load_cached_contracts()
+        contract = self._contracts.get(symbol)
+        if contract is None:
+            contract = contract_from_settings(symbol)
+            self._contracts[symbol] = contract
         return contract
 
-    def fetch_historical_data(self, symbol: str):
+    @staticmethod
+    def _load_cached_contracts() -> dict:
+        from data import database
+        contracts = {}
+        for symbol, row in database.load_contract_cache().items():
+            # Nur Einträge, die zur aktuellen Konfiguration in settings.py gehören
+            if symbol in settings.ASSET_CONTRACTS and row['config_json'] == contract_config_json(symbol):
+                contract = contract_from_settings(symbol)
+                contract.conId = row['con_id']
+                if row['primary_exchange']:
+                    contract.primaryExchange = row['primary_exchange']
+                contracts[symbol] = contract
+        return contracts
+
+    def request_contract_details(self, contract: Contract, symbol: str = None, timeout: float = None) -> Future:
+        """
+        Fordert die ContractDetails zu einem Kontrakt an; das Future liefert die Liste aller Treffer.
+        Mit `timeout` endet es spätestens so viele Sekunden nach dem Einreichen (FutureTimeoutError).
+        """
+        wartebeginn = time.perf_counter()
+        try:
+            self.contract_details_pacer.acquire(timeout)
+        except FutureTimeoutError as e:
+            return _failed_future(e)
+        request = self._register_request("contract_details", symbol or contract.symbol,
+                                         on_finish=self.contract_details_pacer.release, timeout=timeout)
+        request.attrs['pacing_wait_ms'] = (request.started - wartebeginn) * 1000
+        self.reqContractDetails(request.req_id, contract)
+        return request.future
+
+    def fetch_contract_details_many(self, contracts: dict, timeout: float = 10) -> dict:
+        """
+        Fragt ContractDetails für viele Kontrakte gleichzeitig an ({schlüssel: Contract}).
+        Liefert {schlüssel: [ContractDetails, ...]}; Fehler (kein Treffer) und Timeouts liefern [].
+        """
+        futures = {key: self.request_contract_details(contract, timeout=timeout) for key, contract in contracts.items()}
+        wait(futures.values())   # jede Anfrage endet spätestens `timeout` s nach ihrer Registrierung
+        return {key: future.result() if future.exception() is None else [] for key, future in futures.items()}
+
+    def resolve_contracts(self, symbols, timeout: float = 10) -> dict:
+        """
+        Löst die Kontrakte aus settings.py gleichzeitig bei TWS auf und legt die Treffer
+        (inkl. conId) im Kontrakt-Cache ab, den get_etf_contract danach direkt verwendet.
+
+        Returns:
+            {symbol: ContractDetails oder None, wenn TWS keinen passenden Kontrakt kennt oder das
+            Symbol ohne passende primaryExchange mehrdeutig ist}.
+        """
+        from data import database
+        symbols = list(dict.fromkeys(symbols))
+        treffer = self.fetch_contract_details_many({s: contract_from_settings(s) for s in symbols}, timeout)
+        ergebnis = {symbol: choose_contract_details(symbol, treffer[symbol]) for symbol in symbols}
+        database.save_contract_cache({
+            symbol: contract_cache_row(symbol, details) for symbol, details in ergebnis.items() if details is not None
+        })
+        self._contracts = None   # beim nächsten Zugriff mit den neuen conIds neu aufbauen
+        return ergebnis
+
+    def request_historical_data(self, symbol: str, duration_str: str = "2 Y", bar_size: str = "1 month",
+                                timeout: float = None) -> Future:
+        """
+        Stellt eine Anfrage für Bars (Standard: Monats-Bars, "1 day" für Tages-Bars) und liefert
+        sofort ein Future mit der Bar-Liste. Blockiert nur, wenn die Pacing-Limits für historische
+        Daten erreicht sind; von TWS wegen Pacing abgelehnte Anfragen werden nach einer Pause neu
+        eingereicht (siehe HistoricalDataPacer). Mit `timeout` wird die Anfrage so viele Sekunden nach dem Einreichen
+        abgebrochen (das Future endet mit FutureTimeoutError); ebenso lange wird höchstens auf
+        einen offenen Slot gewartet.
+        """
         contract = self.get_etf_contract(symbol)
-        self.historical_data = []
-        self.data_received_event.clear()
-        
-        self.reqHistoricalData(
-            reqId=int(time.time()),
+        wartebeginn = time.perf_counter()
+        try:
+            self.historical_pacer.acquire(timeout)
+        except FutureTimeoutError as e:
+            return _failed_future(e)
+        request = self._register_request("historical", symbol, on_finish=self.historical_pacer.release,
+                                         timeout=timeout, on_timeout=self.cancelHistoricalData)
+        request.attrs['pacing_wait_ms'] = (request.started - wartebeginn) * 1000
+
+        request.resubmit = lambda: self.reqHistoricalData(
+            reqId=request.req_id,
             contract=contract,
             endDateTime="",
-            durationStr="2 Y",
-            barSizeSetting="1 month",
+            durationStr=duration_str,
+            barSizeSetting=bar_size,
             whatToShow="TRADES",
             useRTH=1,
             formatDate=1,
             keepUpToDate=False,
             chartOptions=[]
         )
-        self.data_received_event.wait(timeout=15)
-        return self.historical_data
-
-    def fetch_account_summary(self):
-        self.account_summary = {}
-        self.account_summary_received_event.clear()
-        self.reqAccountSummary(9001, "All", "TotalCashValue")
-        self.account_summary_received_event.wait(timeout=10)
-        return self.account_summary
-
-    def fetch_positions(self):
-        self.portfolio_data = []
-        self.portfolio_received_event.clear()
+        request.resubmit()
+        return request.future
+
+    def _cancel_historical_request(self, future: Future):
+        with self._pending_lock:
+            requests = [r for r in self._pending.values() if r.future is future]
+        for request in requests:
+            self.cancelHistoricalData(request.req_id)
+            self._finish_request(request.req_id, FutureTimeoutError())
+
+    def collect_historical_result(self, symbol: str, future: Future, timeout: float) -> list:
+        """Wertet ein Future aus request_historical_data aus; Fehler und Timeouts liefern []."""
+        if not future.done():
+            self._cancel_historical_request(future)
+        if isinstance(future.exception(), FutureTimeoutError):
+            print(f"WARNUNG: Timeout bei historischen Daten für {symbol} nach {timeout} s.")
+            return []
+        if future.exception() is not None:
+            print(f"WARNUNG: Historische Daten für {symbol} fehlgeschlagen: {future.exception()}")
+            return []
+        return future.result()
+
+    def fetch_historical_data(self, symbol: str, duration_str: str = "2 Y", timeout: float = 15,
+                              bar_size: str = "1 month"):
+        return self.fetch_historical_data_many({symbol: duration_str}, timeout, bar_size)[symbol]
+
+    def fetch_historical_data_many(self, durations: dict, timeout: float = 15, bar_size: str = "1 month") -> dict:
+        """
+        Fragt historische Daten für viele Symbole gleichzeitig an ({symbol: durationStr}).
+        Die Wartezeit entspricht der langsamsten Einzelanfrage statt der Summe aller Anfragen.
+        Symbole ohne Daten (Fehler oder Timeout) liefern eine leere Liste.
+        """
+        futures = {symbol: self.request_historical_data(symbol, dauer, bar_size, timeout)
+                   for symbol, dauer in durations.items()}
+        wait(futures.values(), timeout=timeout)
+        return {symbol: self.collect_historical_result(symbol, future, timeout) for symbol, future in futures.items()}
+
+    def request_account_summary(self) -> Future:
+        """Fordert die Kontoübersicht an; das Future liefert {tag: wert, 'accounts': {konto: {tag: wert}}}."""
+        request = self._register_request("account_summary")
+        request.data = {}
+        request.on_finish = lambda: self.cancelAccountSummary(request.req_id)
+        self.reqAccountSummary(request.req_id, "All", "TotalCashValue")
+        return request.future
+
+    def request_positions(self) -> Future:
+        """Fordert alle Positionen an (IBKR erlaubt nur einen Positions-Abruf gleichzeitig)."""
+        with self._pending_lock:
+            running = self._pending.get(self._positions_req_id)
+        if running is not None:
+            return running.future
+        request = self._register_request("positions", on_finish=self.cancelPositions)
+        self._positions_req_id = request.req_id
         self.reqPositions()
-        self.portfolio_received_event.wait(timeout=10)
-        return self.portfolio_data
+        return request.future
+
+    def finish_partial(self, future: Future):
+        """Beendet eine noch offene Anfrage mit den bis jetzt empfangenen Daten (z.B. nach Timeout)."""
+        with self._pending_lock:
+            requests = [r for r in self._pending.values() if r.future is future]
+        for request in requests:
+            print(f"WARNUNG: Timeout bei Anfrage {request.req_id} ({request.kind}), "
+                  f"verwende {len(request.data)} bisher empfangene Einträge.")
+            self._finish_request(request.req_id, timed_out=True)
+
+    def result_or_default(self, future: Future, default, description: str):
+        """Ergebnis eines abgeschlossenen Futures oder `default`, falls TWS einen Fehler meldete."""
+        if future.exception() is not None:
+            print(f"WARNUNG: {description} fehlgeschlagen: {future.exception()}")
+            return default
+        return future.result()
+
+    def fetch_account_summary(self, timeout: float = 10):
+        future = self.request_account_summary()
+        wait([future], timeout=timeout)
+        self.finish_partial(future)
+        return self.result_or_default(future, {}, "Abruf der Kontoübersicht")
+
+    def fetch_positions(self, timeout: float = 10):
+        future = self.request_positions()
+        wait([future], timeout=timeout)
+        self.finish_partial(future)
+        return self.result_or_default(future, [], "Abruf der Positionen")
         
     def fetch_current_price(self, symbol: str):
-        contract = self.get_etf_contract(symbol)
-        self.current_price = 0
-        self.price_received_event.clear()
-        reqId = int(time.time())
-        self.reqMktData(reqId, contract, "", False, False, [])
-        self.price_received_event.wait(timeout=5)
-        self.cancelMktData(reqId)
-        return self.current_price
-
-    def place_market_order(self, symbol: str, quantity: int, action: str):
+        return self.fetch_prices([symbol])[symbol]
+
+    @staticmethod
+    def _select_price(ticks: list) -> float:
+        """Bevorzugt den letzten Kurs (4) vor dem Schlusskurs (9); 0 wenn keiner vorliegt."""
+        by_type = dict(ticks)
+        return by_type.get(4) or by_type.get(9) or 0
+
+    def start_snapshots(self, symbols) -> tuple:
+        """
+        Erster Teil von fetch_prices: bedient Symbole aus dem Cache und fordert für alle
+        übrigen gleichzeitig Snapshots an. Liefert (prices, {symbol: request}).
+        """
+        now = time.monotonic()
+        prices = {}
+        requests = {}
+        for symbol in dict.fromkeys(symbols):
+            cached = self.quote_cache.get(symbol)
+            if cached is not None and now - cached[1] < self.quote_cache_ttl:
+                prices[symbol] = cached[0]
+                continue
+            contract = self.get_etf_contract(symbol)
+            request = self._register_request("snapshot", symbol)
+            requests[symbol] = request
+            self.reqMktData(request.req_id, contract, "", True, False, [])
+        return prices, requests
+
+    def collect_snapshots(self, prices: dict, requests: dict) -> dict:
+        """Zweiter Teil von fetch_prices: übernimmt die empfangenen Kurse in Ergebnis und Cache."""
+        for symbol, request in requests.items():
+            if not request.future.done():
+                # Snapshot nicht rechtzeitig abgeschlossen: bereits empfangene Ticks verwenden
+                self.cancelMktData(request.req_id)
+                self._finish_request(request.req_id, timed_out=True)
+            price = self._select_price(request.data)
+            if price > 0:
+                self.quote_cache[symbol] = (price, time.monotonic())
+            prices[symbol] = price
+        return prices
+
+    def fetch_prices(self, symbols, timeout: float = 5) -> dict:
+        """
+        Liefert aktuelle Kurse für alle Symbole mit EINEM Snapshot-Durchlauf.
+        Kurse, die jünger als `quote_cache_ttl` Sekunden sind, kommen aus dem Cache;
+        für alle übrigen werden die Snapshots gleichzeitig angefordert.
+        Symbole ohne Kurs liefern 0.
+        """
+        prices, requests = self.start_snapshots(symbols)
+        wait([r.future for r in requests.values()], timeout=timeout)
+        return self.collect_snapshots(prices, requests)
+
+    def place_market_order(self, symbol: str, quantity: int, action: str) -> Future:
+        """
+        Platziert eine Market-Order und liefert sofort ein Future mit dem Fill-Dict
+        (Status, Stückzahl, Durchschnittspreis, Kommission, einzelne Executions, Zeitstempel).
+        Die orderId wird aus nextValidId fortgezählt; vorher muss die Verbindung bereit sein.
+        """
         contract = self.get_etf_contract(symbol)
         order = Order()
         order.action = action
         order.orderType = "MKT"
         order.totalQuantity = abs(quantity)
-        order_id = int(time.time())
+        with self._pending_lock:
+            if self.next_order_id is None:
+                raise RuntimeError("Keine gültige Order-ID: TWS hat noch kein nextValidId geschickt.")
+            order_id = self.next_order_id
+            if order_id >= REQ_ID_START:
+                raise RuntimeError(f"Order-ID {order_id} liegt im Bereich der reqIds (ab {REQ_ID_START}).")
+            self.next_order_id += 1
+            tracked = _PendingOrder(order_id, symbol, action, abs(quantity))
+            self._orders[order_id] = tracked
         print(f"Platziere {action}-Order für {abs(quantity)} Stk. von {symbol} (Order ID: {order_id})...")
         self.placeOrder(order_id, contract, order)
-        time.sleep(1)
+        return tracked.future
+
+    def collect_order_result(self, future: Future) -> dict:
+        """Wertet ein Future aus place_market_order aus; noch offene Orders (Timeout) liefern ihren bisherigen Stand."""
+        if not future.done():
+            with self._pending_lock:
+                order_ids = [o.order_id for o in self._orders.values() if o.future is future]
+            for order_id in order_ids:
+                self._finish_order(order_id, timed_out=True)
+        result = future.result()
+        if result['status'] != "Filled":
+            print(f"WARNUNG: Order {result['order_id']} ({result['action']} {result['symbol']}) "
+                  f"nicht vollständig ausgeführt: Status {result['status']}, {result['filled']:g}/{result['quantity']} Stk.")
+        return result
+
+# --- Kontrakte ---
+def _failed_future(error: Exception) -> Future:
+    future = Future()
+    future.set_exception(error)
+    return future
+
+
+def contract_config_json(symbol: str) -> str:
+    """Konfiguration eines Symbols aus settings.py als Schlüssel für den Kontrakt-Cache."""
+    return json.dumps(settings.ASSET_CONTRACTS[symbol], sort_keys=True)
+
+def contract_from_settings(symbol: str) -> Contract:
+    contract_details = settings.ASSET_CONTRACTS.get(symbol)
+    if not contract_details:
+        raise ValueError(f"Keine Kontrakt-Details für Symbol {symbol} in settings.py gefunden.")
+
+    contract = Contract()
+    contract.symbol = contract_details["symbol"]
+
+    # Liest den secType jetzt dynamisch aus den Settings
+    contract.secType = contract_details.get("secType", "STK") # Standardwert ist "STK"
+
+    contract.exchange = contract_details["exchange"]
+    contract.currency = contract_details["currency"]
+
+    if "primaryExchange" in contract_details:
+        contract.primaryExchange = contract_details["primaryExchange"]
+
+    return contract
+
+def choose_contract_details(symbol: str, treffer: list):
+    """
+    Wählt aus den Treffern einer Kontrakt-Abfrage den passenden. Bei mehreren (mehrdeutiges
+    Symbol) zählt nur der mit der primaryExchange aus settings.py; passt keiner, gibt es None
+    statt eines beliebigen Treffers (und damit keinen Eintrag im Kontrakt-Cache).
+    """
+    if not treffer:
+        return None
+    if len(treffer) > 1:
+        primaer = settings.ASSET_CONTRACTS.get(symbol, {}).get("primaryExchange")
+        passend = [d for d in treffer if primaer and d.contract.primaryExchange == primaer]
+        if passend:
+            return passend[0]
+        kandidaten = ", ".join(f"conId {d.contract.conId} ({d.contract.primaryExchange or '?'}, {d.contract.currency})"
+                               for d in treffer)
+        print(f"WARNUNG: {len(treffer)} Kontrakte für {symbol} gefunden, keiner passt zur primaryExchange "
+              f"{primaer!r} aus settings.py: {kandidaten}. Kontrakt wird nicht verwendet.")
+        return None
+    return treffer[0]
+
+def contract_cache_row(symbol: str, details) -> dict:
+    c = details.contract
+    return {
+        'config_json': contract_config_json(symbol), 'con_id': c.conId, 'sec_type': c.secType,
+        'exchange': c.exchange, 'primary_exchange': c.primaryExchange, 'currency': c.currency,
+        'local_symbol': c.localSymbol, 'trading_class': c.tradingClass, 'long_name': details.longName,
+    }
 
 # --- Öffentliche Funktionen ---
-def get_data_for_ticker_ibkr(app, ticker):
-    return app.fetch_historical_data(ticker)
+def connect_ibkr(client_id: int, app: IBKRClient = None, host: str = None, port: int = None,
+                 timeout: float = None, retries: int = None, retry_delay: float = 1.0) -> IBKRClient:
+    """
+    Verbindet mit TWS, startet den Nachrichten-Thread und wartet ereignisgesteuert auf
+    nextValidId, statt pauschal zu schlafen. Schlägt der Handshake fehl oder bleibt
+    nextValidId innerhalb von `timeout` Sekunden aus, wird neu verbunden.
+    Nach `retries` erfolglosen Versuchen wird ein ConnectionError ausgelöst.
+    """
+    app = app or IBKRClient()
+    host = host or settings.IBKR_HOST
+    port = port or settings.IBKR_PORT
+    timeout = settings.IBKR_CONNECT_TIMEOUT_SECONDS if timeout is None else timeout
+    retries = settings.IBKR_CONNECT_RETRIES if retries is None else retries
+
+    for versuch in range(1, retries + 1):
+        app.ready.clear()
+        app.connect(host, port, clientId=client_id)
+        if app.isConnected():
+            threading.Thread(target=app.run, daemon=True).start()
+            if app.ready.wait(timeout):
+                return app
+            print(f"WARNUNG: TWS hat die Verbindung nicht innerhalb von {timeout} s bestätigt (nextValidId).")
+            app.disconnect()
+        if versuch < retries:
+            print(f"Verbindung zu TWS ({host}:{port}) fehlgeschlagen. Versuch {versuch + 1}/{retries} in {retry_delay:g} s...")
+            time.sleep(retry_delay)
+    raise ConnectionError(f"Keine Verbindung zu TWS unter {host}:{port} nach {retries} Versuchen.")
+
+def get_data_for_ticker_ibkr(app, ticker, duration_str="2 Y"):
+    return app.fetch_historical_data(ticker, duration_str)
+
+def get_data_for_tickers_ibkr(app, durations: dict) -> dict:
+    return app.fetch_historical_data_many(durations)
 
 def get_account_details(app):
     cash = app.fetch_account_summary().get("TotalCashValue", 0)
     positions = app.fetch_positions()
-    return cash, {p['symbol']: p['position'] for p in positions}
+    return cash, positions_by_symbol(positions)
+
+def positions_by_symbol(positions: list, account: str = None) -> dict:
+    """Fasst Positionen ({'account', 'symbol', 'position'}) je Symbol zusammen, optional nur eines Kontos."""
+    result = {}
+    for p in positions:
+        if account is None or p['account'] == account:
+            result[p['symbol']] = result.get(p['symbol'], 0) + p['position']
+    return result
 
 def get_current_price_ibkr(app, ticker):
     return app.fetch_current_price(ticker)
 
-def execute_trades(app, trades):
-    for trade in trades:
-        app.place_market_order(trade['symbol'], trade['quantity'], trade['action'])
+def get_current_prices_ibkr(app, tickers) -> dict:
+    return app.fetch_prices(tickers)
+
+def execute_trades(app, trades, timeout: float = 60) -> list:
+    """
+    Führt die Trades aus: erst alle Verkäufe gleichzeitig, nach deren Ausführung alle Käufe
+    gleichzeitig (die Verkaufserlöse stehen dann als Cash bereit). Die Laufzeit entspricht
+    damit zweimal der Ausführungslatenz des Brokers statt einer Pause je Order.
+
+    Returns:
+        Liste der Fill-Dicts in Ausführungsreihenfolge (siehe IBKRClient.place_market_order).
+    """
+    fills = []
+    for action in ("SELL", "BUY"):
+        futures = [app.place_market_order(t['symbol'], t['quantity'], t['action'])
+                   for t in trades if t['action'] == action]
+        wait(futures, timeout=timeout)
+        fills += [app.collect_order_result(future) for future in futures]
+    return fills
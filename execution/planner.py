@@ -0,0 +1,102 @@
+# execution/planner.py
+
+import numpy as np
+from config import settings
+
+# Rebalancing-Planer ohne Broker-Verbindung: alle Größen sind Vektoren über die Symbole
+# (Achse -1) und optional über Szenarien (Achse 0). Eine Zeile je Szenario erlaubt z.B.
+# Kurs-Schocks oder alternative Zielportfolios in einem einzigen Aufruf; im Live-Betrieb
+# ist es ein Szenario mit dem gebündelten Kurs-Vektor aus dem Snapshot-Abruf.
+
+
+def symbol_vector(current_positions: dict, target_portfolio: dict) -> list:
+    """Symbol-Reihenfolge des Plans: erst gehaltene Symbole außerhalb des Ziels, dann das Zielportfolio."""
+    return [s for s in current_positions if s not in target_portfolio] + list(target_portfolio)
+
+
+def plan_rebalance(positions, prices, target_weights, total_value=None, cash: float = 0.0, fx=None,
+                   threshold_mode: str = None, threshold_shares: float = None, threshold_value: float = None) -> dict:
+    """
+    Berechnet Ziel-Stückzahlen, Differenzen, Schwellen und den verbleibenden Cash als Array-Operationen.
+
+    Args:
+        positions:      aktuelle Stückzahlen, Form (N,) oder (S, N)
+        prices:         Kurse in Handelswährung, (N,) oder (S, N); Kurse <= 0 gelten als fehlend
+        target_weights: Zielgewichte, (N,) oder (S, N); Gewicht 0 = Symbol nicht im Zielportfolio
+        total_value:    Gesamtwert je Szenario in Basiswährung, Skalar oder (S,); ohne Angabe
+                        cash + Summe(positions * prices * fx), d.h. Kurs-Schocks wirken auf den Gesamtwert
+        cash:           Cash in Basiswährung, Skalar oder (S,)
+        fx:             Basiswährung je Einheit der Handelswährung, (N,) oder (S, N); Standard 1
+        threshold_*:    Schwelle für Anpassungen ("shares" oder "value"); Standard aus settings
+
+    Symbole ohne Kurs und Short-Positionen (positions < 0) werden nicht gehandelt, sondern im
+    Plan markiert ('missing_price', 'short_position'); wie in calculate_trades entscheidet der
+    Aufrufer, wie er sie meldet.
+
+    Returns:
+        Dict mit Arrays der Form (S, N): 'target_quantity', 'delta', 'trade' (vorzeichenbehaftete
+        Stückzahl nach Schwelle), 'trade_value' (Basiswährung), 'missing_price' und
+        'short_position' (bool), sowie der Form (S,): 'total_value', 'cash_residual' (geschätzter
+        Cash nach allen Trades) und 'unallocated_value' (Zielwert von Symbolen ohne Kurs, der
+        mangels Kauf im Cash-Rest enthalten ist).
+    """
+    threshold_mode = threshold_mode or settings.TRADE_THRESHOLD_MODE
+    threshold_shares = settings.TRADE_THRESHOLD_SHARES if threshold_shares is None else threshold_shares
+    threshold_value = settings.TRADE_THRESHOLD_VALUE if threshold_value is None else threshold_value
+    if threshold_mode not in ("shares", "value"):
+        raise ValueError(f"Unbekannter Schwellen-Modus: {threshold_mode} (erlaubt: 'shares', 'value').")
+
+    positions, prices, target_weights = np.broadcast_arrays(
+        np.atleast_2d(np.asarray(positions, dtype=np.float64)),
+        np.atleast_2d(np.asarray(prices, dtype=np.float64)),
+        np.atleast_2d(np.asarray(target_weights, dtype=np.float64)),
+    )
+    fx = np.ones_like(prices) if fx is None else np.broadcast_to(np.asarray(fx, dtype=np.float64), prices.shape)
+    cash = np.broadcast_to(np.asarray(cash, dtype=np.float64), prices.shape[:1])
+
+    missing_price = ~(prices > 0)
+    short_position = positions < 0
+    base_prices = np.where(missing_price, np.nan, prices * fx)
+    if total_value is None:
+        total_value = cash + np.nansum(positions * base_prices, axis=1)
+    total_value = np.broadcast_to(np.asarray(total_value, dtype=np.float64), prices.shape[:1])
+
+    # Ziel-Stückzahl abgerundet auf ganze Anteile; Symbole ohne Kurs bleiben unverändert
+    with np.errstate(invalid='ignore'):
+        target_quantity = np.floor(total_value[:, None] * target_weights / base_prices)
+    im_ziel = target_weights > 0
+    target_quantity = np.where(im_ziel, np.where(missing_price, positions, target_quantity), 0.0)
+    delta = target_quantity - positions
+
+    # Schwelle nur für Anpassungen im Ziel; Positionen außerhalb des Ziels werden ganz verkauft
+    if threshold_mode == "shares":
+        gross_genug = np.abs(delta) > threshold_shares
+    else:
+        gross_genug = np.abs(delta) * np.nan_to_num(base_prices) > threshold_value
+    trade = np.where(im_ziel, np.where(gross_genug, delta, 0.0), -positions)
+    # Short-Positionen nie automatisch eindecken (sie wären sonst ein Kauf)
+    trade = np.where(short_position, 0.0, trade)
+
+    trade_value = trade * np.nan_to_num(base_prices)
+    return {
+        'target_quantity': target_quantity,
+        'delta': delta,
+        'trade': trade,
+        'trade_value': trade_value,
+        'missing_price': missing_price,
+        'short_position': short_position,
+        'total_value': total_value,
+        'cash_residual': cash - trade_value.sum(axis=1),
+        'unallocated_value': total_value * np.where(im_ziel & missing_price, target_weights, 0.0).sum(axis=1),
+    }
+
+
+def trades_from_plan(symbols: list, plan: dict, scenario: int = 0) -> list:
+    """Trade-Liste eines Szenarios im Format von execute_trades ([{'symbol', 'quantity', 'action'}])."""
+    trades = []
+    for symbol, menge in zip(symbols, plan['trade'][scenario]):
+        if menge > 0:
+            trades.append({'symbol': symbol, 'quantity': int(menge), 'action': 'BUY'})
+        elif menge < 0:
+            trades.append({'symbol': symbol, 'quantity': int(-menge), 'action': 'SELL'})
+    return trades
@@ -1,55 +1,59 @@
 # execution/portfolio.py
 
-from execution import broker
+import numpy as np
+from execution import broker, planner
 
-def calculate_trades(app, current_positions: dict, target_portfolio: dict, total_portfolio_value: float) -> list:
+def calculate_trades(app, current_positions: dict, target_portfolio: dict, total_portfolio_value: float,
+                     prices: dict = None) -> list:
     """
     Vergleicht das aktuelle Depot mit dem Zielportfolio und berechnet die notwendigen Trades.
 
     Args:
-        app: Die aktive IBKR-Client-Verbindung.
+        app: Die aktive IBKR-Client-Verbindung (nur nötig, wenn `prices` fehlt).
         current_positions: Dict des aktuellen Portfolios, z.B. {'SXR8': 10}.
         target_portfolio: Dict des Zielportfolios, z.B. {'SXR8': 0.5, 'SXRV': 0.5}.
         total_portfolio_value: Der Gesamtwert des Portfolios (Cash + Wert der Positionen).
+        prices: Aktuelle Kurse {symbol: kurs}, z.B. aus dem gebündelten Abruf in main.py. Ohne
+            Angabe werden alle Kurse mit EINEM Snapshot-Durchlauf (bzw. aus dem Kurs-Cache) geholt.
 
     Returns:
         Eine Liste von Trade-Dictionaries, z.B. [{'symbol': 'SXR8', 'quantity': 3, 'action': 'BUY'}].
     """
-    trades = []
-    
-    # --- Schritt 1: Verkäufe berechnen ---
-    # Gehe durch die aktuellen Positionen und verkaufe alles, was nicht im Zielportfolio ist.
-    for symbol, quantity in current_positions.items():
-        if symbol not in target_portfolio:
-            print(f"Verkaufs-Signal: {symbol} ist nicht im Zielportfolio. Verkaufe {quantity} Stk.")
-            trades.append({'symbol': symbol, 'quantity': quantity, 'action': 'SELL'})
-
-    # --- Schritt 2: Käufe und Anpassungen berechnen ---
-    for symbol, target_weight in target_portfolio.items():
-        # Berechne den Zielwert für dieses Asset
-        target_value = total_portfolio_value * target_weight
-        
-        # Hole den aktuellen Marktpreis, um die Stückzahl zu berechnen
-        current_price = broker.get_current_price_ibkr(app, symbol)
-        
-        if current_price == 0:
+    if prices is None:
+        prices = broker.get_current_prices_ibkr(app, planner.symbol_vector(current_positions, target_portfolio))
+    symbole, plan = plan_trades(current_positions, target_portfolio, total_portfolio_value, prices)
+
+    for i, symbol in enumerate(symbole):
+        menge, aktuell = plan['trade'][0, i], int(current_positions.get(symbol, 0))
+        if plan['short_position'][0, i]:
+            print(f"FEHLER: Short-Position {symbol} ({aktuell} Stk.) wird nicht automatisch geschlossen. Überspringe Trade.")
+        elif symbol not in target_portfolio:
+            print(f"Verkaufs-Signal: {symbol} ist nicht im Zielportfolio. Verkaufe {aktuell} Stk.")
+        elif plan['missing_price'][0, i]:
             print(f"FEHLER: Konnte aktuellen Preis für {symbol} nicht abrufen. Überspringe Trade.")
-            continue
-
-        # Berechne die Ziel-Stückzahl (abgerundet auf ganze Anteile)
-        target_quantity = int(target_value / current_price)
-        
-        # Hole die aktuelle Stückzahl aus unseren Positionen
-        current_quantity = current_positions.get(symbol, 0)
-        
-        # Berechne die Differenz
-        trade_quantity = target_quantity - current_quantity
-        
-        if trade_quantity > 5: # Schwellenwert, um kleine Trades zu vermeiden
-            print(f"Kauf-Signal für {symbol}: Zielmenge={target_quantity}, Aktuell={current_quantity}. Kaufe {trade_quantity} Stk.")
-            trades.append({'symbol': symbol, 'quantity': trade_quantity, 'action': 'BUY'})
-        elif trade_quantity < -5: # Schwellenwert, um kleine Trades zu vermeiden
-            print(f"Verkaufs-Signal für {symbol}: Zielmenge={target_quantity}, Aktuell={current_quantity}. Verkaufe {abs(trade_quantity)} Stk.")
-            trades.append({'symbol': symbol, 'quantity': abs(trade_quantity), 'action': 'SELL'})
-            
+        elif menge > 0:
+            print(f"Kauf-Signal für {symbol}: Zielmenge={int(plan['target_quantity'][0, i])}, Aktuell={aktuell}. Kaufe {int(menge)} Stk.")
+        elif menge < 0:
+            print(f"Verkaufs-Signal für {symbol}: Zielmenge={int(plan['target_quantity'][0, i])}, Aktuell={aktuell}. Verkaufe {int(-menge)} Stk.")
+
+    trades = planner.trades_from_plan(symbole, plan)
+    if trades:
+        print(f"Geschätzter Cash nach den Trades: {plan['cash_residual'][0]:.2f}")
+    if plan['unallocated_value'][0] > 0:
+        print(f"WARNUNG: {plan['unallocated_value'][0]:.2f} des Zielportfolios konnten mangels Kurs nicht "
+              f"investiert werden und bleiben im Cash.")
     return trades
+
+def plan_trades(current_positions: dict, target_portfolio: dict, total_portfolio_value: float, prices: dict) -> tuple:
+    """
+    Kern von calculate_trades ohne Broker und ohne Konsolenausgabe (z.B. für den Replay).
+
+    Returns:
+        (symbole, plan) mit dem Plan aus planner.plan_rebalance (ein Szenario).
+    """
+    symbole = planner.symbol_vector(current_positions, target_portfolio)
+    positionen = np.array([current_positions.get(s, 0) for s in symbole], dtype=np.float64)
+    kurse = np.array([prices.get(s) or 0 for s in symbole], dtype=np.float64)
+    gewichte = np.array([target_portfolio.get(s, 0.0) for s in symbole], dtype=np.float64)
+    cash = total_portfolio_value - float((positionen * kurse).sum())
+    return symbole, planner.plan_rebalance(positionen, kurse, gewichte, total_value=total_portfolio_value, cash=cash)
@@ -1,79 +1,34 @@
 import sys
 import os
-import time
-import threading
-import json
+import asyncio
 from datetime import datetime, timezone
-import pandas as pd
 
 # --- Python den Weg zu den Modulen zeigen ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
 from config import settings
-from strategy import logic
-from execution import broker, portfolio
+from strategy import logic, covariance
+from execution import broker, portfolio, async_broker
 from data import database, ingest
+from reporting import tracing, rolling, runlog
 
-def run_monthly_rebalancing():
-    """
-    Dies ist die Hauptfunktion, die den gesamten monatlichen Prozess steuert.
-    """
-    print("==============================================")
-    print("=== Starte monatliches DAA-Rebalancing...  ===")
-    print("==============================================")
-
-    app = broker.IBKRClient()
-    app.connect("127.0.0.1", 7497, clientId=123)
-    api_thread = threading.Thread(target=app.run, daemon=True)
-    api_thread.start()
-    time.sleep(3)
-
-    # --- Schritt 1: Lade historische Preisdaten (mit neuer, sauberer Ausgabe) ---
-    print("\nSchritt 1: Lade historische Preisdaten...")
-    daten_aller_assets = {}
-    all_tickers = list(set(settings.RISKY_UNIVERSE + settings.CASH_UNIVERSE + settings.CANARY_UNIVERSE))
-
-    for ticker in all_tickers:
-        # Gib immer die saubere Hauptmeldung aus
-        print(f"Lade Daten für {ticker}...")
-
-        # Prüfe, ob genügend Daten lokal vorhanden sind
-        kurse = database.get_prices_for_ticker(ticker, limit=26)
-        if len(kurse) < 13:
-            # Nur bei Bedarf die detaillierte Info anzeigen
-            print(f"  -> Lokale Daten unvollständig. Starte API-Abruf...")
-            ingest.update_data_for_ticker(app, ticker)
-
-            # Lade die Daten nach dem Abruf erneut
-            kurse = database.get_prices_for_ticker(ticker, limit=26)
-            if len(kurse) < 13:
-                 print(f"--> FATALER FEHLER: Konnte auch nach API-Abruf nicht genügend Daten für {ticker} laden. Breche ab.")
-                 app.disconnect()
-                 return
-
-        # Nimm die letzten 13 Kurse für die Strategie
-        daten_aller_assets[ticker] = kurse[-13:]
-
-    print("Historische Daten erfolgreich geladen.")
-
-    # --- Schritt 2: Strategie-Analyse ---
-    print("\nSchritt 2: Führe Strategie-Analyse durch...")
-    strategie_ergebnis = logic.bestimme_ziel_portfolio(daten_aller_assets)
+def drucke_strategie_bericht(strategie_ergebnis: dict):
+    """Konsolen-Report der Strategie-Analyse eines Portfolios (Canary, Rangliste, Kontext)."""
     ziel_portfolio = strategie_ergebnis['portfolio']
     canary_report = strategie_ergebnis['canary_report']
     momentum_ranking = strategie_ergebnis['momentum_ranking']
     kontext = strategie_ergebnis['entscheidungskontext']
 
-    # --- Reporting Module ---
     print("\n--- Canary-Analyse Ergebnis ---")
-    print(f"Finales Signal: {canary_report['final_signal']}")
+    print(f"Finales Signal: {canary_report['final_signal']} (Cash-Anteil {strategie_ergebnis['cash_anteil']:.0%})")
     for ticker, details in canary_report['canary_details'].items():
         score = details['berechnung']['momentum_score']
         print(f"  - {ticker}: Status={details['status']}, Momentum-Score={score:.4f}")
 
     print("\n--- Momentum-Rangliste ---")
-    aktives_universum = "RISKY UNIVERSE" if canary_report['final_signal'] == "RISK_ON" else "CASH UNIVERSE"
+    # Rangliste des Cash-Universums nur, wenn das ganze Portfolio im Cash liegt (bei B > 1 auch teilweise Risk-On)
+    aktives_universum = "CASH UNIVERSE" if strategie_ergebnis['cash_anteil'] >= 1 else "RISKY UNIVERSE"
     print(f"Aktives Universum: {aktives_universum}")
     print(f"{'Ticker':<10} | {'Momentum Score'}")
     print("-" * 30)
@@ -85,50 +40,166 @@ def run_monthly_rebalancing():
     print(f"Dauer des aktuellen Signals: {kontext['signal_duration']} Monat(e)")
     if kontext['korrelations_matrix'] is not None:
         print("Korrelations-Matrix der Top-Assets:")
-        try:
-            # This requires Jinja2 to be installed
-            styled_matrix = kontext['korrelations_matrix'].style.format("{:.2f}").background_gradient(cmap='coolwarm', vmin=-1, vmax=1)
-            print(styled_matrix)
-        except ImportError:
-            # Fallback if Jinja2 is not installed
-            print(kontext['korrelations_matrix'].round(2))
+        # Auf der Konsole genügt die gerundete Matrix; ein pandas-Styler würde hier nur Jinja2
+        # und matplotlib laden und dann lediglich seine Objekt-Repräsentation ausgeben.
+        print(kontext['korrelations_matrix'].round(2))
     print("-------------------------------------------------------------")
 
     print(f"\nStrategie-Entscheidung (Zielportfolio): {ziel_portfolio}")
 
-    # --- Schritt 3 bis 6 bleiben unverändert ---
+
+def run_monthly_rebalancing(app=None, portfolios: list = None):
+    """
+    Dies ist die Hauptfunktion, die den gesamten monatlichen Prozess steuert.
+    Optional kann ein bereits verbundener Client übergeben werden (z.B. der Fake-Broker der Benchmarks).
+
+    Alle `portfolios` (Standard: settings.PORTFOLIOS) teilen sich eine Broker-Verbindung, einen
+    Daten-Abruf für die Vereinigung ihrer Universen und einen Kurs-Batch für alle Zielportfolios.
+    Je Portfolio kommen nur Strategie-Analyse, Trade-Berechnung und Speicherung hinzu.
+    """
+    print("==============================================")
+    print("=== Starte monatliches DAA-Rebalancing...  ===")
+    print("==============================================")
+
+    portfolios = [logic.portfolio_parameter(d) for d in (portfolios or settings.PORTFOLIOS)]
+    # Cash und Positionen werden je Konto gelesen: teilen sich Portfolios ein Konto (auch None = alle Konten),
+    # würde jedes den ganzen Bestand als eigenen sehen und die Orders doppelten sich
+    konten = [p['account'] for p in portfolios]
+    doppelte_konten = sorted({str(k) for k in konten if konten.count(k) > 1})
+    if doppelte_konten:
+        print(f"--> FATALER FEHLER: Mehrere Portfolios nutzen dasselbe Konto ({', '.join(doppelte_konten)}). "
+              f"Bei mehreren Portfolios braucht jedes ein eigenes 'account'. Breche ab.")
+        if app is not None:
+            app.disconnect()
+        return
+
+    # Jeder Schritt, DB-Aufruf und Broker-Request wird erfasst und am Ende in run_traces gespeichert
+    tracing.start_run("monthly_rebalancing")
+    if app is None:
+        tracing.step("Verbindung zu IBKR")
+        try:
+            app = broker.connect_ibkr(client_id=123)
+        except ConnectionError as e:
+            print(f"--> FATALER FEHLER: {e}")
+            tracing.end_run()
+            return
+
+    # --- Schritt 1: Lade historische Preisdaten (ein Datenbank-Abruf für alle Universen aller Portfolios) ---
+    print("\nSchritt 1: Lade historische Preisdaten...")
+    tracing.step("Schritt 1: Historische Preisdaten")
+    daten_aller_assets = {}
+    all_tickers = list(dict.fromkeys(
+        t for p in portfolios for t in p['risky'] + p['cash'] + p['canary']
+    ))
+
+    preis_matrix = database.get_prices_for_universe(all_tickers, limit=26)
+    unvollstaendig = [t for t in all_tickers if preis_matrix[t].count() < 13]
+    if unvollstaendig:
+        # Nur bei Bedarf die detaillierte Info anzeigen
+        print(f"  -> Lokale Daten unvollständig für {', '.join(sorted(unvollstaendig))}. Starte API-Abruf...")
+        ingest.update_data_for_tickers(app, unvollstaendig, voll=True)
+
+        # Lade die Daten nach dem Abruf erneut
+        preis_matrix = database.get_prices_for_universe(all_tickers, limit=26)
+        for ticker in unvollstaendig:
+            if preis_matrix[ticker].count() < 13:
+                print(f"--> FATALER FEHLER: Konnte auch nach API-Abruf nicht genügend Daten für {ticker} laden. Breche ab.")
+                app.disconnect()
+                tracing.end_run()
+                return
+
+    for ticker in all_tickers:
+        # Nimm die letzten 13 Kurse für die Strategie
+        daten_aller_assets[ticker] = preis_matrix[ticker].dropna().tolist()[-13:]
+
+    print("Historische Daten erfolgreich geladen.")
+
+    # --- Schritt 2: Strategie-Analyse je Portfolio (gemeinsame Daten, Scores über den Score-Cache) ---
+    print("\nSchritt 2: Führe Strategie-Analyse durch...")
+    tracing.step("Schritt 2: Strategie-Analyse")
+    letzte_bars = database.get_ingest_watermarks(all_tickers)
+    # Kovarianz des ganzen Universums fortschreiben; Korrelationen der Top-Assets sind dann nur ein Slice
+    kovarianz = covariance.aktualisiere_kovarianz(all_tickers, preis_matrix)
+    if not kovarianz.ist_aktuell(preis_matrix.index[-1]):
+        kovarianz = None
+    ergebnisse = {}
+    for p in portfolios:
+        if len(portfolios) > 1:
+            print(f"\n=== Portfolio: {p['name']} (T={p['T']}, B={p['B']}, Konto={p['account'] or 'alle'}) ===")
+        ergebnisse[p['name']] = logic.bestimme_ziel_portfolio(
+            daten_aller_assets, letzte_bars,
+            risky_universe=p['risky'], canary_universe=p['canary'], cash_universe=p['cash'],
+            top_n=p['T'], breite=p['B'], signal_historie=database.get_signal_history(p['name']),
+            kovarianz=kovarianz,
+        )
+        drucke_strategie_bericht(ergebnisse[p['name']])
+
     print("\nSchritt 3: Frage aktuelles Depot und Gesamtwert ab...")
-    cash, aktuelle_positionen = broker.get_account_details(app)
-    market_value = sum(broker.get_current_price_ibkr(app, s) * q for s, q in aktuelle_positionen.items())
-    total_portfolio_value = cash + market_value
-    print(f"GESAMTWERT DES PORTFOLIOS: {total_portfolio_value:.2f} EUR")
+    tracing.step("Schritt 3: Depot und Gesamtwert")
+    # Kontoübersicht, Positionen und Kurse ALLER Zielportfolios in einem Batch; Schritt 4 nutzt den Kurs-Cache
+    ziel_symbole = list(dict.fromkeys(s for e in ergebnisse.values() for s in e['portfolio']))
+    kontouebersicht, positionen, aktuelle_kurse = asyncio.run(
+        async_broker.get_accounts_and_prices(app, ziel_symbole)
+    )
+    depots = {}
+    for p in portfolios:
+        if p['account'] is None:
+            cash = kontouebersicht.get("TotalCashValue", 0)
+        else:
+            cash = kontouebersicht.get('accounts', {}).get(p['account'], {}).get("TotalCashValue", 0)
+        aktuelle_positionen = broker.positions_by_symbol(positionen, p['account'])
+        market_value = sum(aktuelle_kurse[s] * q for s, q in aktuelle_positionen.items())
+        depots[p['name']] = (aktuelle_positionen, cash + market_value)
+        praefix = f"[{p['name']}] " if len(portfolios) > 1 else ""
+        print(f"{praefix}GESAMTWERT DES PORTFOLIOS: {cash + market_value:.2f} EUR")
 
     print("\nSchritt 4: Berechne notwendige Trades...")
-    trades = portfolio.calculate_trades(app, aktuelle_positionen, ziel_portfolio, total_portfolio_value)
-    print(f"Zu tätigende Trades: {trades}")
+    tracing.step("Schritt 4: Trade-Berechnung")
+    trades_je_portfolio = {}
+    for p in portfolios:
+        aktuelle_positionen, total_portfolio_value = depots[p['name']]
+        # Trade-Berechnung mit dem gebündelten Kurs-Vektor aus Schritt 3 (keine weiteren Broker-Abfragen)
+        trades = portfolio.calculate_trades(
+            app, aktuelle_positionen, ergebnisse[p['name']]['portfolio'], total_portfolio_value, prices=aktuelle_kurse
+        )
+        trades_je_portfolio[p['name']] = trades
+        praefix = f"[{p['name']}] " if len(portfolios) > 1 else ""
+        print(f"{praefix}Zu tätigende Trades: {trades}")
 
     print("\nSchritt 5: Speichere vollumfängliches Ergebnis...")
-    strategie_ergebnis['timestamp_utc'] = datetime.now(timezone.utc).isoformat()
-    strategie_ergebnis['total_portfolio_value'] = total_portfolio_value
-    strategie_ergebnis['calculated_trades'] = trades
-    database.save_rebalancing_event(strategie_ergebnis)
-
-    date_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    history_dir = os.path.join(SCRIPT_DIR, 'history')
-    os.makedirs(history_dir, exist_ok=True)
-    filename = os.path.join(history_dir, f"rebalancing_{date_str}.json")
-    with open(filename, 'w', encoding='utf-8') as f:
-        # default=str helps to serialize pandas DataFrame
-        json.dump(strategie_ergebnis, f, default=str, ensure_ascii=False, indent=4)
-    print(f"Zusätzliches JSON-Log in {filename} gespeichert.")
+    tracing.step("Schritt 5: Ergebnis speichern")
+    timestamp_utc = datetime.now(timezone.utc).isoformat()
+    for p in portfolios:
+        strategie_ergebnis = ergebnisse[p['name']]
+        strategie_ergebnis['portfolio_name'] = p['name']
+        strategie_ergebnis['timestamp_utc'] = timestamp_utc
+        strategie_ergebnis['total_portfolio_value'] = depots[p['name']][1]
+        strategie_ergebnis['calculated_trades'] = trades_je_portfolio[p['name']]
+        # Exakte Eingaben der Entscheidung für den Replay (strategy/replay.py)
+        aktuelle_positionen = depots[p['name']][0]
+        strategie_ergebnis['eingaben'] = {
+            'preise': {t: daten_aller_assets[t] for t in dict.fromkeys(p['risky'] + p['canary'] + p['cash'])},
+            'parameter': {k: p[k] for k in ('risky', 'canary', 'cash', 'T', 'B')},
+            'positionen': aktuelle_positionen,
+            'kurse': {s: aktuelle_kurse[s] for s in dict.fromkeys(list(aktuelle_positionen) + list(strategie_ergebnis['portfolio']))},
+        }
+        database.save_rebalancing_event(strategie_ergebnis)
+        # Rollierende 12/36/60-Monats-Kennzahlen mit dem neuen Event fortschreiben (O(1) aus dem gespeicherten Zustand)
+        rolling.update_portfolio_rolling(p['name'])
+
+    # Alle Portfolio-Ergebnisse des Laufs als ein Member an das komprimierte Lauf-Protokoll anhängen
+    eintrag = runlog.append_run([ergebnisse[p['name']] for p in portfolios], os.path.join(SCRIPT_DIR, 'history'))
+    print(f"Lauf im Protokoll history/{runlog.ARCHIVE_FILE} gespeichert ({eintrag['length']} Bytes).")
 
     print("\nSchritt 6: Führe Trades aus...")
-    if trades:
+    tracing.step("Schritt 6: Handelsausführung")
+    if any(trades_je_portfolio.values()):
         print("Handelsausführung ist für diesen Test deaktiviert.")
     else:
         print("\nKeine Trades notwendig.")
 
     app.disconnect()
+    tracing.end_run()
     print("\n==============================================")
     print("=== Rebalancing-Prozess abgeschlossen.     ===")
     print("==============================================")
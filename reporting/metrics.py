@@ -114,3 +114,82 @@ def calculate_all_metrics(portfolio_returns: pd.Series, portfolio_history_df: pd
         "calmar_ratio": calmar_ratio,
         "treynor_ratio": treynor_ratio,
     }
+
+
+def calculate_metrics_batch(returns: np.ndarray, benchmark_returns: np.ndarray = None,
+                            periods_per_year: int = 12, risk_free_rate: float = None) -> dict:
+    """
+    Vektorisierte Variante von calculate_all_metrics für viele Renditereihen gleichzeitig.
+
+    `returns` ist eine Matrix Perioden x Portfolios (NaN = keine Rendite in dieser Periode,
+    z.B. vor Beginn einer Reihe), `benchmark_returns` ein Vektor über dieselben Perioden.
+    Der Drawdown wird aus dem NAV der Renditen berechnet (Start = 1.0). Spalten mit weniger
+    als zwei Renditen erhalten NaN; ohne Benchmark sind Beta und Treynor NaN.
+
+    Returns:
+        Dict mit denselben Schlüsseln wie calculate_all_metrics (plus 'periods' und
+        'cagr_percent'), jeder Wert ein Array mit einem Eintrag je Spalte.
+    """
+    r = np.asarray(returns, dtype=np.float64)
+    if r.ndim == 1:
+        r = r[:, None]
+    rf = settings.RISK_FREE_RATE if risk_free_rate is None else risk_free_rate
+    gueltig = ~np.isnan(r)
+    n = gueltig.sum(axis=0)
+    genug = n >= 2
+    r0 = np.where(gueltig, r, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mittel = r0.sum(axis=0) / n
+        abweichung = np.where(gueltig, r - mittel, 0.0)
+        volatilitaet = np.sqrt((abweichung ** 2).sum(axis=0) / (n - 1)) * np.sqrt(periods_per_year)
+        rendite_pa = mittel * periods_per_year
+        ueberrendite = rendite_pa - rf
+
+        # Downside-Abweichung: Standardabweichung (ddof=1) nur der negativen Renditen
+        negativ = gueltig & (r < 0)
+        n_negativ = negativ.sum(axis=0)
+        mittel_negativ = np.where(negativ, r, 0.0).sum(axis=0) / n_negativ
+        downside = np.sqrt(
+            (np.where(negativ, r - mittel_negativ, 0.0) ** 2).sum(axis=0) / (n_negativ - 1)
+        ) * np.sqrt(periods_per_year)
+        downside = np.where(n_negativ >= 2, downside, 0.0)
+
+        # NAV und maximaler Drawdown in einem Durchlauf über alle Spalten
+        nav = np.cumprod(1 + r0, axis=0)
+        hochstand = np.maximum(np.maximum.accumulate(nav, axis=0), 1.0)
+        max_drawdown = np.abs((nav / hochstand - 1).min(axis=0, initial=0.0))
+        cagr = nav[-1] ** (periods_per_year / n) - 1 if len(r) else np.full(r.shape[1], np.nan)
+
+        if benchmark_returns is not None:
+            b = np.asarray(benchmark_returns, dtype=np.float64).reshape(-1, 1)
+            paar = gueltig & ~np.isnan(b)
+            n_paar = paar.sum(axis=0)
+            rp = np.where(paar, r, 0.0)
+            rb = np.where(paar, b, 0.0)
+            dp = np.where(paar, rp - rp.sum(axis=0) / n_paar, 0.0)
+            db = np.where(paar, rb - rb.sum(axis=0) / n_paar, 0.0)
+            kovarianz = (dp * db).sum(axis=0) / (n_paar - 1)
+            varianz = (db ** 2).sum(axis=0) / (n_paar - 1)
+            beta = np.where((n_paar >= 2) & (varianz > 0), kovarianz / varianz, 0.0)
+            treynor = np.where(beta > 0, ueberrendite / beta, 0.0)
+        else:
+            beta = np.full(r.shape[1], np.nan)
+            treynor = np.full(r.shape[1], np.nan)
+
+        ergebnis = {
+            "periods": n,
+            "annualized_return_percent": rendite_pa * 100,
+            "annualized_volatility_percent": volatilitaet * 100,
+            "cagr_percent": cagr * 100,
+            "max_drawdown_percent": max_drawdown * 100,
+            "portfolio_beta": beta,
+            "sharpe_ratio": np.where(volatilitaet > 0, ueberrendite / volatilitaet, 0.0),
+            "sortino_ratio": np.where(downside > 0, ueberrendite / downside, 0.0),
+            "calmar_ratio": np.where(max_drawdown > 0, rendite_pa / max_drawdown, 0.0),
+            "treynor_ratio": treynor,
+        }
+    for schluessel, werte in ergebnis.items():
+        if schluessel != "periods":
+            ergebnis[schluessel] = np.where(genug, werte, np.nan)
+    return ergebnis
@@ -6,8 +6,8 @@ import pandas as pd
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
-from data import database
-from reporting import metrics
+from data import database, snapshot
+from reporting import metrics, rolling
 from config import settings # Import the main settings file
 
 def calculate_performance_since_last_snapshot():
@@ -37,10 +37,9 @@ def calculate_performance_since_last_snapshot():
         # *** HIER WIRD DIE NEUE EINSTELLUNG VERWENDET ***
         total_benchmark_performance = 0
         for ticker, weight in settings.BENCHMARK_COMPONENTS.items():
-            table_name = f"price_{ticker}"
             benchmark_df = pd.read_sql_query(
-                f"SELECT date, close FROM {table_name} WHERE date >= ? AND date <= ? ORDER BY date ASC",
-                conn, params=(start_date, end_date)
+                "SELECT date, close FROM prices WHERE ticker = ? AND date >= ? AND date <= ? ORDER BY date ASC",
+                conn, params=(ticker, start_date, end_date)
             )
             if len(benchmark_df) < 2:
                  return {"error": f"Nicht genügend Benchmark-Daten für {ticker} im Zeitraum {start_date} - {end_date}."}
@@ -52,9 +51,6 @@ def calculate_performance_since_last_snapshot():
 
     except Exception as e:
         return {"error": f"Fehler bei der Performance-Berechnung: {e}"}
-    finally:
-        if conn:
-            conn.close()
 
     return {
         "zeitraum": f"{start_date} bis {end_date}",
@@ -63,22 +59,19 @@ def calculate_performance_since_last_snapshot():
     }
 
 
-def show_advanced_metrics():
-    # This function remains unchanged
-    conn = database.get_db_connection()
+def show_advanced_metrics(portfolio_name: str = None):
+    """Risiko-Kennzahlen über die gesamte Historie EINES Portfolios (Standard: settings.DEFAULT_PORTFOLIO)."""
+    portfolio_name = portfolio_name or settings.DEFAULT_PORTFOLIO
     try:
-        portfolio_history_df = pd.read_sql_query(
-            "SELECT timestamp, total_portfolio_value as total_value FROM rebalancing_events ORDER BY timestamp ASC", conn
-        )
-        benchmark_history_df = pd.read_sql_query(
-            "SELECT date as timestamp, close FROM price_SXR8 ORDER BY timestamp ASC", conn
+        portfolio_history_df = pd.DataFrame(
+            database.get_portfolio_values(portfolio_name=portfolio_name), columns=['timestamp', 'total_value']
         )
+        # Benchmark-Kurse aus dem Spalten-Schnappschuss (Memory-Map statt SQL und Datums-Parsing je Zeile)
+        monate, _, preise = snapshot.load_snapshot(['SXR8'])
+        benchmark_history_df = pd.DataFrame({'timestamp': pd.to_datetime(monate, format='%Y-%m'), 'close': preise[:, 0]})
     except Exception as e:
         print(f"Fehler beim Laden der Historien für erweiterte Metriken: {e}")
         return
-    finally:
-        if conn:
-            conn.close()
 
     if len(portfolio_history_df) < 3:
         print("\nNicht genügend historische Portfolio-Daten für Profi-Kennzahlen (mind. 3 Snapshots benötigt).")
@@ -93,7 +86,7 @@ def show_advanced_metrics():
 
     all_metrics = metrics.calculate_all_metrics(portfolio_returns, portfolio_history_df, benchmark_returns)
 
-    print("\n--- Risiko- & Profi-Kennzahlen (Gesamte Historie vs. S&P 500) 🔬 ---")
+    print(f"\n--- Risiko- & Profi-Kennzahlen '{portfolio_name}' (Gesamte Historie vs. S&P 500) 🔬 ---")
     if "error" in all_metrics:
         print(f"Fehler: {all_metrics['error']}")
     else:
@@ -110,6 +103,9 @@ def show_advanced_metrics():
 
 
 if __name__ == '__main__':
+    # Optional: Name des Portfolios (Standard: settings.DEFAULT_PORTFOLIO)
+    portfolio_name = sys.argv[1] if len(sys.argv) > 1 else None
+
     # Dynamically create the benchmark description from settings
     benchmark_desc = " / ".join([f"{int(w*100)}% {t}" for t, w in settings.BENCHMARK_COMPONENTS.items()])
 
@@ -125,4 +121,7 @@ if __name__ == '__main__':
         print(f"Benchmark-Entwicklung: {performance_data['benchmark_performance_percent']:.2f}%")
     print("-----------------------------------------------------------------")
 
-    show_advanced_metrics()
\ No newline at end of file
+    show_advanced_metrics(portfolio_name)
+
+    print("\n--- Rollierende Kennzahlen (12/36/60 Monate) ---")
+    rolling.print_rolling(rolling.update_portfolio_rolling(portfolio_name))
\ No newline at end of file
@@ -0,0 +1,208 @@
+# reporting/rolling.py
+
+import sys
+import os
+import math
+import collections
+import numpy as np
+
+# Python den Weg zu den Modulen zeigen
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from config import settings
+from data import database, snapshot
+
+# Rollierende Kennzahlen (Sharpe, Volatilität, Beta, Drawdown) über 12/36/60 Monate.
+# Je Fenster werden nur laufende Summen und ein monotones Deque der NAV-Hochstände geführt:
+# eine neue Periode kostet O(1) (amortisiert), eine ganze Historie O(n) statt O(n * Fenster).
+# Der Zustand wird in der Tabelle `rolling_state` gespeichert und beim nächsten Event fortgeschrieben.
+FENSTER: tuple = (12, 36, 60)
+PERIODEN_PRO_JAHR: int = 12
+
+
+class _Fenster:
+    """Laufende Summen eines Fensters über die letzten `laenge` Renditen (r) und Benchmark-Renditen (b)."""
+    __slots__ = ('laenge', 'werte', 'n', 's_r', 's_rr', 'n_b', 's_rp', 's_b', 's_bb', 's_rb', 'hochstaende')
+
+    def __init__(self, laenge: int):
+        self.laenge = laenge
+        self.werte = collections.deque()         # (r, b) der Perioden im Fenster
+        self.n, self.s_r, self.s_rr = 0, 0.0, 0.0
+        self.n_b, self.s_rp, self.s_b, self.s_bb, self.s_rb = 0, 0.0, 0.0, 0.0, 0.0
+        self.hochstaende = collections.deque()   # (t, nav), nav streng fallend: vorne steht das Fenster-Maximum
+
+    def _summen(self, r: float, b, vorzeichen: int):
+        self.n += vorzeichen
+        self.s_r += vorzeichen * r
+        self.s_rr += vorzeichen * r * r
+        if b is not None:
+            self.n_b += vorzeichen
+            self.s_rp += vorzeichen * r
+            self.s_b += vorzeichen * b
+            self.s_bb += vorzeichen * b * b
+            self.s_rb += vorzeichen * r * b
+
+    def update(self, t: int, nav: float, r: float, b):
+        self.werte.append((r, b))
+        self._summen(r, b, +1)
+        if len(self.werte) > self.laenge:
+            alt_r, alt_b = self.werte.popleft()
+            self._summen(alt_r, alt_b, -1)
+
+        # Das Fenster umfasst die NAV-Punkte t - laenge .. t (Startwert der ältesten Rendite inklusive)
+        while self.hochstaende and self.hochstaende[-1][1] <= nav:
+            self.hochstaende.pop()
+        self.hochstaende.append((t, nav))
+        while self.hochstaende[0][0] < t - self.laenge:
+            self.hochstaende.popleft()
+
+    def kennzahlen(self, nav: float, rf: float) -> dict:
+        """Kennzahlen des vollen Fensters; solange es noch nicht gefüllt ist, sind alle Werte NaN."""
+        if self.n < self.laenge or self.n < 2:
+            return {'sharpe': math.nan, 'volatility': math.nan, 'beta': math.nan, 'drawdown': math.nan}
+        mittel = self.s_r / self.n
+        varianz = max(self.s_rr - self.n * mittel * mittel, 0.0) / (self.n - 1)
+        volatilitaet = math.sqrt(varianz * PERIODEN_PRO_JAHR)
+        ueberrendite = mittel * PERIODEN_PRO_JAHR - rf
+        beta = math.nan
+        if self.n_b >= 2:
+            varianz_b = self.s_bb - self.s_b * self.s_b / self.n_b
+            if varianz_b > 0:
+                beta = (self.s_rb - self.s_rp * self.s_b / self.n_b) / varianz_b
+        return {
+            'sharpe': ueberrendite / volatilitaet if volatilitaet > 0 else 0.0,
+            'volatility': volatilitaet,
+            'beta': beta,
+            'drawdown': nav / self.hochstaende[0][1] - 1,
+        }
+
+
+class RollingState:
+    """
+    Fortschreibbarer Zustand aller rollierenden Fenster einer Renditereihe.
+
+    update() verarbeitet eine neue Periode in O(1); to_dict()/from_dict() machen den
+    Zustand JSON-serialisierbar, damit er zwischen zwei Läufen gespeichert werden kann.
+    """
+
+    def __init__(self, fenster: tuple = FENSTER):
+        self.t = 0
+        self.nav = 1.0
+        self.last_period = None
+        self.fenster = {laenge: _Fenster(laenge) for laenge in fenster}
+        for f in self.fenster.values():
+            f.hochstaende.append((0, 1.0))
+
+    def update(self, rendite: float, benchmark_rendite: float = None, periode: str = None) -> dict:
+        """Nimmt die Rendite einer neuen Periode auf und liefert {fenster: kennzahlen}."""
+        b = None if benchmark_rendite is None or math.isnan(benchmark_rendite) else float(benchmark_rendite)
+        self.t += 1
+        self.nav *= 1 + rendite
+        for f in self.fenster.values():
+            f.update(self.t, self.nav, float(rendite), b)
+        if periode is not None:
+            self.last_period = periode
+        return self.kennzahlen()
+
+    def kennzahlen(self, risk_free_rate: float = None) -> dict:
+        rf = settings.RISK_FREE_RATE if risk_free_rate is None else risk_free_rate
+        return {laenge: f.kennzahlen(self.nav, rf) for laenge, f in self.fenster.items()}
+
+    def to_dict(self) -> dict:
+        return {
+            't': self.t, 'nav': self.nav, 'last_period': self.last_period,
+            'fenster': {
+                str(laenge): {'werte': list(f.werte), 'hochstaende': list(f.hochstaende)}
+                for laenge, f in self.fenster.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, daten: dict) -> "RollingState":
+        zustand = cls(tuple(int(laenge) for laenge in daten['fenster']))
+        zustand.t, zustand.nav, zustand.last_period = daten['t'], daten['nav'], daten['last_period']
+        for laenge, f_daten in daten['fenster'].items():
+            f = zustand.fenster[int(laenge)]
+            f.hochstaende = collections.deque(tuple(h) for h in f_daten['hochstaende'])
+            # Summen aus den Fensterwerten neu aufbauen: hält auch die Rundungsfehler der Differenzen klein
+            for r, b in f_daten['werte']:
+                f.werte.append((r, b))
+                f._summen(r, b, +1)
+        return zustand
+
+
+def rolling_metrics(returns: np.ndarray, benchmark_returns: np.ndarray = None, fenster: tuple = FENSTER) -> dict:
+    """
+    Rollierende Kennzahlen einer ganzen Renditereihe in einem O(n)-Durchlauf.
+
+    Returns:
+        {fenster: {'sharpe', 'volatility', 'beta', 'drawdown'}} mit je einem Array gleicher
+        Länge wie `returns`; Perioden vor dem ersten vollen Fenster sind NaN.
+    """
+    zustand = RollingState(fenster)
+    ergebnis = {laenge: {k: np.full(len(returns), np.nan) for k in ('sharpe', 'volatility', 'beta', 'drawdown')}
+                for laenge in fenster}
+    for i, rendite in enumerate(returns):
+        b = None if benchmark_returns is None else benchmark_returns[i]
+        for laenge, werte in zustand.update(rendite, b).items():
+            for k, wert in werte.items():
+                ergebnis[laenge][k][i] = wert
+    return ergebnis
+
+
+def _benchmark_rendite(monate: dict, preise: np.ndarray, von: str, bis: str) -> float:
+    """Gewichtete Benchmark-Rendite (settings.BENCHMARK_COMPONENTS) zwischen zwei Monaten ('YYYY-MM')."""
+    if von not in monate or bis not in monate:
+        return math.nan
+    start, ende = preise[monate[von]], preise[monate[bis]]
+    if np.isnan(start).any() or np.isnan(ende).any():
+        return math.nan
+    return float(((ende / start - 1) * list(settings.BENCHMARK_COMPONENTS.values())).sum())
+
+
+def update_portfolio_rolling(portfolio_name: str = None) -> dict:
+    """
+    Schreibt den rollierenden Zustand eines Portfolios (Standard: settings.DEFAULT_PORTFOLIO)
+    mit allen Events seit dem letzten Aufruf fort (O(1) je neuem Event) und speichert ihn.
+
+    Returns:
+        Aktuelle Kennzahlen {fenster: {'sharpe', 'volatility', 'beta', 'drawdown'}}.
+    """
+    portfolio_name = portfolio_name or settings.DEFAULT_PORTFOLIO
+    schluessel = f"portfolio:{portfolio_name}"
+    daten = database.load_rolling_state(schluessel)
+    zustand = RollingState.from_dict(daten) if daten else RollingState()
+
+    # Das letzte bereits verarbeitete Event wird als Startwert der ersten neuen Rendite mitgeladen
+    werte = database.get_portfolio_values(since=zustand.last_period, portfolio_name=portfolio_name)
+    if len(werte) < 2:
+        if daten is None and werte:
+            zustand.last_period = werte[0][0]
+            database.save_rolling_state(schluessel, zustand.to_dict())
+        return zustand.kennzahlen()
+
+    monate, _, preise = snapshot.load_snapshot(list(settings.BENCHMARK_COMPONENTS))
+    monat_index = {m: i for i, m in enumerate(monate)}
+    for (t_alt, wert_alt), (t_neu, wert_neu) in zip(werte, werte[1:]):
+        if wert_alt <= 0:
+            zustand.last_period = t_neu
+            continue
+        zustand.update(wert_neu / wert_alt - 1, _benchmark_rendite(monat_index, preise, t_alt[:7], t_neu[:7]), t_neu)
+
+    database.save_rolling_state(schluessel, zustand.to_dict())
+    return zustand.kennzahlen()
+
+
+def print_rolling(kennzahlen: dict):
+    print(f"{'Fenster':<10} | {'Sharpe':>7} | {'Volatilität':>11} | {'Beta':>6} | {'Drawdown':>9}")
+    print("-" * 55)
+    for laenge, k in kennzahlen.items():
+        print(f"{f'{laenge} M':<10} | {k['sharpe']:>7.2f} | {k['volatility'] * 100:>10.2f}% | "
+              f"{k['beta']:>6.2f} | {k['drawdown'] * 100:>8.2f}%")
+
+
+if __name__ == "__main__":
+    database.initialize_database()
+    print("--- Rollierende Kennzahlen des Portfolios ---")
+    print_rolling(update_portfolio_rolling())
@@ -0,0 +1,261 @@
+# reporting/runlog.py
+
+import sys
+import os
+import json
+import gzip
+import zlib
+import base64
+import bisect
+from datetime import date, datetime
+
+# Python den Weg zu den Modulen zeigen
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+# Append-only Lauf-Protokoll statt einer JSON-Datei je Lauf:
+#   history/runs.jsonl.gz   ein gzip-Member je Lauf, darin eine JSON-Zeile je Portfolio-Ergebnis
+#   history/runs.idx        eine JSON-Zeile je Lauf: timestamp_utc, offset, length, portfolios
+# gzip.open() liest die Member nacheinander als einen Strom (scan_records); über den Index wird
+# ein einzelner Lauf per Seek gelesen und nur sein Member entpackt (iter_runs, read_run).
+# DataFrames, Series und Arrays werden typisiert abgelegt und beim Lesen wiederhergestellt.
+DEFAULT_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "history")
+ARCHIVE_FILE = "runs.jsonl.gz"
+INDEX_FILE = "runs.idx"
+TYPE_KEY = "__type__"
+
+
+# --- Typisierte Serialisierung ---
+def _array(werte) -> dict:
+    import numpy as np
+    werte = np.asarray(werte)
+    if werte.dtype.kind in "biuf":
+        return {TYPE_KEY: "ndarray", 'dtype': werte.dtype.str, 'shape': list(werte.shape),
+                'data': base64.b64encode(np.ascontiguousarray(werte).tobytes()).decode('ascii')}
+    return {TYPE_KEY: "ndarray", 'dtype': "object", 'shape': list(werte.shape), 'data': werte.tolist()}
+
+
+def _kodiere(obj):
+    """json.dumps(default=...): Typen ohne JSON-Entsprechung mit Typ-Kennung ablegen."""
+    import numpy as np
+    import pandas as pd
+    if isinstance(obj, pd.DataFrame):
+        return {TYPE_KEY: "DataFrame", 'index': obj.index.tolist(), 'columns': obj.columns.tolist(),
+                'values': _array(obj.to_numpy())}
+    if isinstance(obj, pd.Series):
+        return {TYPE_KEY: "Series", 'index': obj.index.tolist(), 'name': obj.name, 'values': _array(obj.to_numpy())}
+    if isinstance(obj, np.ndarray):
+        return _array(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (datetime, date)):
+        return {TYPE_KEY: type(obj).__name__, 'value': obj.isoformat()}
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"Typ {type(obj).__name__} kann nicht im Lauf-Protokoll gespeichert werden.")
+
+
+def _dekodiere(d: dict):
+    """json.loads(object_hook=...): Gegenstück zu _kodiere."""
+    typ = d.get(TYPE_KEY)
+    if typ is None:
+        return d
+    if typ == "ndarray":
+        import numpy as np
+        if d['dtype'] == "object":
+            return np.array(d['data'], dtype=object).reshape(d['shape'])
+        return np.frombuffer(base64.b64decode(d['data']), dtype=np.dtype(d['dtype'])).reshape(d['shape']).copy()
+    if typ == "DataFrame":
+        import pandas as pd
+        return pd.DataFrame(d['values'], index=d['index'], columns=d['columns'])
+    if typ == "Series":
+        import pandas as pd
+        return pd.Series(d['values'], index=d['index'], name=d['name'])
+    if typ == "datetime":
+        return datetime.fromisoformat(d['value'])
+    if typ == "date":
+        return date.fromisoformat(d['value'])
+    return d
+
+
+def dumps(record: dict) -> str:
+    return json.dumps(record, default=_kodiere, ensure_ascii=False)
+
+
+def loads(zeile) -> dict:
+    return json.loads(zeile, object_hook=_dekodiere)
+
+
+# --- Schreiben ---
+def _pfade(verzeichnis: str = None) -> tuple:
+    verzeichnis = verzeichnis or DEFAULT_DIR
+    return os.path.join(verzeichnis, ARCHIVE_FILE), os.path.join(verzeichnis, INDEX_FILE)
+
+
+def append_run(records: list, verzeichnis: str = None) -> dict:
+    """
+    Hängt einen Lauf (Liste von Portfolio-Ergebnissen mit 'timestamp_utc' und 'portfolio_name')
+    als eigenes gzip-Member an das Archiv an und ergänzt den Index.
+
+    Returns:
+        Der Index-Eintrag des Laufs.
+    """
+    archiv, index = _pfade(verzeichnis)
+    os.makedirs(os.path.dirname(archiv), exist_ok=True)
+    load_index(verzeichnis)   # repariert einen Index, der nach einem Abbruch hinter dem Archiv zurückliegt
+
+    member = gzip.compress("".join(dumps(r) + "\n" for r in records).encode('utf-8'))
+    with open(archiv, 'ab') as f:
+        offset = f.seek(0, os.SEEK_END)
+        f.write(member)
+        f.flush()
+        os.fsync(f.fileno())
+
+    eintrag = _index_eintrag(records, offset, len(member))
+    with open(index, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(eintrag) + "\n")
+    return eintrag
+
+
+def _index_eintrag(records: list, offset: int, laenge: int) -> dict:
+    return {
+        'timestamp_utc': records[0].get('timestamp_utc') if records else None,
+        'offset': offset,
+        'length': laenge,
+        'portfolios': [r.get('portfolio_name') for r in records],
+    }
+
+
+# --- Index ---
+def load_index(verzeichnis: str = None) -> list:
+    """
+    Index-Einträge aller Läufe (älteste zuerst). Fehlt der Index oder deckt er das Archiv
+    nicht genau ab (z.B. Abbruch zwischen Archiv- und Index-Schreiben), wird er neu aufgebaut.
+    """
+    archiv, index = _pfade(verzeichnis)
+    if not os.path.exists(archiv):
+        return []
+    eintraege = []
+    try:
+        with open(index, encoding='utf-8') as f:
+            eintraege = [json.loads(zeile) for zeile in f if zeile.strip()]
+    except (OSError, ValueError):
+        eintraege = None
+    ende = eintraege[-1]['offset'] + eintraege[-1]['length'] if eintraege else 0
+    if eintraege is None or ende != os.path.getsize(archiv):
+        eintraege = rebuild_index(verzeichnis)
+    return eintraege
+
+
+def rebuild_index(verzeichnis: str = None) -> list:
+    """
+    Baut den Index aus dem Archiv neu auf (Member für Member). Ein unvollständiges letztes
+    Member (Abbruch beim Schreiben) wird abgeschnitten.
+    """
+    archiv, index = _pfade(verzeichnis)
+    with open(archiv, 'rb') as f:
+        daten = f.read()
+
+    eintraege, offset = [], 0
+    while offset < len(daten):
+        entpacker = zlib.decompressobj(wbits=31)
+        try:
+            inhalt = entpacker.decompress(daten[offset:])
+        except zlib.error:
+            break
+        if not entpacker.eof:
+            break
+        laenge = len(daten) - offset - len(entpacker.unused_data)
+        records = [loads(zeile) for zeile in inhalt.decode('utf-8').split("\n") if zeile]
+        eintraege.append(_index_eintrag(records, offset, laenge))
+        offset += laenge
+
+    if offset < len(daten):
+        print(f"WARNUNG: Unvollständiges Ende im Lauf-Protokoll ({len(daten) - offset} Bytes) wird abgeschnitten.")
+        with open(archiv, 'r+b') as f:
+            f.truncate(offset)
+    with open(index + ".tmp", 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(e) + "\n" for e in eintraege)
+    os.replace(index + ".tmp", index)
+    return eintraege
+
+
+# --- Lesen ---
+def _lese_member(f, eintrag: dict) -> list:
+    f.seek(eintrag['offset'])
+    inhalt = gzip.decompress(f.read(eintrag['length'])).decode('utf-8')
+    return [loads(zeile) for zeile in inhalt.split("\n") if zeile]
+
+
+def iter_runs(since: str = None, until: str = None, portfolio_name: str = None, verzeichnis: str = None):
+    """
+    Liefert die Läufe mit since <= timestamp_utc <= until (ISO-Strings, jeweils optional) als
+    (index_eintrag, records). Über den Index werden nur die passenden Member gelesen und entpackt;
+    mit `portfolio_name` nur Läufe und Records dieses Portfolios.
+    """
+    # Nach Zeit sortiert (nachträglich importierte ältere Läufe stehen im Archiv hinten)
+    eintraege = sorted(load_index(verzeichnis), key=lambda e: e['timestamp_utc'] or "")
+    zeitpunkte = [e['timestamp_utc'] or "" for e in eintraege]
+    von = bisect.bisect_left(zeitpunkte, since) if since else 0
+    bis = bisect.bisect_right(zeitpunkte, until) if until else len(eintraege)
+    if von >= bis:
+        return
+    archiv, _ = _pfade(verzeichnis)
+    with open(archiv, 'rb') as f:
+        for eintrag in eintraege[von:bis]:
+            if portfolio_name is not None and portfolio_name not in eintrag['portfolios']:
+                continue
+            records = _lese_member(f, eintrag)
+            if portfolio_name is not None:
+                records = [r for r in records if r.get('portfolio_name') == portfolio_name]
+            yield eintrag, records
+
+
+def read_run(timestamp_utc: str, verzeichnis: str = None) -> list:
+    """Records des Laufs mit genau diesem Zeitstempel (leer, wenn es ihn nicht gibt)."""
+    for _, records in iter_runs(timestamp_utc, timestamp_utc, verzeichnis=verzeichnis):
+        return records
+    return []
+
+
+def scan_records(verzeichnis: str = None):
+    """Streamt alle Records des Archivs in einem Durchlauf (ohne Index), z.B. für Audits über Jahre."""
+    archiv, _ = _pfade(verzeichnis)
+    if not os.path.exists(archiv):
+        return
+    with gzip.open(archiv, 'rt', encoding='utf-8') as f:
+        for zeile in f:
+            if zeile.strip():
+                yield loads(zeile)
+
+
+def import_legacy_json(verzeichnis: str = None) -> int:
+    """
+    Übernimmt die bisherigen history/rebalancing_*.json-Dateien (ein Lauf je Zeitstempel im
+    Dateinamen) in das Archiv. Die Dateien bleiben liegen und können danach gelöscht werden.
+    """
+    verzeichnis = verzeichnis or DEFAULT_DIR
+    vorhanden = {e['timestamp_utc'] for e in load_index(verzeichnis)}
+    laeufe = {}
+    for name in sorted(os.listdir(verzeichnis)):
+        if name.startswith("rebalancing_") and name.endswith(".json"):
+            with open(os.path.join(verzeichnis, name), encoding='utf-8') as f:
+                record = json.load(f)
+            laeufe.setdefault(name[len("rebalancing_"):len("rebalancing_") + 19], []).append(record)
+
+    importiert = 0
+    for records in sorted(laeufe.values(), key=lambda r: r[0].get('timestamp_utc') or ""):
+        if records[0].get('timestamp_utc') in vorhanden:
+            continue
+        append_run(records, verzeichnis)
+        importiert += 1
+    return importiert
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "import":
+        print(f"{import_legacy_json()} Läufe aus history/*.json übernommen.")
+    print(f"{'Zeitpunkt (UTC)':<33} | {'Portfolios':<30} | {'Bytes':>8}")
+    print("-" * 78)
+    for e in load_index():
+        print(f"{e['timestamp_utc'] or '-':<33} | {', '.join(map(str, e['portfolios']))[:30]:<30} | {e['length']:>8}")
@@ -0,0 +1,191 @@
+# reporting/tracing.py
+
+import time
+import threading
+import functools
+import itertools
+import statistics
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Leichtgewichtiges Tracing eines Laufs (z.B. run_monthly_rebalancing):
+# - "step":   die Schritte des Laufs, nacheinander über step() geöffnet
+# - "db":     jeder Datenbank-Aufruf (Decorator traced)
+# - "broker": jede IBKR-Anfrage von der Registrierung bis zum Abschluss (record_span)
+# Ohne aktiven Lauf kosten alle Aufrufe nur eine None-Prüfung.
+
+_lock = threading.Lock()
+_run = None
+_local = threading.local()
+
+
+class _Run:
+    def __init__(self, name: str):
+        self.name = name
+        self.run_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        self.started_utc = datetime.now(timezone.utc).isoformat()
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self.step = None   # (span_id, name, start) des offenen Schritts
+        self._ids = itertools.count(1)
+
+    def next_id(self) -> int:
+        with _lock:
+            return next(self._ids)
+
+    def add(self, name: str, kind: str, start: float, ende: float, span_id: int = None,
+            parent_id: int = None, **attrs):
+        """Hängt einen Span an; ohne `parent_id` gehört er zum offenen Schritt (bzw. zum Lauf = 0)."""
+        if span_id is None:
+            span_id = self.next_id()
+        with _lock:
+            if parent_id is None:
+                parent_id = self.step[0] if self.step is not None else 0
+            self.spans.append({
+                'run_id': self.run_id,
+                'span_id': span_id,
+                'parent_id': parent_id,
+                'name': name,
+                'kind': kind,
+                'start_ms': (start - self.t0) * 1000,
+                'duration_ms': (ende - start) * 1000,
+                'req_id': attrs.pop('req_id', None),
+                'symbol': attrs.pop('symbol', None),
+                'timed_out': bool(attrs.pop('timed_out', False)),
+                'error': attrs.pop('error', None),
+                'thread': threading.current_thread().name,
+                'attributes': attrs or None,
+            })
+
+
+def start_run(name: str) -> str:
+    """Beginnt einen neuen Lauf; alle folgenden Spans (aus allen Threads) gehören zu ihm."""
+    global _run
+    _run = _Run(name)
+    return _run.run_id
+
+
+def active() -> bool:
+    return _run is not None
+
+
+def step(name: str):
+    """Schließt den laufenden Schritt (falls vorhanden) und öffnet den nächsten."""
+    run = _run
+    if run is None:
+        return
+    jetzt = time.perf_counter()
+    _close_step(run, jetzt)
+    span_id = run.next_id()
+    with _lock:
+        run.step = (span_id, name, jetzt)
+
+
+def _close_step(run: _Run, ende: float):
+    if run.step is None:
+        return
+    span_id, name, start = run.step
+    run.step = None
+    run.add(name, "step", start, ende, span_id=span_id, parent_id=0)
+
+
+@contextmanager
+def span(name: str, kind: str, **attrs):
+    """Misst den umschlossenen Block als Span (Exceptions werden als 'error' vermerkt)."""
+    run = _run
+    if run is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        attrs['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        run.add(name, kind, start, time.perf_counter(), **attrs)
+
+
+def record_span(name: str, kind: str, start: float, **attrs):
+    """Erfasst einen Span, der bei `start` (time.perf_counter()) begann und jetzt endet."""
+    run = _run
+    if run is not None:
+        run.add(name, kind, start, time.perf_counter(), **attrs)
+
+
+def traced(kind: str):
+    """Decorator: jeder Aufruf der Funktion wird als Span `modul.funktion` erfasst."""
+    def decorator(func):
+        name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Verschachtelte Aufrufe (z.B. DB-Funktion ruft DB-Funktion) nur einmal zählen
+            if _run is None or getattr(_local, 'depth', 0) > 0:
+                return func(*args, **kwargs)
+            _local.depth = 1
+            try:
+                with span(name, kind):
+                    return func(*args, **kwargs)
+            finally:
+                _local.depth = 0
+        return wrapper
+    return decorator
+
+
+def end_run(persist: bool = True, show: bool = True) -> list:
+    """
+    Beendet den Lauf: schließt den offenen Schritt, speichert alle Spans in der
+    Tabelle `run_traces` und gibt die Latenz-Aufschlüsselung aus.
+
+    Returns:
+        Liste der Span-Dicts des Laufs.
+    """
+    global _run
+    run = _run
+    if run is None:
+        return []
+    ende = time.perf_counter()
+    _close_step(run, ende)
+    run.add(run.name, "run", run.t0, ende, span_id=0, parent_id=-1, started_utc=run.started_utc)
+    run.spans.sort(key=lambda s: s['span_id'])
+    _run = None
+
+    if persist:
+        from data import database
+        database.save_run_traces(run.spans)
+    if show:
+        print_breakdown(run.spans)
+    return run.spans
+
+
+def print_breakdown(spans: list, top_n: int = 5):
+    """Gibt die Latenz-Aufschlüsselung eines Laufs aus (Schritte, DB, Broker, langsamste Anfragen)."""
+    gesamt = next((s['duration_ms'] for s in spans if s['kind'] == "run"), 0.0) or 1.0
+    print("\n--- Latenz-Aufschlüsselung ---")
+    print(f"{'Schritt':<45} | {'Dauer':>10} | {'Anteil':>6}")
+    print("-" * 68)
+    for s in (s for s in spans if s['kind'] == "step"):
+        print(f"{s['name'][:45]:<45} | {s['duration_ms']:>7.1f} ms | {s['duration_ms'] / gesamt * 100:>5.1f}%")
+    print(f"{'GESAMT':<45} | {gesamt:>7.1f} ms |")
+
+    for kind, titel in (("db", "Datenbank"), ("broker", "Broker")):
+        gruppen = {}
+        for s in spans:
+            if s['kind'] == kind:
+                gruppen.setdefault(s['name'], []).append(s)
+        if not gruppen:
+            continue
+        print(f"\n{titel}: {'Aufruf':<33} | {'Anzahl':>6} | {'Summe':>10} | {'Median':>9} | {'Max':>9} | {'Timeouts':>8}")
+        for name, eintraege in sorted(gruppen.items(), key=lambda g: -sum(s['duration_ms'] for s in g[1])):
+            dauer = [s['duration_ms'] for s in eintraege]
+            print(f"{'':<{len(titel) + 2}}{name[:33]:<33} | {len(dauer):>6} | {sum(dauer):>7.1f} ms | "
+                  f"{statistics.median(dauer):>6.1f} ms | {max(dauer):>6.1f} ms | "
+                  f"{sum(s['timed_out'] for s in eintraege):>8}")
+
+    langsamste = sorted((s for s in spans if s['kind'] == "broker"), key=lambda s: -s['duration_ms'])[:top_n]
+    if langsamste:
+        print("\nLangsamste Broker-Anfragen:")
+        for s in langsamste:
+            status = "TIMEOUT" if s['timed_out'] else (s['error'] or "ok")
+            print(f"  reqId {s['req_id']}: {s['name']} {s['symbol'] or ''} {s['duration_ms']:.1f} ms ({status})")
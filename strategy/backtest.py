@@ -0,0 +1,202 @@
+# strategy/backtest.py
+
+import sys
+import os
+import time
+import numpy as np
+
+# Python den Weg zu den Modulen zeigen
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from config import settings
+from data import snapshot
+from strategy.logic import MOMENTUM_PERIODEN, MOMENTUM_GEWICHTE, signal_fuer_cash_anteil
+
+
+def alle_universum_ticker() -> list:
+    """Vereinigung aller Universen in stabiler Reihenfolge (Risky, Canary, Cash)."""
+    ticker = []
+    for t in settings.RISKY_UNIVERSE + settings.CANARY_UNIVERSE + settings.CASH_UNIVERSE:
+        if t not in ticker:
+            ticker.append(t)
+    return ticker
+
+
+def lade_preis_matrix(tickers: list = None) -> tuple:
+    """
+    Lädt ALLE gespeicherten Monatskurse der Ticker in eine Matrix (Monate x Ticker).
+    Die Ausrichtung erfolgt über den Kalendermonat ('YYYY-MM'), fehlende Kurse sind NaN.
+    Gelesen wird aus dem Spalten-Schnappschuss (data/snapshot.py) statt per SQL.
+
+    Returns:
+        (monate, tickers, preise) mit monate als np.ndarray von 'YYYY-MM'-Strings.
+    """
+    return snapshot.load_snapshot(tickers or alle_universum_ticker())
+
+
+def berechne_momentum_matrix(preise: np.ndarray, perioden: tuple = MOMENTUM_PERIODEN,
+                             gewichte: tuple = MOMENTUM_GEWICHTE) -> np.ndarray:
+    """
+    Vektorisierte Variante von logic.berechne_momentum für alle Monate und Ticker.
+    Zeilen ohne ausreichende Historie (bzw. mit Lücken im Lookback) sind NaN.
+    """
+    scores = np.full(preise.shape, np.nan)
+    max_lag = max(perioden)
+    if preise.shape[0] <= max_lag:
+        return scores
+
+    aktuell = preise[max_lag:]
+    summe = 0
+    for periode, gewicht in zip(perioden, gewichte):
+        rendite = (aktuell / preise[max_lag - periode:preise.shape[0] - periode]) - 1
+        summe = summe + (rendite * gewicht)
+    scores[max_lag:] = summe / len(perioden)
+    return scores
+
+
+def run_backtest(monate: np.ndarray, tickers: list, preise: np.ndarray,
+                 risky_universe: list = None, canary_universe: list = None,
+                 cash_universe: list = None, top_n: int = None, breite: int = None,
+                 perioden: tuple = MOMENTUM_PERIODEN, gewichte: tuple = MOMENTUM_GEWICHTE,
+                 scores: np.ndarray = None) -> dict:
+    """
+    Walk-Forward-Backtest der DAA-Strategie in einem einzigen vektorisierten Durchlauf.
+
+    Für jeden Monat t wird dieselbe Entscheidung getroffen wie von
+    logic.bestimme_ziel_portfolio mit den letzten 13 Kursen bis einschließlich t.
+    Die Gewichte aus Monat t werden auf die Renditen von t nach t+1 angewendet. Fehlt für ein
+    gehaltenes Asset der Kurs in t+1, ist die Rendite dieses Monats NaN und der NAV endet in t.
+
+    `breite` ist der DAA-Parameter B: bei b kranken Canaries gehen min(1, b/B) in das
+    beste Cash-Asset. Für B=1 (settings) entspricht das exakt dem binären Signal der Live-Logik.
+    Bereits berechnete `scores` (z.B. bei Parameter-Sweeps) können übergeben werden.
+    """
+    risky_universe = risky_universe or settings.RISKY_UNIVERSE
+    canary_universe = canary_universe or settings.CANARY_UNIVERSE
+    cash_universe = cash_universe or settings.CASH_UNIVERSE
+    top_n = top_n or settings.T
+    breite = breite or settings.B
+
+    spalte = {ticker: i for i, ticker in enumerate(tickers)}
+    idx_risky = np.array([spalte[t] for t in risky_universe])
+    idx_canary = np.array([spalte[t] for t in canary_universe])
+    idx_cash = np.array([spalte[t] for t in cash_universe])
+
+    if scores is None:
+        scores = berechne_momentum_matrix(preise, perioden, gewichte)
+    anzahl_monate = preise.shape[0]
+    zeilen = np.arange(anzahl_monate)
+
+    # Ein Monat ist nur entscheidbar, wenn alle benötigten Scores vorhanden sind
+    benoetigt = np.concatenate([idx_risky, idx_canary, idx_cash])
+    gueltig = ~np.isnan(scores[:, benoetigt]).any(axis=1)
+
+    # --- Canary-Signal ---
+    canary_scores = scores[:, idx_canary]
+    kranke_canaries = (~(canary_scores > 0)).sum(axis=1)
+    cash_anteil = np.where(gueltig, np.minimum(1.0, kranke_canaries / breite), 0.0)
+    risk_on = gueltig & (kranke_canaries == 0)
+
+    # --- Top-T-Auswahl (stabil, damit Gleichstände wie in sorted() aufgelöst werden) ---
+    risky_scores = scores[:, idx_risky]
+    risky_rang = np.argsort(-np.nan_to_num(risky_scores, nan=-np.inf), axis=1, kind='stable')
+    cash_scores = scores[:, idx_cash]
+    cash_rang = np.argsort(-np.nan_to_num(cash_scores, nan=-np.inf), axis=1, kind='stable')
+
+    gewichte_matrix = np.zeros(preise.shape)
+    on_zeilen = zeilen[gueltig & (cash_anteil < 1)]
+    gewichte_matrix[on_zeilen[:, None], idx_risky[risky_rang[on_zeilen, :top_n]]] = \
+        ((1 - cash_anteil[on_zeilen]) / top_n)[:, None]
+    off_zeilen = zeilen[gueltig & (cash_anteil > 0)]
+    gewichte_matrix[off_zeilen, idx_cash[cash_rang[off_zeilen, 0]]] += cash_anteil[off_zeilen]
+
+    marktbreite_prozent = np.where(
+        gueltig, (risky_scores > 0).sum(axis=1) / len(risky_universe) * 100, np.nan
+    )
+
+    # --- Portfolio-NAV ---
+    asset_renditen = np.zeros(preise.shape)
+    asset_renditen[1:] = (preise[1:] / preise[:-1]) - 1
+    gehalten = gewichte_matrix[:-1] > 0
+    beitrag = np.where(gehalten, gewichte_matrix[:-1] * np.nan_to_num(asset_renditen[1:]), 0.0)
+    # Fehlt der Folgekurs eines gehaltenen Assets, ist die Monatsrendite unbekannt (nicht 0%)
+    unbekannt = (gehalten & np.isnan(asset_renditen[1:])).any(axis=1)
+    portfolio_renditen = np.full(anzahl_monate, np.nan)
+    portfolio_renditen[1:] = np.where(gueltig[:-1] & ~unbekannt, beitrag.sum(axis=1), np.nan)
+
+    nav = np.full(anzahl_monate, np.nan)
+    if gueltig.any():
+        start = int(np.argmax(gueltig))
+        nav[start:] = np.cumprod(np.concatenate([[1.0], 1 + np.nan_to_num(portfolio_renditen[start + 1:])]))
+        # Der NAV endet vor dem ersten Monat mit unbekannter Rendite
+        luecken = np.flatnonzero(unbekannt[start:])
+        if luecken.size:
+            nav[start + 1 + luecken[0]:] = np.nan
+
+    return {
+        'monate': monate,
+        'tickers': list(tickers),
+        'risky_universe': list(risky_universe),
+        'cash_universe': list(cash_universe),
+        'scores': scores,
+        'gueltig': gueltig,
+        'risk_on': risk_on,
+        'cash_anteil': cash_anteil,
+        'gewichte': gewichte_matrix,
+        'marktbreite_prozent': marktbreite_prozent,
+        'portfolio_renditen': portfolio_renditen,
+        'nav': nav,
+    }
+
+
+def entscheidung_fuer_monat(ergebnis: dict, monat: str) -> dict:
+    """
+    Liefert die Entscheidung eines Backtest-Monats im Format von
+    logic.bestimme_ziel_portfolio (Signal, Ranking, Portfolio), z.B. für Vergleiche.
+    """
+    zeile = int(np.flatnonzero(ergebnis['monate'] == monat)[0])
+    if not ergebnis['gueltig'][zeile]:
+        raise ValueError(f"Für {monat} liegen nicht genügend Daten für eine Entscheidung vor.")
+
+    spalte = {ticker: i for i, ticker in enumerate(ergebnis['tickers'])}
+    cash_anteil = float(ergebnis['cash_anteil'][zeile])
+    signal = signal_fuer_cash_anteil(cash_anteil)
+    # Wie in bestimme_ziel_portfolio: Risky-Rangliste, solange ein Risk-On-Anteil bleibt (B > 1)
+    universum = ergebnis['cash_universe'] if cash_anteil >= 1 else ergebnis['risky_universe']
+    ranking = sorted(
+        ((t, float(ergebnis['scores'][zeile, spalte[t]])) for t in universum),
+        key=lambda item: item[1], reverse=True
+    )
+    portfolio = {
+        ergebnis['tickers'][i]: float(w)
+        for i, w in enumerate(ergebnis['gewichte'][zeile]) if w > 0
+    }
+    return {'final_signal': signal, 'momentum_ranking': ranking, 'portfolio': portfolio, 'cash_anteil': cash_anteil}
+
+
+if __name__ == "__main__":
+    start_zeit = time.perf_counter()
+    monate, tickers, preise = lade_preis_matrix()
+    lade_dauer = time.perf_counter() - start_zeit
+
+    start_zeit = time.perf_counter()
+    ergebnis = run_backtest(monate, tickers, preise)
+    backtest_dauer = time.perf_counter() - start_zeit
+
+    print("==============================================")
+    print("=== DAA-Backtest (vektorisiert)            ===")
+    print("==============================================")
+    print(f"Preis-Matrix: {preise.shape[0]} Monate x {preise.shape[1]} Ticker (geladen in {lade_dauer * 1000:.1f} ms)")
+    print(f"Backtest-Durchlauf: {backtest_dauer * 1000:.2f} ms")
+
+    if not ergebnis['gueltig'].any():
+        print("Nicht genügend Historie für einen Backtest (mind. 13 Monate je Ticker benötigt).")
+    else:
+        gueltige_monate = monate[ergebnis['gueltig']]
+        nav = ergebnis['nav'][~np.isnan(ergebnis['nav'])]
+        print(f"Zeitraum: {gueltige_monate[0]} bis {gueltige_monate[-1]} ({len(gueltige_monate)} Entscheidungen)")
+        print(f"Risk-On-Anteil: {ergebnis['risk_on'][ergebnis['gueltig']].mean() * 100:.1f}%")
+        print(f"Endwert NAV (Start = 1.0): {nav[-1]:.4f}")
+        letzte = entscheidung_fuer_monat(ergebnis, gueltige_monate[-1])
+        print(f"Letzte Entscheidung ({gueltige_monate[-1]}): {letzte['final_signal']} -> {letzte['portfolio']}")
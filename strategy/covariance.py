@@ -0,0 +1,180 @@
+# strategy/covariance.py
+
+import numpy as np
+from data import database
+
+# Kovarianz-Zustand des gesamten Universums über die letzten FENSTER Monatsrenditen.
+# Mittelwert und Ko-Moment-Matrix werden Welford-artig fortgeschrieben: ein neuer Monat
+# kommt hinzu, der älteste fällt heraus, ein revidierter Monat (laufender Monat) wird
+# herausgenommen und neu eingerechnet - jeweils O(N²) statt einer Neuberechnung.
+# Korrelationen beliebiger Teilmengen (z.B. der Top-T) sind danach nur noch ein Slice.
+# Der Zustand liegt binär (float64-Blobs) in der Tabelle `covariance_state`.
+FENSTER = 12   # Renditen aus den 13 Kursen, die auch die Strategie verwendet
+ZUSTANDS_SCHLUESSEL = "universe"
+
+
+class KovarianzZustand:
+    """Fensterweise Welford-Kovarianz über die Monatsrenditen einer festen Ticker-Liste."""
+
+    def __init__(self, tickers: list, fenster: int = FENSTER):
+        self.tickers = list(tickers)
+        self.fenster = fenster
+        self.spalte = {t: i for i, t in enumerate(self.tickers)}
+        k = len(self.tickers)
+        self.n = 0
+        self.mittel = np.zeros(k)
+        self.komoment = np.zeros((k, k))
+        self.renditen = np.empty((0, k))   # Renditen im Fenster, älteste zuerst
+        self.letzter_monat = None
+        self.letzte_kurse = None           # Kurse des letzten Monats (Basis der nächsten Rendite)
+        self.vorherige_kurse = None        # Kurse des Vormonats (Basis bei Revision des letzten Monats)
+
+    # --- Welford-Schritte ---
+    def _hinzufuegen(self, x: np.ndarray):
+        self.n += 1
+        delta = x - self.mittel
+        self.mittel += delta / self.n
+        self.komoment += np.outer(delta, x - self.mittel)
+
+    def _entfernen(self, x: np.ndarray):
+        if self.n <= 1:
+            self.n = 0
+            self.mittel[:] = 0.0
+            self.komoment[:] = 0.0
+            return
+        mittel_alt = self.mittel.copy()
+        self.n -= 1
+        self.mittel = (mittel_alt * (self.n + 1) - x) / self.n
+        self.komoment -= np.outer(x - mittel_alt, x - self.mittel)
+
+    def aktualisiere(self, monate: list, kurse: np.ndarray):
+        """
+        Übernimmt Monatskurse (Zeilen = Monate 'YYYY-MM' aufsteigend, Spalten = self.tickers).
+        Monate vor dem zuletzt verarbeiteten werden übersprungen, der zuletzt verarbeitete
+        wird bei geänderten Kursen als Revision behandelt.
+
+        Returns:
+            True/False (Zustand geändert oder nicht), None wenn er nicht fortschreibbar ist
+            (Lücke, fehlende Kurse, Daten enden vor dem Zustand) und neu aufgebaut werden muss.
+        """
+        if self.letzter_monat is not None and len(monate) and monate[-1] < self.letzter_monat:
+            return None
+        geaendert = False
+        for monat, zeile in zip(monate, kurse):
+            if self.letzter_monat is not None and monat < self.letzter_monat:
+                continue
+            if np.isnan(zeile).any():
+                return None
+            if monat == self.letzter_monat:
+                if np.array_equal(zeile, self.letzte_kurse):
+                    continue
+                if self.vorherige_kurse is None:
+                    return None
+                # Revidierter letzter Monat: seine Rendite herausnehmen und neu einrechnen
+                rendite = zeile / self.vorherige_kurse - 1
+                self._entfernen(self.renditen[-1])
+                self.renditen[-1] = rendite
+                self._hinzufuegen(rendite)
+            else:
+                if self.letzter_monat is not None and _monats_abstand(self.letzter_monat, monat) != 1:
+                    return None
+                if self.letzte_kurse is not None:
+                    rendite = zeile / self.letzte_kurse - 1
+                    self.renditen = np.vstack([self.renditen, rendite])
+                    self._hinzufuegen(rendite)
+                    if len(self.renditen) > self.fenster:
+                        self._entfernen(self.renditen[0])
+                        self.renditen = self.renditen[1:]
+                self.vorherige_kurse = self.letzte_kurse
+                self.letzter_monat = monat
+            self.letzte_kurse = zeile.copy()
+            geaendert = True
+        return geaendert
+
+    def ist_aktuell(self, monat: str) -> bool:
+        """Volles Fenster, das mit `monat` ('YYYY-MM') endet - dann entspricht es den 13 Kursen der Strategie."""
+        return self.n == self.fenster and self.letzter_monat == monat
+
+    # --- Abfragen (Slices) ---
+    def kovarianz(self, tickers: list = None) -> np.ndarray:
+        """Stichproben-Kovarianz (ddof=1) der Renditen im Fenster, optional nur für `tickers`."""
+        idx = [self.spalte[t] for t in (tickers or self.tickers)]
+        if self.n < 2:
+            return np.full((len(idx), len(idx)), np.nan)
+        return self.komoment[np.ix_(idx, idx)] / (self.n - 1)
+
+    def korrelation(self, tickers: list = None) -> "pd.DataFrame":
+        """Korrelationsmatrix (wie DataFrame.pct_change().corr()) als DataFrame für `tickers`."""
+        import pandas as pd
+        tickers = list(tickers or self.tickers)
+        kov = self.kovarianz(tickers)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.sqrt(np.diag(kov))
+            korr = np.clip(kov / np.outer(std, std), -1.0, 1.0)
+        np.fill_diagonal(korr, np.where(std > 0, 1.0, np.nan))
+        return pd.DataFrame(korr, index=tickers, columns=tickers)
+
+    # --- Persistenz ---
+    def to_record(self) -> dict:
+        return {
+            'tickers': self.tickers, 'fenster': self.fenster, 'n': self.n, 'letzter_monat': self.letzter_monat,
+            'mittel': self.mittel.tobytes(), 'komoment': self.komoment.tobytes(),
+            'renditen': self.renditen.tobytes(),
+            'letzte_kurse': None if self.letzte_kurse is None else self.letzte_kurse.tobytes(),
+            'vorherige_kurse': None if self.vorherige_kurse is None else self.vorherige_kurse.tobytes(),
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> "KovarianzZustand":
+        zustand = cls(record['tickers'], record['fenster'])
+        k = len(zustand.tickers)
+        zustand.n = record['n']
+        zustand.letzter_monat = record['letzter_monat']
+        zustand.mittel = np.frombuffer(record['mittel'], dtype=np.float64).copy()
+        zustand.komoment = np.frombuffer(record['komoment'], dtype=np.float64).reshape(k, k).copy()
+        zustand.renditen = np.frombuffer(record['renditen'], dtype=np.float64).reshape(-1, k).copy()
+        for feld in ('letzte_kurse', 'vorherige_kurse'):
+            if record[feld] is not None:
+                setattr(zustand, feld, np.frombuffer(record[feld], dtype=np.float64).copy())
+        return zustand
+
+
+def _monats_abstand(von: str, bis: str) -> int:
+    return (int(bis[:4]) - int(von[:4])) * 12 + int(bis[5:7]) - int(von[5:7])
+
+
+def aktualisiere_kovarianz(tickers: list, preise: "pd.DataFrame" = None) -> KovarianzZustand:
+    """
+    Schreibt den gespeicherten Kovarianz-Zustand des Universums fort und speichert ihn.
+
+    `preise` ist ein Panel Monat x Ticker wie aus database.get_prices_for_universe (z.B. das,
+    das main.py ohnehin lädt); ohne Panel werden die letzten FENSTER + 1 Kurse gelesen.
+    Nur neue bzw. der revidierte letzte Monat werden eingerechnet; bei geändertem Universum,
+    Lücken oder fehlenden Kursen wird der Zustand aus den letzten FENSTER + 1 Monaten neu aufgebaut.
+    """
+    tickers = sorted(set(tickers))
+    if preise is None:
+        preise = database.get_prices_for_universe(tickers, limit=FENSTER + 1)
+    panel = preise[tickers]
+    monate, kurse = list(panel.index), panel.to_numpy(dtype=np.float64)
+    # Ein Monat, der noch nicht für alle Ticker vorliegt, wird erst im nächsten Lauf eingerechnet
+    while monate and np.isnan(kurse[-1]).any():
+        monate, kurse = monate[:-1], kurse[:-1]
+
+    record = database.load_covariance_state(ZUSTANDS_SCHLUESSEL)
+    zustand = KovarianzZustand.from_record(record) if record else None
+    geaendert = None
+    if zustand is not None and zustand.tickers == tickers and zustand.fenster == FENSTER:
+        geaendert = zustand.aktualisiere(monate, kurse)
+    if geaendert is None:
+        # Neuaufbau aus den letzten lückenlosen Monaten, in denen alle Ticker einen Kurs haben
+        start = len(monate)
+        while (start > 0 and len(monate) - start < FENSTER + 1 and not np.isnan(kurse[start - 1]).any()
+               and (start == len(monate) or _monats_abstand(monate[start - 1], monate[start]) == 1)):
+            start -= 1
+        zustand = KovarianzZustand(tickers)
+        zustand.aktualisiere(monate[start:], kurse[start:])
+        geaendert = True
+    if geaendert:
+        database.save_covariance_state(ZUSTANDS_SCHLUESSEL, zustand.to_record())
+    return zustand
@@ -1,52 +1,120 @@
 # strategy/logic.py
 
-import pandas as pd
 from config import settings
 from data import database # Import für Signal-Historie
+from strategy import scores
 
-def berechne_momentum(monats_schlusskurse: list) -> dict:
-    # ... (Diese Funktion bleibt unverändert)
+# 13612W-Momentum: Lookbacks in Monaten und ihre Gewichte (auch vom Backtest genutzt)
+MOMENTUM_PERIODEN: tuple = (1, 3, 6, 12)
+MOMENTUM_GEWICHTE: tuple = (12, 4, 2, 1)
+
+def portfolio_parameter(definition: dict) -> dict:
+    """Ergänzt eine Portfolio-Definition aus settings.PORTFOLIOS um die Standardwerte aus settings."""
+    return {
+        'name': definition.get('name', settings.DEFAULT_PORTFOLIO),
+        'risky': list(definition.get('risky') or settings.RISKY_UNIVERSE),
+        'canary': list(definition.get('canary') or settings.CANARY_UNIVERSE),
+        'cash': list(definition.get('cash') or settings.CASH_UNIVERSE),
+        'T': definition.get('T') or settings.T,
+        'B': definition.get('B') or settings.B,
+        'account': definition.get('account'),
+    }
+
+def berechne_momentum(monats_schlusskurse: list, gewichte: tuple = MOMENTUM_GEWICHTE) -> dict:
     if len(monats_schlusskurse) < 13:
         raise ValueError(f"Nicht genügend Daten. Erhalten: {len(monats_schlusskurse)}, benötigt: 13.")
     
     aktueller_kurs = monats_schlusskurse[-1]
-    ret1 = (aktueller_kurs / monats_schlusskurse[-2]) - 1
-    ret3 = (aktueller_kurs / monats_schlusskurse[-4]) - 1
-    ret6 = (aktueller_kurs / monats_schlusskurse[-7]) - 1
-    ret12 = (aktueller_kurs / monats_schlusskurse[-13]) - 1
+    summe = 0
+    for periode, gewicht in zip(MOMENTUM_PERIODEN, gewichte):
+        rendite = (aktueller_kurs / monats_schlusskurse[-1 - periode]) - 1
+        summe = summe + (rendite * gewicht)
 
-    score = ((ret1*12) + (ret3*4) + (ret6*2) + (ret12*1)) / 4
+    score = summe / len(MOMENTUM_PERIODEN)
     
     return {'momentum_score': score, 'input_prices': monats_schlusskurse}
 
-def canary_check(daten_aller_assets: dict) -> dict:
-    # ... (Diese Funktion bleibt unverändert)
+def berechne_momentum_scores(daten_aller_assets: dict, tickers: list, letzte_bars: dict = None) -> dict:
+    """
+    Momentum-Scores für mehrere Ticker, jeder Ticker wird höchstens einmal berechnet.
+    Mit `letzte_bars` ({ticker: datum des letzten Bars}) läuft die Berechnung über den Score-Cache.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    def berechne(ticker):
+        return berechne_momentum(daten_aller_assets[ticker])['momentum_score']
+    letzte_bars = letzte_bars or {}
+    ergebnis = scores.hole_scores(
+        {t: letzte_bars[t] for t in tickers if t in letzte_bars}, MOMENTUM_GEWICHTE, berechne
+    )
+    # Ticker ohne bekannten letzten Bar werden direkt (ungecacht) berechnet
+    for ticker in tickers:
+        if ticker not in ergebnis:
+            ergebnis[ticker] = berechne(ticker)
+    return {ticker: ergebnis[ticker] for ticker in tickers}
+
+def signal_fuer_cash_anteil(cash_anteil: float) -> str:
+    """RISK_ON (kein Cash), RISK_OFF (nur Cash) oder RISK_PARTIAL (bei B > 1 teilweise im Cash)."""
+    if cash_anteil <= 0:
+        return "RISK_ON"
+    return "RISK_OFF" if cash_anteil >= 1 else "RISK_PARTIAL"
+
+def canary_check(daten_aller_assets: dict, momentum_scores: dict = None, canary_universe: list = None,
+                 breite: int = None) -> dict:
+    """
+    Prüft die Canaries. Bei b kranken Canaries gehen min(1, b/B) ins Cash ('cash_anteil');
+    das Signal folgt daraus (für B=1 das binäre RISK_ON/RISK_OFF).
+    """
+    canary_universe = canary_universe or settings.CANARY_UNIVERSE
+    breite = breite or settings.B
+    momentum_scores = momentum_scores or berechne_momentum_scores(daten_aller_assets, canary_universe)
     canary_details = {}
-    final_signal = "RISK_ON"
-    for ticker in settings.CANARY_UNIVERSE:
-        berechnungs_ergebnis = berechne_momentum(daten_aller_assets[ticker])
+    kranke_canaries = 0
+    for ticker in canary_universe:
+        berechnungs_ergebnis = {'momentum_score': momentum_scores[ticker], 'input_prices': daten_aller_assets[ticker]}
         status = "Gesund" if berechnungs_ergebnis['momentum_score'] > 0 else "Krank"
         if status == "Krank":
-            final_signal = "RISK_OFF"
+            kranke_canaries += 1
         canary_details[ticker] = {'status': status, 'berechnung': berechnungs_ergebnis}
-    return {'final_signal': final_signal, 'canary_details': canary_details}
+    cash_anteil = min(1.0, kranke_canaries / breite)
+    return {'final_signal': signal_fuer_cash_anteil(cash_anteil), 'cash_anteil': cash_anteil,
+            'canary_details': canary_details}
+
+def bestimme_ziel_portfolio(daten_aller_assets: dict, letzte_bars: dict = None,
+                            risky_universe: list = None, canary_universe: list = None, cash_universe: list = None,
+                            top_n: int = None, breite: int = None, signal_historie: list = None,
+                            kovarianz=None) -> dict:
+    """
+    Die Haupt-Entscheidungsfunktion, jetzt inkl. Berechnung des Kontexts.
+    Optional `letzte_bars` ({ticker: datum des letzten Bars}), um Scores aus dem Score-Cache zu nutzen.
+
+    Universen, `top_n` (T) und `breite` (B) fallen auf settings zurück. Bei b kranken Canaries
+    gehen min(1, b/B) in das beste Cash-Asset, der Rest zu gleichen Teilen in die Top-T
+    (für B=1 das binäre RISK_ON/RISK_OFF, sonst dazwischen RISK_PARTIAL). `signal_historie` (älteste zuerst) ersetzt die
+    Signal-Historie aus der Datenbank, z.B. für eine einzelne Portfolio-Variante.
+    `kovarianz` (covariance.KovarianzZustand über dieselben 13 Kurse) liefert die Korrelation
+    der Top-Assets als Slice, statt sie aus den Kursen neu zu berechnen.
+    """
+    risky_universe = risky_universe or settings.RISKY_UNIVERSE
+    canary_universe = canary_universe or settings.CANARY_UNIVERSE
+    cash_universe = cash_universe or settings.CASH_UNIVERSE
+    top_n = top_n or settings.T
+    breite = breite or settings.B
 
-def bestimme_ziel_portfolio(daten_aller_assets: dict) -> dict:
-    """Die Haupt-Entscheidungsfunktion, jetzt inkl. Berechnung des Kontexts."""
-    markt_signal_details = canary_check(daten_aller_assets)
+    # Canary- und Risky-Scores gemeinsam: Assets in beiden Universen (EMIM) nur einmal berechnen
+    momentum_scores = berechne_momentum_scores(daten_aller_assets, canary_universe + risky_universe, letzte_bars)
+    markt_signal_details = canary_check(daten_aller_assets, momentum_scores, canary_universe, breite)
     markt_signal = markt_signal_details['final_signal']
+    cash_anteil = markt_signal_details['cash_anteil']
     
     # --- Kontext-Berechnungen ---
     # 1. Marktbreite
-    risky_momentum_scores = {
-        ticker: berechne_momentum(daten_aller_assets[ticker])['momentum_score']
-        for ticker in settings.RISKY_UNIVERSE
-    }
+    risky_momentum_scores = {ticker: momentum_scores[ticker] for ticker in risky_universe}
     positive_momentum_count = sum(1 for score in risky_momentum_scores.values() if score > 0)
-    marktbreite_prozent = (positive_momentum_count / len(settings.RISKY_UNIVERSE)) * 100
+    marktbreite_prozent = (positive_momentum_count / len(risky_universe)) * 100
 
     # 2. Dauer des Signals
-    signal_historie = database.get_signal_history()
+    if signal_historie is None:
+        signal_historie = database.get_signal_history()
     signal_dauer = 0
     for signal in reversed(signal_historie):
         if signal == markt_signal:
@@ -55,48 +123,44 @@ def bestimme_ziel_portfolio(daten_aller_assets: dict) -> dict:
             break
     signal_dauer += 1 # Das aktuelle Event mitzählen
 
-    # --- Portfolio-Logik (RISK-ON) ---
-    if markt_signal == "RISK_ON":
+    ziel_portfolio = {}
+    korrelations_matrix = None # Keine Korrelation bei nur einem Asset
+
+    # --- Portfolio-Logik (RISK-ON-Anteil) ---
+    if cash_anteil < 1:
         sortierte_assets = sorted(risky_momentum_scores.items(), key=lambda item: item[1], reverse=True)
-        top_assets = sortierte_assets[:settings.T]
-        ziel_portfolio = {asset[0]: 1 / settings.T for asset in top_assets}
+        top_assets = sortierte_assets[:top_n]
+        ziel_portfolio = {asset[0]: (1 - cash_anteil) / top_n for asset in top_assets}
 
         # 3. Korrelations-Matrix für die Top-Assets
         top_asset_tickers = [asset[0] for asset in top_assets]
-        prices_df = pd.DataFrame({
-            ticker: daten_aller_assets[ticker] for ticker in top_asset_tickers
-        })
-        returns_df = prices_df.pct_change().dropna()
-        korrelations_matrix = returns_df.corr()
-
-        return {
-            'canary_report': markt_signal_details,
-            'momentum_ranking': sortierte_assets,
-            'portfolio': ziel_portfolio,
-            'entscheidungskontext': {
-                'marktbreite_prozent': marktbreite_prozent,
-                'signal_duration': signal_dauer,
-                'korrelations_matrix': korrelations_matrix
-            }
-        }
+        if kovarianz is not None:
+            korrelations_matrix = kovarianz.korrelation(top_asset_tickers)
+        else:
+            import pandas as pd
+            prices_df = pd.DataFrame({
+                ticker: daten_aller_assets[ticker] for ticker in top_asset_tickers
+            })
+            returns_df = prices_df.pct_change().dropna()
+            korrelations_matrix = returns_df.corr()
+
+    # --- Portfolio-Logik (RISK-OFF-Anteil) ---
+    if cash_anteil > 0:
+        cash_momentum_scores = berechne_momentum_scores(daten_aller_assets, cash_universe, letzte_bars)
+        cash_ranking = sorted(cash_momentum_scores.items(), key=lambda item: item[1], reverse=True)
+        bestes_asset = cash_ranking[0][0]
+        ziel_portfolio[bestes_asset] = ziel_portfolio.get(bestes_asset, 0.0) + cash_anteil
+        if cash_anteil == 1:
+            sortierte_assets = cash_ranking
 
-    # --- Portfolio-Logik (RISK-OFF) ---
-    else:
-        cash_momentum_scores = {
-            ticker: berechne_momentum(daten_aller_assets[ticker])['momentum_score']
-            for ticker in settings.CASH_UNIVERSE
+    return {
+        'canary_report': markt_signal_details,
+        'momentum_ranking': sortierte_assets,
+        'portfolio': ziel_portfolio,
+        'cash_anteil': cash_anteil,
+        'entscheidungskontext': {
+            'marktbreite_prozent': marktbreite_prozent,
+            'signal_duration': signal_dauer,
+            'korrelations_matrix': korrelations_matrix
         }
-        sortierte_assets = sorted(cash_momentum_scores.items(), key=lambda item: item[1], reverse=True)
-        bestes_asset = sortierte_assets[0][0]
-        ziel_portfolio = {bestes_asset: 1.0}
-
-        return {
-            'canary_report': markt_signal_details,
-            'momentum_ranking': sortierte_assets,
-            'portfolio': ziel_portfolio,
-            'entscheidungskontext': {
-                'marktbreite_prozent': marktbreite_prozent,
-                'signal_duration': signal_dauer,
-                'korrelations_matrix': None # Keine Korrelation bei nur einem Asset
-            }
-        }
\ No newline at end of file
+    }
@@ -0,0 +1,169 @@
+# strategy/replay.py
+
+import sys
+import os
+import math
+import time
+import argparse
+import numpy as np
+
+# Python den Weg zu den Modulen zeigen
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from config import settings
+from data import database, snapshot
+from execution import portfolio, planner
+from strategy import logic
+
+# Deterministischer Replay gespeicherter Rebalancing-Events ohne Broker:
+# Für jedes Event werden die Eingaben der damaligen Entscheidung wiederhergestellt, die Strategie
+# (und die Trade-Berechnung) erneut ausgeführt und Signal, Rangliste, Portfolio und Trades mit dem
+# Gespeicherten verglichen - z.B. als Regressions-Test vor jedem Deployment.
+#   "gespeichert":   Kurse, Parameter, Positionen und Kurse der Trade-Berechnung aus `event_inputs`
+#   "rekonstruiert": ältere Events ohne Eingaben; Kurse aus dem Kurs-Speicher zum Event-Zeitpunkt,
+#                    Parameter aus settings.PORTFOLIOS. Spätere Kurs-Revisionen können hier zu
+#                    Abweichungen führen, daher zählen sie nicht als Regression. Trades werden nicht geprüft.
+SCORE_TOLERANZ: float = 1e-9
+
+
+def _parameter_aus_settings(portfolio_name: str) -> dict:
+    definition = next((d for d in settings.PORTFOLIOS if d.get('name', settings.DEFAULT_PORTFOLIO) == portfolio_name),
+                      {'name': portfolio_name})
+    p = logic.portfolio_parameter(definition)
+    return {k: p[k] for k in ('risky', 'canary', 'cash', 'T', 'B')}
+
+
+class _KursSpeicher:
+    """Monatskurse zum Zeitpunkt eines Events: Tageskurse per Stichtag oder Zeilen des Schnappschusses."""
+
+    def __init__(self):
+        self.taeglich = settings.INGEST_BAR_SIZE == "1 day"
+        if not self.taeglich:
+            self.monate, tickers, self.preise = snapshot.load_snapshot()
+            self.spalte = {t: i for i, t in enumerate(tickers)}
+
+    def kurse(self, tickers: list, timestamp: str) -> dict:
+        if self.taeglich:
+            panel = database.get_prices_as_of(tickers, timestamp[:10], limit=26)
+            return {t: panel[t].dropna().tolist()[-13:] for t in tickers}
+        bis = int(np.searchsorted(self.monate, timestamp[:7], side='right'))
+        ergebnis = {}
+        for t in tickers:
+            if t not in self.spalte:
+                ergebnis[t] = []
+                continue
+            werte = self.preise[:bis, self.spalte[t]]
+            ergebnis[t] = werte[~np.isnan(werte)][-13:].tolist()
+        return ergebnis
+
+
+def _vergleiche(event: dict, neu: dict, trades) -> dict:
+    """Abweichungen {feld: (gespeichert, replay)} für Signal, Cash-Anteil, Rangliste, Portfolio und Trades."""
+    diffs = {}
+    signal = neu['canary_report']['final_signal']
+    if event.get('cash_share') is None and signal == "RISK_PARTIAL":
+        signal = "RISK_OFF"   # Events ohne Cash-Anteil kannten bei B > 1 nur RISK_OFF
+    if signal != event['final_signal']:
+        diffs['signal'] = (event['final_signal'], signal)
+    if event.get('cash_share') is not None and not math.isclose(event['cash_share'], neu['cash_anteil'], abs_tol=SCORE_TOLERANZ):
+        diffs['cash_anteil'] = (event['cash_share'], neu['cash_anteil'])
+
+    alt_ranking, neu_ranking = event['momentum_ranking'], [(t, float(s)) for t, s in neu['momentum_ranking']]
+    if [t for t, _ in alt_ranking] != [t for t, _ in neu_ranking] or any(
+            not math.isclose(a, b, rel_tol=SCORE_TOLERANZ, abs_tol=SCORE_TOLERANZ)
+            for (_, a), (_, b) in zip(alt_ranking, neu_ranking)):
+        diffs['ranking'] = (alt_ranking, neu_ranking)
+
+    alt_portfolio, neu_portfolio = event['portfolio'], neu['portfolio']
+    if set(alt_portfolio) != set(neu_portfolio) or any(
+            not math.isclose(alt_portfolio[t], neu_portfolio[t], abs_tol=SCORE_TOLERANZ) for t in alt_portfolio):
+        diffs['portfolio'] = (alt_portfolio, neu_portfolio)
+
+    if trades is not None and trades != event['calculated_trades']:
+        diffs['trades'] = (event['calculated_trades'], trades)
+    return diffs
+
+
+def replay_events(since: str = None, until: str = None, portfolio_name: str = None) -> list:
+    """
+    Spielt alle gespeicherten Events mit since <= timestamp <= until (optional nur eines
+    Portfolios) erneut durch.
+
+    Returns:
+        Liste von Dicts je Event: 'event_id', 'timestamp', 'portfolio_name', 'eingaben'
+        ("gespeichert"/"rekonstruiert"), 'diffs' ({feld: (gespeichert, replay)}) und 'fehler'.
+    """
+    # Auch ältere Events laden: sie liefern die Signal-Historie der ersten Events im Zeitraum
+    events = database.load_events(until=until, portfolio_name=portfolio_name)
+    kurs_speicher = None
+    signale = {}
+    ergebnisse = []
+    for event in events:
+        historie = signale.setdefault(event['portfolio_name'], [])
+        if since is None or event['timestamp'] >= since:
+            eingaben = event['eingaben']
+            ergebnis = {'event_id': event['id'], 'timestamp': event['timestamp'],
+                        'portfolio_name': event['portfolio_name'],
+                        'eingaben': "gespeichert" if eingaben is not None else "rekonstruiert",
+                        'diffs': {}, 'fehler': None}
+            try:
+                if eingaben is None:
+                    kurs_speicher = kurs_speicher or _KursSpeicher()
+                    parameter = _parameter_aus_settings(event['portfolio_name'])
+                    universum = list(dict.fromkeys(parameter['risky'] + parameter['canary'] + parameter['cash']))
+                    eingaben = {'preise': kurs_speicher.kurse(universum, event['timestamp']),
+                                'parameter': parameter, 'positionen': None, 'kurse': None}
+                p = eingaben['parameter']
+                # Ohne letzte_bars: Scores direkt aus den Eingaben, nie aus dem Score-Cache
+                neu = logic.bestimme_ziel_portfolio(
+                    eingaben['preise'], None, risky_universe=p['risky'], canary_universe=p['canary'],
+                    cash_universe=p['cash'], top_n=p['T'], breite=p['B'], signal_historie=historie[-12:],
+                )
+                trades = None
+                if eingaben['positionen'] is not None:
+                    symbole, plan = portfolio.plan_trades(eingaben['positionen'], neu['portfolio'],
+                                                          event['total_portfolio_value'], eingaben['kurse'])
+                    trades = planner.trades_from_plan(symbole, plan)
+                ergebnis['diffs'] = _vergleiche(event, neu, trades)
+            except (ValueError, KeyError, IndexError, ZeroDivisionError) as e:
+                ergebnis['fehler'] = f"{type(e).__name__}: {e}"
+            ergebnisse.append(ergebnis)
+        historie.append(event['final_signal'])
+    return ergebnisse
+
+
+def print_replay(ergebnisse: list, dauer: float = None):
+    for e in ergebnisse:
+        if e['fehler']:
+            print(f"  FEHLER   Event {e['event_id']} ({e['portfolio_name']}, {e['timestamp']}): {e['fehler']}")
+        for feld, (alt, neu) in e['diffs'].items():
+            print(f"  ABWEICHUNG Event {e['event_id']} ({e['portfolio_name']}, {e['timestamp']}, {e['eingaben']}) "
+                  f"{feld}:\n      gespeichert: {alt}\n      replay:      {neu}")
+    gespeichert = sum(1 for e in ergebnisse if e['eingaben'] == "gespeichert")
+    abweichend = sum(1 for e in ergebnisse if e['diffs'] or e['fehler'])
+    print(f"\n{len(ergebnisse)} Events nachgespielt ({gespeichert} mit gespeicherten Eingaben)"
+          + (f" in {dauer:.2f} s ({len(ergebnisse) / dauer:.0f} Events/s)." if dauer else "."))
+    print(f"Abweichungen: {len(regressionen(ergebnisse))} mit gespeicherten Eingaben (Regressionen), "
+          f"{abweichend - len(regressionen(ergebnisse))} mit rekonstruierten Eingaben")
+
+
+def regressionen(ergebnisse: list) -> list:
+    """Events mit gespeicherten Eingaben, deren Replay abweicht oder fehlschlägt."""
+    return [e for e in ergebnisse if e['eingaben'] == "gespeichert" and (e['diffs'] or e['fehler'])]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gespeicherte Rebalancing-Events ohne Broker nachspielen und vergleichen.")
+    parser.add_argument("--since", help="Nur Events ab diesem Zeitpunkt (ISO)")
+    parser.add_argument("--until", help="Nur Events bis zu diesem Zeitpunkt (ISO)")
+    parser.add_argument("--portfolio", help="Nur Events dieses Portfolios")
+    argumente = parser.parse_args()
+
+    database.initialize_database()
+    print("--- Replay der gespeicherten Rebalancing-Events ---")
+    start = time.perf_counter()
+    ergebnisse = replay_events(argumente.since, argumente.until, argumente.portfolio)
+    print_replay(ergebnisse, time.perf_counter() - start)
+    # Exit-Code 1 bei Regressionen: als Prüfschritt vor dem Deployment verwendbar
+    sys.exit(1 if regressionen(ergebnisse) else 0)
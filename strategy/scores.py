@@ -0,0 +1,66 @@
+# strategy/scores.py
+
+import threading
+from collections import OrderedDict
+from data import database
+
+# Score-Cache mit Schlüssel (ticker, letzter Bar, Gewichtung):
+# 1. In-Process-LRU, 2. persistierte Tabelle 'momentum_scores', 3. Neuberechnung.
+# Schreibt die Ingestion neue oder revidierte Bars, werden die Einträge des
+# Tickers verworfen (DB: in derselben Transaktion, LRU: über einen Price-Listener).
+LRU_GROESSE = 4096
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def gewichtungs_schluessel(gewichte: tuple) -> str:
+    """Kanonischer Name eines Gewichtungsschemas, z.B. (12, 4, 2, 1) -> '12-4-2-1'."""
+    return "-".join(str(g) for g in gewichte)
+
+
+def hole_scores(letzte_bars: dict, gewichte: tuple, berechne) -> dict:
+    """
+    Liefert {ticker: score} für alle Ticker in `letzte_bars` ({ticker: datum des letzten Bars}).
+    Nur Cache-Fehltreffer werden mit `berechne(ticker)` neu berechnet und danach persistiert.
+    """
+    schema = gewichtungs_schluessel(gewichte)
+    scores = {}
+    fehlend = []
+    with _lru_lock:
+        for ticker, letzter_bar in letzte_bars.items():
+            schluessel = (ticker, letzter_bar, schema)
+            if schluessel in _lru:
+                _lru.move_to_end(schluessel)
+                scores[ticker] = _lru[schluessel]
+            else:
+                fehlend.append(ticker)
+    if not fehlend:
+        return scores
+
+    aus_db = database.get_momentum_scores([(t, letzte_bars[t]) for t in fehlend], schema)
+    neu = {}
+    for ticker in fehlend:
+        schluessel = (ticker, letzte_bars[ticker])
+        if schluessel in aus_db:
+            scores[ticker] = aus_db[schluessel]
+        else:
+            scores[ticker] = neu[schluessel] = berechne(ticker)
+    database.save_momentum_scores(neu, schema)
+
+    with _lru_lock:
+        for ticker in fehlend:
+            _lru[(ticker, letzte_bars[ticker], schema)] = scores[ticker]
+        while len(_lru) > LRU_GROESSE:
+            _lru.popitem(last=False)
+    return scores
+
+
+def invalidiere_ticker(ticker: str):
+    """Verwirft alle LRU-Einträge eines Tickers (aufgerufen, sobald neue Kurse gespeichert wurden)."""
+    with _lru_lock:
+        for schluessel in [k for k in _lru if k[0] == ticker]:
+            del _lru[schluessel]
+
+
+database.register_price_listener(invalidiere_ticker)
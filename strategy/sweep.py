@@ -0,0 +1,168 @@
+# strategy/sweep.py
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+import itertools
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Python den Weg zu den Modulen zeigen
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from config import settings
+from strategy import backtest
+from reporting import metrics
+from strategy.logic import MOMENTUM_GEWICHTE
+
+# === Standard-Gitter für den Parameter-Sweep ==================================
+TOP_N_WERTE: list = [1, 2, 3, 4, 6]
+BREITEN: list = [1, 2]
+GEWICHTUNGEN: dict = {
+    "13612W": MOMENTUM_GEWICHTE,  # Standard: (12, 4, 2, 1)
+    "13612U": (1, 1, 1, 1),       # Gleichgewichtete Lookbacks
+    "kurzfristig": (12, 4, 1, 0),
+}
+UNIVERSEN: dict = {
+    "G12/P2/C3": (settings.RISKY_UNIVERSE, settings.CANARY_UNIVERSE, settings.CASH_UNIVERSE),
+}
+
+# Konfigurationen je Worker-Aufgabe (reduziert den IPC-Overhead pro Konfiguration)
+CHUNK_GROESSE = 64
+
+# --- Worker-Zustand: wird einmal pro Prozess im Initializer gesetzt ---
+_preise = None
+_tickers = None
+_score_cache = {}
+
+
+def baue_parameter_gitter(top_n_werte: list = None, breiten: list = None,
+                          gewichtungen: dict = None, universen: dict = None) -> list:
+    """Kreuzprodukt aller Parameter als Liste von Konfigurations-Dicts."""
+    top_n_werte = top_n_werte or TOP_N_WERTE
+    breiten = breiten or BREITEN
+    gewichtungen = gewichtungen or GEWICHTUNGEN
+    universen = universen or UNIVERSEN
+
+    konfigurationen = []
+    for (universum, (risky, canary, cash)), top_n, breite, (gewichtung, gewichte) in itertools.product(
+        universen.items(), top_n_werte, breiten, gewichtungen.items()
+    ):
+        if top_n > len(risky):
+            continue
+        konfigurationen.append({
+            'universum': universum, 'risky': list(risky), 'canary': list(canary), 'cash': list(cash),
+            'T': top_n, 'B': breite, 'gewichtung': gewichtung, 'gewichte': tuple(gewichte),
+        })
+    return konfigurationen
+
+
+def kennzahlen_batch(renditen: np.ndarray) -> list:
+    """
+    Jahresrendite, Volatilität, Sharpe, max. Drawdown und Calmar für alle Spalten einer
+    Renditematrix (Monate x Konfigurationen) in einem NumPy-Durchlauf über metrics.calculate_metrics_batch.
+    NaN markiert Monate vor dem Start bzw. ohne Entscheidung der jeweiligen Konfiguration.
+    """
+    m = metrics.calculate_metrics_batch(renditen)
+    spalten = {
+        'monate': m['periods'],
+        'cagr': m['cagr_percent'] / 100,
+        'rendite_pa': m['annualized_return_percent'] / 100,
+        'volatilitaet_pa': m['annualized_volatility_percent'] / 100,
+        'sharpe': m['sharpe_ratio'],
+        'max_drawdown': m['max_drawdown_percent'] / 100,
+        'calmar': m['calmar_ratio'],
+    }
+    return [{name: werte[i].item() for name, werte in spalten.items()} for i in range(renditen.shape[1])]
+
+
+def _init_worker(matrix_pfad: str, tickers: list):
+    """Öffnet die gemeinsame Preis-Matrix schreibgeschützt per Memory-Mapping (keine Kopie je Worker)."""
+    global _preise, _tickers
+    _preise = np.load(matrix_pfad, mmap_mode='r')
+    _tickers = tickers
+    _score_cache.clear()
+
+
+def _bewerte_konfigurationen(konfigurationen: list) -> list:
+    ergebnisse = []
+    monate = np.arange(_preise.shape[0])
+    renditen = np.full((_preise.shape[0], len(konfigurationen)), np.nan)
+    for konfig in konfigurationen:
+        # Scores hängen nur von der Gewichtung ab und werden im Worker wiederverwendet
+        scores = _score_cache.get(konfig['gewichte'])
+        if scores is None:
+            scores = backtest.berechne_momentum_matrix(_preise, gewichte=konfig['gewichte'])
+            _score_cache[konfig['gewichte']] = scores
+
+        ergebnis = backtest.run_backtest(
+            monate, _tickers, _preise,
+            risky_universe=konfig['risky'], canary_universe=konfig['canary'], cash_universe=konfig['cash'],
+            top_n=konfig['T'], breite=konfig['B'], gewichte=konfig['gewichte'], scores=scores,
+        )
+        # Renditen erst ab dem ersten NAV-Monat (Start = 1.0) zählen
+        renditen[:, len(ergebnisse)] = np.where(np.isnan(ergebnis['nav']), np.nan, ergebnis['portfolio_renditen'])
+        renditen[np.argmax(~np.isnan(ergebnis['nav'])), len(ergebnisse)] = np.nan
+        ergebnisse.append({k: konfig[k] for k in ('universum', 'T', 'B', 'gewichtung')})
+
+    # Kennzahlen aller Konfigurationen des Chunks in einem Durchlauf
+    for zeile, kennzahlen in zip(ergebnisse, kennzahlen_batch(renditen)):
+        zeile.update(kennzahlen)
+    return ergebnisse
+
+
+def run_sweep(konfigurationen: list, prozesse: int = None, sortierung: str = 'sharpe') -> pd.DataFrame:
+    """
+    Bewertet alle Konfigurationen parallel in einem Prozess-Pool.
+
+    Die Preis-Matrix wird EINMAL aus der Datenbank geladen und als .npy-Datei abgelegt;
+    jeder Worker öffnet sie per Memory-Mapping, sodass sich alle Prozesse dieselben
+    Seiten im OS-Cache teilen. Ergebnis ist eine nach `sortierung` absteigend gerankte Tabelle.
+    """
+    tickers = []
+    for konfig in konfigurationen:
+        for ticker in konfig['risky'] + konfig['canary'] + konfig['cash']:
+            if ticker not in tickers:
+                tickers.append(ticker)
+    _, tickers, preise = backtest.lade_preis_matrix(tickers)
+
+    tmp_dir = tempfile.mkdtemp(prefix="daa_sweep_")
+    try:
+        matrix_pfad = os.path.join(tmp_dir, "preise.npy")
+        np.save(matrix_pfad, preise)
+
+        chunks = [konfigurationen[i:i + CHUNK_GROESSE] for i in range(0, len(konfigurationen), CHUNK_GROESSE)]
+        with ProcessPoolExecutor(max_workers=prozesse, initializer=_init_worker,
+                                 initargs=(matrix_pfad, tickers)) as pool:
+            zeilen = [zeile for teil in pool.map(_bewerte_konfigurationen, chunks) for zeile in teil]
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    tabelle = pd.DataFrame(zeilen).sort_values(sortierung, ascending=False, na_position='last')
+    tabelle.insert(0, 'rang', np.arange(1, len(tabelle) + 1))
+    return tabelle.reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    konfigurationen = baue_parameter_gitter()
+    print("==============================================")
+    print("=== DAA-Parameter-Sweep                    ===")
+    print("==============================================")
+    print(f"Bewerte {len(konfigurationen)} Konfigurationen auf {os.cpu_count()} Kernen...")
+
+    start_zeit = time.perf_counter()
+    ergebnis = run_sweep(konfigurationen)
+    dauer = time.perf_counter() - start_zeit
+
+    ausgabe_dir = os.path.join(os.path.dirname(SCRIPT_DIR), 'sweeps')
+    os.makedirs(ausgabe_dir, exist_ok=True)
+    dateiname = os.path.join(ausgabe_dir, f"sweep_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv")
+    ergebnis.to_csv(dateiname, index=False)
+
+    print(f"Sweep abgeschlossen in {dauer:.2f} s. Rangliste in {dateiname} gespeichert.")
+    print(ergebnis.head(10).round(4).to_string(index=False))